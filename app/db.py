@@ -1,21 +1,198 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, ForeignKey
-from sqlalchemy import Date
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, ForeignKey, Index, UniqueConstraint
+from sqlalchemy import Date, text
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy import inspect
+from sqlalchemy import inspect, event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.pool import QueuePool
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
 import os
+import threading
+import time
+from .utils.metrics import CallbackGauge, instrument_engine
+from .utils.weeks import week_key as business_week_key
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./weekreports.db")
 
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录连接借出（checkout）等待耗时与超时次数的 QueuePool，用于观察连接池是否成为瓶颈。"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+    def wait_stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "checkouts": self._checkouts,
+                "checkout_wait_seconds_total": round(self._wait_total, 6),
+                "checkout_wait_seconds_max": round(self._wait_max, 6),
+                "checkout_timeouts": self._timeouts,
+            }
+
+
+def _pool_options() -> dict:
+    """非 SQLite 数据库的连接池参数（环境变量可调）。"""
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_pre_ping": True,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        # 超过该秒数的连接在下次借出时重建，避免被数据库/中间件的空闲超时断开
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
+
+# SQLite 生产配置：每个新连接建立时执行的 PRAGMA（按顺序）。
+# WAL 让读写互不阻塞；synchronous=NORMAL 在 WAL 下只在检查点 fsync，掉电最多丢失最近提交但不会损坏；
+# busy_timeout 让跨进程写冲突时等待而不是立即报 "database is locked"。
+SQLITE_PRAGMAS = {
+    # 最先设置：多个进程同时首次打开新库时，切换 journal_mode 也需要等待锁
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # 负数表示 KiB：默认每连接 64MB 页缓存
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "temp_store": "MEMORY",
+}
+# 额外 PRAGMA，如 SQLITE_EXTRA_PRAGMAS=foreign_keys=ON,wal_autocheckpoint=2000
+for _item in os.getenv("SQLITE_EXTRA_PRAGMAS", "").split(","):
+    if "=" in _item:
+        _name, _value = _item.split("=", 1)
+        SQLITE_PRAGMAS[_name.strip()] = _value.strip()
+
 # 根据数据库类型设置引擎参数（SQLite 需要 check_same_thread，其他如 PostgreSQL 不需要）
-if DATABASE_URL.startswith("sqlite"):
+if IS_SQLITE:
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        """连接级 PRAGMA 钩子：每个新建的 SQLite 连接都会执行一次。"""
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
 else:
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    engine = create_engine(DATABASE_URL, **_pool_options())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# 可选只读副本：配置 DATABASE_READ_URL 后，只读路由（见 main.get_read_db）的查询发往副本，其余仍走主库
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "").strip()
+read_engine = create_engine(DATABASE_READ_URL, **_pool_options()) if DATABASE_READ_URL and not IS_SQLITE else engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+instrument_engine(engine, "primary")
+if read_engine is not engine:
+    instrument_engine(read_engine, "replica")
+
+
+def pool_stats() -> dict:
+    """各连接池的使用情况：容量、借出/空闲/溢出连接数，以及借出等待耗时与超时次数（仅 PostgreSQL 等非 SQLite）。"""
+    engines = {"primary": engine}
+    if read_engine is not engine:
+        engines["replica"] = read_engine
+    out = {}
+    for name, eng in engines.items():
+        pool = eng.pool
+        item = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            item.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(0, pool.overflow()),
+            )
+        if isinstance(pool, InstrumentedQueuePool):
+            item.update(pool.wait_stats())
+        out[name] = item
+    return out
+
+
+def _pool_samples():
+    for name, item in pool_stats().items():
+        for key, value in item.items():
+            if key != "pool":
+                yield {"engine": name, "stat": key}, value
+
+
+CallbackGauge("weekreport_db_pool", "数据库连接池状态（连接数、借出等待累计秒数等）", ("engine", "stat"), _pool_samples)
 Base = declarative_base()
 
+# 数据库操作专用的有界线程池：同步 SQLAlchemy 调用不在事件循环中执行，
+# 单个慢查询/慢提交只占用一个线程，不会拖住同一 worker 上的其他请求
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "8"))
+_db_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="weekreport-db")
+
+
+# SQLite 同一时刻只允许一个写事务：请求中的写操作统一交给单线程写队列串行执行，
+# 进程内的并发提交不再互相争锁（跨进程仍由 busy_timeout 兜底）。PostgreSQL 不需要，写操作走普通线程池
+SQLITE_WRITE_QUEUE = IS_SQLITE and os.getenv("SQLITE_WRITE_QUEUE", "1").strip().lower() in ("1", "true", "yes")
+_db_write_executor = (
+    ThreadPoolExecutor(max_workers=1, thread_name_prefix="weekreport-db-writer") if SQLITE_WRITE_QUEUE else _db_executor
+)
+
+
+def _in_context(func, *args, **kwargs):
+    """带上当前上下文（如请求的数据库语句统计，见 utils/metrics）在线程池中执行；run_in_executor 本身不复制上下文。"""
+    return functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+async def run_in_db(func, *args, **kwargs):
+    """在数据库线程池中执行同步函数并等待结果。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, _in_context(func, *args, **kwargs))
+
+
+async def run_in_db_write(func, *args, **kwargs):
+    """执行包含写入的同步函数（commit / rollback / 写缓存等）；SQLite 下经写队列串行执行。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_write_executor, _in_context(func, *args, **kwargs))
+
+
+async def iterate_in_db(iterator):
+    """逐项在数据库线程池中推进同步迭代器（如流式渲染/导出），结束或中断时关闭迭代器。"""
+    done = object()
+    try:
+        while True:
+            item = await run_in_db(next, iterator, done)
+            if item is done:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            await run_in_db(close)
+
 class Project(Base):
     __tablename__ = "projects"
 
@@ -41,65 +218,194 @@ class Member(Base):
     # 关系
     reports = relationship("Report", back_populates="member")
 
+def _report_week_key(context) -> str:
+    """reports.week_key 的插入默认值：按本行的 created_at（缺省为当前时间）计算业务周。"""
+    return business_week_key(context.get_current_parameters().get("created_at") or datetime.utcnow())
+
+
 class Report(Base):
     __tablename__ = "reports"
+    __table_args__ = (
+        # 按周查询（汇总、导出等）：week_key 等值过滤后按 project_id（整数）分组
+        Index("ix_reports_week_project", "week_key", "project_id"),
+        # 未提交名单：活跃成员与当周周报的反连接（utils/missing）
+        Index("ix_reports_week_member", "week_key", "member_id"),
+        # 按日期区间的导出/检索
+        Index("ix_reports_created_project_id", "created_at", "project_id"),
+        # 部分索引：只包含尚未关联项目的周报，回填（utils/project_keys）按 id 续扫时直接定位，回填完成后几乎为空
+        Index(
+            "ix_reports_unlinked",
+            "id",
+            sqlite_where=text("project_id IS NULL"),
+            postgresql_where=text("project_id IS NULL"),
+        ),
+        # 部分索引：尚未回填 week_key 的历史周报（utils/week_keys）
+        Index(
+            "ix_reports_week_pending",
+            "id",
+            sqlite_where=text("week_key IS NULL"),
+            postgresql_where=text("week_key IS NULL"),
+        ),
+        # 每个成员每周每个项目只保留一行（重复提交改为 upsert，见 utils/submissions），未关联项目的周报按名称区分。
+        # 已有数据需先合并重复行，这两个唯一索引不由 ensure_indexes 补建，由 utils/submissions 负责
+        Index("ux_reports_week_member_project", "week_key", "member_id", "project_id", unique=True),
+        Index(
+            "ux_reports_week_member_orphan",
+            "week_key",
+            "member_id",
+            "project",
+            unique=True,
+            sqlite_where=text("project_id IS NULL"),
+            postgresql_where=text("project_id IS NULL"),
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    member_id = Column(Integer, ForeignKey("members.id"), nullable=False)
+    member_id = Column(Integer, ForeignKey("members.id"), nullable=False, index=True)
     member_name = Column(String(100), nullable=False)  # 保留兼容性
-    project = Column(String(100), nullable=False)
+    # 关联的项目；为空表示提交时的项目名称未匹配到项目（孤儿周报，展示时使用 project 文本）
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True, index=True)
+    project = Column(String(100), nullable=False)  # 提交时的项目名称；项目改名后以 projects.name 为准
     work_desc = Column(Text, nullable=False)
     progress = Column(Float, nullable=False)
     next_week_plan = Column(Text, nullable=False)
     risks = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # 业务时区下的 ISO 周（如 2024-W07），插入时按 created_at 自动计算；升级前的历史数据由 utils/week_keys 回填
+    week_key = Column(String(10), nullable=True, default=_report_week_key)
+    # 最近一次提交的幂等键与修改次数（每次重新提交 +1，旧内容保存在 report_revisions）
+    submit_key = Column(String(64), nullable=True)
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
     
     # 关系
     member = relationship("Member", back_populates="reports")
 
+
+class ReportRevision(Base):
+    """
+    周报修改历史：重新提交覆盖周报时，记录被覆盖版本中发生变化的字段的旧值（JSON），不保存未变化的字段。
+    热表 reports 保持每个成员每周每个项目一行。
+    """
+    __tablename__ = "report_revisions"
+
+    id = Column(Integer, primary_key=True)
+    report_id = Column(Integer, ForeignKey("reports.id", ondelete="CASCADE"), nullable=False, index=True)
+    submitted_at = Column(DateTime, nullable=False)  # 被覆盖版本的提交时间
+    replaced_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    submit_key = Column(String(64), nullable=True)
+    changes = Column(Text, nullable=False)  # {"字段": 旧值}
+
+class CacheEntry(Base):
+    """共享缓存条目（多 worker 部署时的缓存后端）；value 为空表示已失效。"""
+    __tablename__ = "cache_entries"
+
+    key = Column(String(300), primary_key=True)
+    value = Column(Text, nullable=True)
+    updated_at = Column(Float, nullable=False)  # epoch 秒
+
+
+class ResourceVersion(Base):
+    """资源版本号：写操作后递增，用于生成 ETag / Last-Modified。"""
+    __tablename__ = "resource_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SchemaVersion(Base):
+    """已执行的结构迁移（app/migrations），每个版本一行；当前版本为最大的 version。"""
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SchedulerLease(Base):
+    """调度器主节点租约：同一时刻只有持有未过期租约的进程执行定时任务。"""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(50), primary_key=True)
+    holder = Column(String(200), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class OutboxMessage(Base):
+    """通知发件箱：定时任务只负责入队，由 outbox worker 负责发送、重试与死信。"""
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(20), nullable=False)  # dingtalk / email
+    payload = Column(Text, nullable=False)  # JSON
+    # 同一逻辑消息（如某周的周报邮件）只入队一次
+    idempotency_key = Column(String(200), nullable=True, unique=True)
+    status = Column(String(20), nullable=False, default="pending")  # pending/sending/sent/dead
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+
+class LLMCacheEntry(Base):
+    """大模型调用结果缓存：键为规范化输入、模型与参数的哈希，按 TTL 与条数淘汰。"""
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 hex
+    model = Column(String(200), nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class WeeklyRollup(Base):
+    """按 周 × 项目 × 成员 预聚合的周报统计，提交周报时增量维护，供历史/区间/趋势查询。"""
+    __tablename__ = "weekly_rollups"
+    __table_args__ = (
+        UniqueConstraint("week", "project_id", "project", "member_id", name="uq_rollup_week_project_member"),
+        Index("ix_rollups_project_week", "project_id", "week"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    week = Column(String(10), nullable=False)  # ISO 周，如 2024-W07
+    # 关联项目的 id；未关联项目的周报记为 0，并在 project 中保存其项目名称（已关联时为空串）
+    project_id = Column(Integer, nullable=False, default=0)
+    project = Column(String(100), nullable=False, default="")
+    member_id = Column(Integer, nullable=False)
+    member_name = Column(String(100), nullable=False)
+    report_count = Column(Integer, nullable=False, default=0)
+    progress_sum = Column(Float, nullable=False, default=0)
+    last_progress = Column(Float, nullable=True)
+    last_report_at = Column(DateTime, nullable=True)
+    risk_count = Column(Integer, nullable=False, default=0)
+
+
+def ensure_indexes(table, indexes=None):
+    """
+    按模型声明补建缺失的索引（create_all 不会给已存在的表建索引）；indexes 未指定时补建全部非唯一索引
+    （唯一索引可能因已有重复数据而失败，由调用方清理数据后显式传入）。
+    PostgreSQL 上使用 CREATE INDEX CONCURRENTLY，大表建索引期间不阻塞读写；SQLite 在 WAL 下只阻塞其他写入。
+    """
+    if indexes is None:
+        indexes = [index for index in table.indexes if not index.unique]
+    if IS_SQLITE:
+        for index in indexes:
+            index.create(bind=engine, checkfirst=True)
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        existing = {item["name"] for item in inspect(conn).get_indexes(table.name)}
+        for index in indexes:
+            if index.name not in existing:
+                ddl = str(CreateIndex(index).compile(dialect=engine.dialect))
+                conn.execute(text(ddl.replace(" INDEX ", " INDEX CONCURRENTLY ", 1)))
+
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
-    # 轻量级迁移：确保 members 表存在 phone 字段（跨数据库）
-    try:
-        insp = inspect(engine)
-        cols = [c.get("name") for c in insp.get_columns("members")]
-        if "phone" not in cols:
-            from sqlalchemy import text
-            with engine.connect() as conn:
-                conn.execute(text("ALTER TABLE members ADD COLUMN phone VARCHAR(20)"))
-    except Exception as e:
-        print(f"检查/添加 phone 字段失败: {e}")
-    
-    # 初始化默认成员数据
-    db = SessionLocal()
-    try:
-        # 检查是否已有成员数据
-        if db.query(Member).count() == 0:
-            default_members = [
-                Member(name="张三", department="研发部", position="高级工程师", email="zhangsan@company.com"),
-                Member(name="李四", department="产品部", position="产品经理", email="lisi@company.com"),
-                Member(name="王五", department="研发部", position="前端工程师", email="wangwu@company.com"),
-                Member(name="赵六", department="测试部", position="测试工程师", email="zhaoliu@company.com"),
-                Member(name="钱七", department="运维部", position="运维工程师", email="qianqi@company.com"),
-            ]
-            for member in default_members:
-                db.add(member)
-            db.commit()
-
-        # 初始化默认项目数据
-        if db.query(Project).count() == 0:
-            default_projects = [
-                Project(name="支付系统升级", description="支付通道整合与性能优化"),
-                Project(name="核心平台", description="核心服务平台建设"),
-                Project(name="移动端App", description="移动客户端迭代"),
-                Project(name="数据治理", description="数据质量与标准化治理"),
-                Project(name="运营后台", description="运营支撑后台优化"),
-            ]
-            for proj in default_projects:
-                db.add(proj)
-            db.commit()
-    except Exception as e:
-        db.rollback()
-        print(f"初始化成员数据失败: {e}")
-    finally:
-        db.close()
\ No newline at end of file
+    """执行全部未完成的结构迁移（见 app/migrations）；部署时请使用 python -m app.migrations。"""
+    from .migrations import migrate
+    migrate()
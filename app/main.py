@@ -1,12 +1,26 @@
 from fastapi import FastAPI, Request, Form, Depends, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
-from .db import SessionLocal, Report, Member, Project, init_db
-from .utils.summary import generate_weekly_summary
-from .services.scheduler import start_scheduler, schedule_dingtalk_once, schedule_email_once
-from datetime import datetime, timedelta
+from .db import SessionLocal, ReadSessionLocal, pool_stats, Report, Member, Project, run_in_db, run_in_db_write, iterate_in_db
+from .utils.summary import stream_weekly_summary, invalidate_summary_sections, invalidate_week_sections, member_sections
+from .utils.weeks import current_week_key, normalize_week_key, shift_week_key, local_day_start_utc
+from .utils.rollups import range_summary, project_trend
+from .utils.export import stream_report_export
+from .utils.search import search_reports
+from .utils.missing import missing_members, current_missing_members
+from .migrations import ensure_schema
+from .utils.submissions import SubmitConflict, submit_report as save_submission, report_revisions
+from .utils.project_keys import orphan_projects, detach_project_reports
+from .utils.bulk_import import BULK_BATCH_SIZE, BulkImporter, iter_records, load_lookups
+from .utils.versions import MEMBERS, PROJECTS, SUMMARY, get_version, bump_versions, make_etag, http_date, is_not_modified
+from .utils.cache import get_cache
+from .utils.refdata import active_members, active_mobiles, project_list, fresh_snapshot, invalidate_reference_data
+from .utils.metrics import MetricsMiddleware, render_metrics
+from .services.scheduler import start_scheduler, stop_scheduler, schedule_dingtalk_once, schedule_email_once, is_scheduler_leader
+from .services.outbox import start_outbox_worker, stop_outbox_worker, outbox_status, requeue
+from datetime import date, datetime, timedelta
 import logging
 from dotenv import load_dotenv
 
@@ -15,6 +29,7 @@ import os
 load_dotenv()
 
 app = FastAPI(title="智能周报助手")
+app.add_middleware(MetricsMiddleware)
 
 # 静态文件和模板
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -32,13 +47,60 @@ def require_admin(request: Request):
         raise HTTPException(status_code=403, detail="Forbidden")
     # 返回 None 表示通过
 
-# 数据库依赖
-def get_db():
+# 数据库依赖：会话的查询/关闭通过 run_in_db、提交/回滚通过 run_in_db_write 派发到数据库线程池
+async def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await run_in_db(db.close)
+
+# 只读路由的数据库依赖：配置了 DATABASE_READ_URL 时查询发往只读副本（可能有复制延迟），否则与 get_db 相同。
+# 写入后需立即读到最新数据的页面（如管理列表页）仍使用 get_db
+async def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        await run_in_db(db.close)
+
+def _after_write(resources, projects=(), sections=()):
+    """
+    写操作提交后调用：使受影响项目的汇总卡片缓存失效，递增资源版本号并丢弃本进程的成员/项目快照。
+    projects 为本周受影响的项目；sections 为任意周的 (周标识, 项目)。
+    """
+    if projects:
+        invalidate_summary_sections(projects)
+    if sections:
+        invalidate_week_sections(sections)
+    bump_versions(*resources)
+    invalidate_reference_data(*resources)
+
+
+async def _reference(resource: str, loader):
+    """成员/项目快照：仍新鲜时直接返回（不访问数据库），否则在数据库线程池中确认版本号或重新加载。"""
+    return fresh_snapshot(resource) or await run_in_db(loader)
+
+
+async def _conditional(request: Request, name: str, extra: str = "", cache_control: str = "no-cache",
+                       read_only: bool = False, version: tuple | None = None):
+    """
+    按资源版本号生成 ETag / Last-Modified 响应头；客户端缓存仍有效时直接返回 304 响应，
+    调用方无需再执行查询与序列化。返回 (响应头, 304 响应或 None)。
+    read_only=True 时从只读副本读取版本号（与 get_read_db 的数据来源一致）；
+    已持有带版本号的快照时可直接传入 version=(版本号, 修改时间)，不再查询。
+    """
+    if version is None:
+        version = await run_in_db(get_version, name, ReadSessionLocal if read_only else SessionLocal)
+    version, updated_at = version
+    etag = make_etag(name, version, extra)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if updated_at:
+        headers["Last-Modified"] = http_date(updated_at)
+    if is_not_modified(request.headers, etag, updated_at):
+        return headers, Response(status_code=304, headers=headers)
+    return headers, None
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -49,35 +111,55 @@ async def startup_event():
         "Startup env check: webhook_present=%s secret_present=%s",
         bool(webhook), bool(secret)
     )
-    init_db()
+    # 只校验结构版本；迁移在部署时执行（python -m app.migrations）
+    await run_in_db(ensure_schema)
     start_scheduler()
+    start_outbox_worker(should_drain=is_scheduler_leader)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    stop_scheduler()
+    stop_outbox_worker()
 
 @app.get("/", response_class=HTMLResponse)
-async def read_form(request: Request, db: Session = Depends(get_db)):
-    # 获取活跃成员列表
-    members = db.query(Member).filter(Member.is_active == 1).order_by(Member.name).all()
+async def read_form(request: Request):
+    # 活跃成员列表来自进程内快照，通常不访问数据库
+    members = (await _reference(MEMBERS, active_members)).items
     return templates.TemplateResponse("index.html", {"request": request, "members": members})
 
 @app.get("/api/members")
-async def get_members(db: Session = Depends(get_db)):
+async def get_members(request: Request):
     """获取成员列表API"""
-    members = db.query(Member).filter(Member.is_active == 1).order_by(Member.name).all()
-    return [{"id": m.id, "name": m.name, "department": m.department, "position": m.position} for m in members]
+    snapshot = await _reference(MEMBERS, active_members)
+    headers, not_modified = await _conditional(request, MEMBERS, version=(snapshot.version, snapshot.updated_at))
+    if not_modified:
+        return not_modified
+    members = snapshot.items
+    return JSONResponse(
+        content=[{"id": m.id, "name": m.name, "department": m.department, "position": m.position} for m in members],
+        headers=headers,
+    )
 
 @app.get("/api/projects")
-async def get_projects(db: Session = Depends(get_db)):
+async def get_projects(request: Request):
     """获取项目列表API"""
-    projects = db.query(Project).order_by(Project.name).all()
-    return [{
+    snapshot = await _reference(PROJECTS, project_list)
+    headers, not_modified = await _conditional(request, PROJECTS, version=(snapshot.version, snapshot.updated_at))
+    if not_modified:
+        return not_modified
+    projects = snapshot.items
+    return JSONResponse(content=[{
         "id": p.id,
         "name": p.name,
         "description": p.description,
         "start_date": p.start_date.isoformat() if p.start_date else None,
         "expected_end_date": p.expected_end_date.isoformat() if p.expected_end_date else None
-    } for p in projects]
+    } for p in projects], headers=headers)
 
 @app.post("/submit")
 async def submit_report(
+    request: Request,
     member_id: int = Form(...),
     member_name: str = Form(...),
     project: str = Form(...),
@@ -85,19 +167,43 @@ async def submit_report(
     progress: float = Form(...),
     next_week_plan: str = Form(...),
     risks: str = Form(""),
+    idempotency_key: str = Form(""),
     db: Session = Depends(get_db)
 ):
-    report = Report(
-        member_id=member_id,
-        member_name=member_name,
-        project=project,
-        work_desc=work_desc,
-        progress=progress,
-        next_week_plan=next_week_plan,
-        risks=risks
-    )
-    db.add(report)
-    db.commit()
+    """
+    提交周报：同一成员同一周同一项目重复提交时覆盖原周报（旧内容记入修改历史）。
+    幂等键取表单 idempotency_key 字段或 Idempotency-Key 请求头，同一键的重复请求不会重复写入。
+    """
+    submit_key = (request.headers.get("Idempotency-Key") or idempotency_key).strip() or None
+    if submit_key and len(submit_key) > 64:
+        return JSONResponse(content={"error": "幂等键长度不能超过 64"}, status_code=400)
+    fields = {
+        "member_id": member_id,
+        "member_name": member_name,
+        "project": project,
+        "work_desc": work_desc,
+        "progress": progress,
+        "next_week_plan": next_week_plan,
+        "risks": risks,
+    }
+
+    def _save():
+        # 周报、修改历史、周汇总统计与全文检索索引在同一事务中提交；并发提交同一周报时重试一次
+        for attempt in range(2):
+            try:
+                result = save_submission(db, fields, submit_key)
+                db.commit()
+                return result
+            except SubmitConflict:
+                db.rollback()
+                if attempt:
+                    raise
+
+    outcome, project_name = await run_in_db_write(_save)
+    api_logger.info("Report submitted: member_id=%s outcome=%s", member_id, outcome)
+    if outcome in ("created", "updated"):
+        # 只让该项目的本周汇总卡片失效，其余卡片继续命中缓存
+        await run_in_db_write(_after_write, [SUMMARY], [project_name])
     return RedirectResponse(url="/success", status_code=303)
 
 @app.get("/success", response_class=HTMLResponse)
@@ -119,20 +225,155 @@ async def admin_login(token: str = Form(...)):
     return resp
 
 @app.get("/admin/summary", response_class=HTMLResponse, dependencies=[Depends(require_admin)])
-async def admin_summary(request: Request, db: Session = Depends(get_db)):
-    summary_html = generate_weekly_summary(db)
-    return HTMLResponse(content=summary_html)
+async def admin_summary(request: Request, week: str | None = None):
+    """周报汇总页面；week 为 ISO 周（如 2024-W07），默认本周"""
+    try:
+        key = normalize_week_key(week) if week else current_week_key()
+    except ValueError:
+        return JSONResponse(content={"error": "week 格式应为 YYYY-Www，如 2024-W07"}, status_code=400)
+    # 汇总内容随周变化，ETag 中带上周标识
+    headers, not_modified = await _conditional(request, SUMMARY, key, "private, no-cache")
+    if not_modified:
+        return not_modified
+    # 流式输出：首块 HTML 在读取完全部周报前即可发送，会话由生成器自行管理。
+    # 汇总卡片会写入缓存，为避免把副本上复制延迟的旧数据缓存下来，未命中的卡片仍从主库读取
+    return StreamingResponse(
+        iterate_in_db(stream_weekly_summary(week=key)), media_type="text/html; charset=utf-8", headers=headers
+    )
+
+
+def _week_bounds(start: str | None, end: str | None, default_weeks: int = 12) -> tuple[str, str]:
+    """规范化区间参数为 ISO 周标识；未指定时默认最近 default_weeks 周（含本周）。"""
+    end_week = normalize_week_key(end) if end else current_week_key()
+    start_week = normalize_week_key(start) if start else shift_week_key(end_week, 1 - default_weeks)
+    return start_week, end_week
+
+
+@app.get("/admin/summary/range", dependencies=[Depends(require_admin)])
+async def summary_range(start: str | None = None, end: str | None = None, project: str | None = None,
+                        db: Session = Depends(get_read_db)):
+    """多周区间汇总（来自周汇总表）：/admin/summary/range?start=2024-W01&end=2024-W13"""
+    try:
+        start_week, end_week = _week_bounds(start, end)
+    except ValueError:
+        return JSONResponse(content={"error": "start/end 格式应为 YYYY-Www，如 2024-W07"}, status_code=400)
+    weeks = await run_in_db(range_summary, db, start_week, end_week, project)
+    return JSONResponse(content={"start": start_week, "end": end_week, "weeks": weeks})
+
+
+@app.get("/admin/summary/trend", dependencies=[Depends(require_admin)])
+async def summary_trend(project: str, start: str | None = None, end: str | None = None,
+                        db: Session = Depends(get_read_db)):
+    """项目逐周进度趋势（来自周汇总表）：/admin/summary/trend?project=...&start=...&end=..."""
+    try:
+        start_week, end_week = _week_bounds(start, end)
+    except ValueError:
+        return JSONResponse(content={"error": "start/end 格式应为 YYYY-Www，如 2024-W07"}, status_code=400)
+    points = await run_in_db(project_trend, db, project, start_week, end_week)
+    return JSONResponse(content={"project": project, "start": start_week, "end": end_week, "points": points})
+
+
+@app.get("/admin/summary/cache", dependencies=[Depends(require_admin)])
+async def summary_cache_stats():
+    """汇总缓存命中/未命中统计"""
+    return JSONResponse(content=get_cache().stats())
+
+def _date_range(start: str | None, end: str | None) -> tuple[datetime | None, datetime | None]:
+    """日期参数（业务时区的 YYYY-MM-DD）换算为 created_at 的 UTC 区间 [start, end)；end 为包含当天的日期。"""
+    start_dt = local_day_start_utc(date.fromisoformat(start)) if start else None
+    end_dt = local_day_start_utc(date.fromisoformat(end) + timedelta(days=1)) if end else None
+    return start_dt, end_dt
+
+
+@app.get("/admin/export", dependencies=[Depends(require_admin)])
+async def export_reports(
+    format: str = "csv",
+    start: str | None = None,
+    end: str | None = None,
+    project: str | None = None,
+    member_id: int | None = None,
+    week: str | None = None,
+):
+    """
+    导出周报（CSV 或 XLSX，流式输出）：/admin/export?format=xlsx&start=2024-01-01&end=2024-03-31&project=...
+    按周导出用 week=2024-W07（业务时区的 ISO 周，走 week_key 索引）。
+    """
+    if format not in ("csv", "xlsx"):
+        return JSONResponse(content={"error": "format 仅支持 csv 或 xlsx"}, status_code=400)
+    try:
+        week = normalize_week_key(week) if week else None
+    except ValueError:
+        return JSONResponse(content={"error": "week 格式应为 YYYY-Www，如 2024-W07"}, status_code=400)
+    try:
+        start_dt, end_dt = _date_range(start, end)
+    except ValueError:
+        return JSONResponse(content={"error": "start/end 格式应为 YYYY-MM-DD"}, status_code=400)
+    media_type = (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet" if format == "xlsx" else "text/csv; charset=utf-8"
+    )
+    filename = f"reports_{week}.{format}" if week and not (start or end) else f"reports_{start or 'all'}_{end or 'now'}.{format}"
+    return StreamingResponse(
+        iterate_in_db(stream_report_export(format, start_dt, end_dt, project, member_id, ReadSessionLocal, week)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/admin/search", dependencies=[Depends(require_admin)])
+async def search(
+    q: str,
+    start: str | None = None,
+    end: str | None = None,
+    project: str | None = None,
+    member_id: int | None = None,
+    page: int = 1,
+    page_size: int = 20,
+    db: Session = Depends(get_read_db),
+):
+    """全文检索周报（本周工作/下周计划/风险），按相关度排序：/admin/search?q=支付 超时&start=2024-01-01&page=1"""
+    if not q.strip():
+        return JSONResponse(content={"error": "q 不能为空"}, status_code=400)
+    try:
+        start_dt, end_dt = _date_range(start, end)
+    except ValueError:
+        return JSONResponse(content={"error": "start/end 格式应为 YYYY-MM-DD"}, status_code=400)
+    page = max(1, page)
+    page_size = min(max(1, page_size), 100)
+    result = await run_in_db(search_reports, db, q, start_dt, end_dt, project, member_id, page, page_size)
+    return JSONResponse(content=result)
+
+@app.post("/api/reports/bulk", dependencies=[Depends(require_admin)])
+async def bulk_import_reports(request: Request, format: str | None = None, batch_size: int | None = None):
+    """
+    批量导入周报（NDJSON 或带表头的 CSV，流式读取请求体）：
+    curl -X POST -H 'X-Admin-Token: ...' --data-binary @reports.ndjson '/api/reports/bulk?format=ndjson'
+    字段：member_id 或 member_name、project、work_desc、progress、next_week_plan、risks(可选)、created_at(可选)。
+    校验或写入失败的行返回行号与原因，不影响其余行。
+    """
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return JSONResponse(content={"error": "format 仅支持 ndjson 或 csv"}, status_code=400)
+    lookups = await run_in_db(load_lookups)
+    importer = BulkImporter(lookups, batch_size or BULK_BATCH_SIZE)
+    async for number, raw in iter_records(request.stream(), fmt):
+        importer.add(number, raw)
+        if importer.batch_full:
+            await run_in_db_write(importer.flush)
+    await run_in_db_write(importer.flush)
+    if importer.inserted:
+        await run_in_db_write(_after_write, [SUMMARY], sections=importer.week_projects)
+    api_logger.info("Bulk import done: inserted=%s failed=%s", importer.inserted, importer.failed)
+    return JSONResponse(content=importer.result())
 
 @app.get("/admin/members", response_class=HTMLResponse, dependencies=[Depends(require_admin)])
 async def members_management(request: Request, db: Session = Depends(get_db)):
     """成员管理页面"""
-    members = db.query(Member).order_by(Member.created_at.desc()).all()
+    members = await run_in_db(lambda: db.query(Member).order_by(Member.created_at.desc()).all())
     return templates.TemplateResponse("members.html", {"request": request, "members": members})
 
 @app.get("/admin/projects", response_class=HTMLResponse, dependencies=[Depends(require_admin)])
 async def projects_management(request: Request, db: Session = Depends(get_db)):
     """项目管理页面"""
-    projects = db.query(Project).order_by(Project.created_at.desc()).all()
+    projects = await run_in_db(lambda: db.query(Project).order_by(Project.created_at.desc()).all())
     return templates.TemplateResponse("projects.html", {"request": request, "projects": projects})
 
 @app.post("/admin/projects/add")
@@ -160,7 +401,8 @@ async def add_project(
                 ed = None
         proj = Project(name=name.strip(), description=description.strip() or None, start_date=sd, expected_end_date=ed)
         db.add(proj)
-        db.commit()
+        await run_in_db_write(db.commit)
+        await run_in_db_write(_after_write, [PROJECTS])
         return RedirectResponse(url="/admin/projects", status_code=303)
     except Exception as e:
         return JSONResponse(content={"error": f"添加项目失败: {str(e)}"}, status_code=400)
@@ -173,7 +415,7 @@ async def update_project(
     db: Session = Depends(get_db)
 ):
     """更新项目：支持 JSON 或表单提交，校验重名并更新日期字段"""
-    proj = db.query(Project).filter(Project.id == project_id).first()
+    proj = await run_in_db(lambda: db.query(Project).filter(Project.id == project_id).first())
     if not proj:
         return JSONResponse(content={"error": "项目不存在"}, status_code=404)
     try:
@@ -190,7 +432,7 @@ async def update_project(
 
         # 重名校验
         if new_name != proj.name:
-            exists = db.query(Project).filter(Project.name == new_name).first()
+            exists = await run_in_db(lambda: db.query(Project).filter(Project.name == new_name).first())
             if exists:
                 return JSONResponse(content={"error": "项目名称已存在"}, status_code=400)
 
@@ -208,29 +450,45 @@ async def update_project(
         except Exception:
             ed = None
 
+        old_name = proj.name
         proj.name = new_name
         proj.description = (description or None)
         proj.start_date = sd
         proj.expected_end_date = ed
-        db.commit()
+        await run_in_db_write(db.commit)
+        await run_in_db_write(_after_write, [PROJECTS, SUMMARY], {old_name, new_name})
         return JSONResponse(content={"success": True})
     except Exception as e:
-        db.rollback()
+        await run_in_db_write(db.rollback)
         return JSONResponse(content={"error": f"更新失败: {str(e)}"}, status_code=400)
 
 
+@app.get("/admin/projects/orphans", dependencies=[Depends(require_admin)])
+async def project_orphans(limit: int = 100, db: Session = Depends(get_db)):
+    """未关联项目的周报（项目名称未匹配到项目）按名称统计；补建或改名项目后执行 python -m app.utils.project_keys 回填"""
+    return JSONResponse(content=await run_in_db(orphan_projects, db, min(max(1, limit), 1000)))
+
+
 @app.post("/admin/projects/{project_id}/delete", dependencies=[Depends(require_admin)])
 async def delete_project(project_id: int, db: Session = Depends(get_db)):
     """删除项目：直接删除项目记录；如需保护可改为仅停用"""
-    proj = db.query(Project).filter(Project.id == project_id).first()
+    proj = await run_in_db(lambda: db.query(Project).filter(Project.id == project_id).first())
     if not proj:
         return JSONResponse(content={"error": "项目不存在"}, status_code=404)
     try:
-        db.delete(proj)
-        db.commit()
+        name = proj.name
+
+        def _delete():
+            # 周报不随项目删除：改为未关联并保留项目名称，汇总行随之重新归类
+            detach_project_reports(db, project_id, name)
+            db.delete(proj)
+            db.commit()
+
+        await run_in_db_write(_delete)
+        await run_in_db_write(_after_write, [PROJECTS, SUMMARY], [name])
         return JSONResponse(content={"success": True})
     except Exception as e:
-        db.rollback()
+        await run_in_db_write(db.rollback)
         return JSONResponse(content={"error": f"删除失败: {str(e)}"}, status_code=400)
 
 @app.post("/admin/members/add")
@@ -252,7 +510,8 @@ async def add_member(
             phone=(phone.strip() or None)
         )
         db.add(member)
-        db.commit()
+        await run_in_db_write(db.commit)
+        await run_in_db_write(_after_write, [MEMBERS])
         return RedirectResponse(url="/admin/members", status_code=303)
     except Exception as e:
         return JSONResponse(content={"error": f"添加成员失败: {str(e)}"}, status_code=400)
@@ -260,11 +519,13 @@ async def add_member(
 @app.post("/admin/members/{member_id}/toggle", dependencies=[Depends(require_admin)])
 async def toggle_member_status(member_id: int, db: Session = Depends(get_db)):
     """切换成员状态（激活/停用）"""
-    member = db.query(Member).filter(Member.id == member_id).first()
+    member = await run_in_db(lambda: db.query(Member).filter(Member.id == member_id).first())
     if member:
         member.is_active = 1 - member.is_active  # 切换状态
-        db.commit()
-        return JSONResponse(content={"success": True, "is_active": member.is_active})
+        is_active = member.is_active
+        await run_in_db_write(db.commit)
+        await run_in_db_write(_after_write, [MEMBERS])
+        return JSONResponse(content={"success": True, "is_active": is_active})
     return JSONResponse(content={"error": "成员不存在"}, status_code=404)
 
 
@@ -275,7 +536,7 @@ async def update_member(
     db: Session = Depends(get_db)
 ):
     """更新成员信息（支持 JSON 提交）"""
-    member = db.query(Member).filter(Member.id == member_id).first()
+    member = await run_in_db(lambda: db.query(Member).filter(Member.id == member_id).first())
     if not member:
         return JSONResponse(content={"error": "成员不存在"}, status_code=404)
     try:
@@ -294,48 +555,93 @@ async def update_member(
 
         # 检查重名（唯一约束）
         if name != member.name:
-            exists = db.query(Member).filter(Member.name == name).first()
+            exists = await run_in_db(lambda: db.query(Member).filter(Member.name == name).first())
             if exists:
                 return JSONResponse(content={"error": "成员名称已存在"}, status_code=400)
 
+        # 成员部门/职位展示在其提交过周报的各周项目卡片中（含历史周）
+        affected = await run_in_db(member_sections, db, member_id)
         member.name = name
         member.department = (department or None)
         member.position = (position or None)
         member.email = (email or None)
         member.phone = (phone.strip() if phone else None)
-        db.commit()
+        await run_in_db_write(db.commit)
+        await run_in_db_write(_after_write, [MEMBERS, SUMMARY], sections=affected)
         return JSONResponse(content={"success": True})
     except Exception as e:
-        db.rollback()
+        await run_in_db_write(db.rollback)
         return JSONResponse(content={"error": f"更新失败: {str(e)}"}, status_code=400)
 
 
 @app.post("/admin/members/{member_id}/delete", dependencies=[Depends(require_admin)])
 async def delete_member(member_id: int, db: Session = Depends(get_db)):
     """删除成员：当存在周报关联时阻止删除，避免外键问题"""
-    member = db.query(Member).filter(Member.id == member_id).first()
+    member = await run_in_db(lambda: db.query(Member).filter(Member.id == member_id).first())
     if not member:
         return JSONResponse(content={"error": "成员不存在"}, status_code=404)
     try:
-        report_count = db.query(Report).filter(Report.member_id == member_id).count()
+        report_count = await run_in_db(lambda: db.query(Report).filter(Report.member_id == member_id).count())
         if report_count > 0:
             return JSONResponse(content={"error": "该成员存在周报记录，无法删除"}, status_code=400)
         db.delete(member)
-        db.commit()
+        await run_in_db_write(db.commit)
+        await run_in_db_write(_after_write, [MEMBERS])
         return JSONResponse(content={"success": True})
     except Exception as e:
-        db.rollback()
+        await run_in_db_write(db.rollback)
         return JSONResponse(content={"error": f"删除失败: {str(e)}"}, status_code=400)
 
 
+@app.get("/admin/reports/{report_id}/revisions", dependencies=[Depends(require_admin)])
+async def report_revision_history(report_id: int, db: Session = Depends(get_read_db)):
+    """周报修改历史（最新在前）：每次重新提交覆盖前，变化字段的旧值"""
+    revisions = await run_in_db(report_revisions, db, report_id)
+    return JSONResponse(content={"report_id": report_id, "revisions": revisions})
+
+
+@app.get("/admin/submissions/missing", dependencies=[Depends(require_admin)])
+async def submissions_missing(week: str | None = None, db: Session = Depends(get_db)):
+    """本周（或 week 指定周）尚未提交周报的活跃成员：/admin/submissions/missing?week=2024-W07"""
+    try:
+        key = normalize_week_key(week) if week else current_week_key()
+    except ValueError:
+        return JSONResponse(content={"error": "week 格式应为 YYYY-Www，如 2024-W07"}, status_code=400)
+    # 读主库：刚提交的成员应立即从名单中移除
+    missing = await run_in_db(missing_members, db, key)
+    return JSONResponse(content={
+        "week": key,
+        "missing_count": len(missing),
+        "members": [
+            {"id": m.id, "name": m.name, "department": m.department, "position": m.position, "has_phone": bool(m.phone)}
+            for m in missing
+        ],
+    })
+
+
+def _audience_mobiles(audience: str) -> list[str]:
+    """
+    钉钉 @ 对象：missing=本周尚未提交周报的成员（一次反连接查询），all=全部活跃成员（来自成员快照）。
+    名单即为全部 @ 对象，不再回退到 DINGTALK_AT_MOBILES。
+    """
+    if audience == "all":
+        return active_mobiles()
+    return [m.phone for m in current_missing_members() if m.phone]
+
+
 # 便于测试的钉钉定时发送接口：支持GET/POST
 @app.get("/admin/dingtalk/schedule", dependencies=[Depends(require_admin)])
-async def schedule_dingtalk_get(text: str = "这是一条测试钉钉消息", delay_seconds: int = 0, db: Session = Depends(get_db)):
-    """通过浏览器访问进行快速测试：/admin/dingtalk/schedule?text=...&delay_seconds=5"""
-    api_logger.info("API GET schedule dingtalk: delay=%s text_len=%s", delay_seconds, len(text or ""))
-    # 从数据库读取活跃成员手机号作为 @ 参数
-    mobiles = [m.phone for m in db.query(Member).filter(Member.is_active == 1, Member.phone != None, Member.phone != "").all()]
-    info = schedule_dingtalk_once(text=text, delay_seconds=delay_seconds, at_mobiles=mobiles)
+async def schedule_dingtalk_get(text: str = "这是一条测试钉钉消息", delay_seconds: int = 0, audience: str = "missing"):
+    """
+    通过浏览器访问进行快速测试：/admin/dingtalk/schedule?text=...&delay_seconds=5
+    audience=missing（默认）只 @ 本周尚未提交周报的成员，audience=all @ 全部活跃成员
+    """
+    api_logger.info("API GET schedule dingtalk: delay=%s text_len=%s audience=%s", delay_seconds, len(text or ""), audience)
+    mobiles = await run_in_db(_audience_mobiles, audience)
+    # 持久化调度模式下添加任务会写数据库，同样放到数据库线程池执行
+    info = await run_in_db_write(
+        schedule_dingtalk_once, text=text, delay_seconds=delay_seconds, at_mobiles=mobiles, default_at=False
+    )
     return JSONResponse(content=info)
 
 
@@ -343,11 +649,14 @@ async def schedule_dingtalk_get(text: str = "这是一条测试钉钉消息", de
 async def schedule_dingtalk_post(
     text: str = Form("这是一条测试钉钉消息"),
     delay_seconds: int = Form(0),
-    db: Session = Depends(get_db),
+    audience: str = Form("missing"),
 ):
-    api_logger.info("API POST schedule dingtalk: delay=%s text_len=%s", delay_seconds, len(text or ""))
-    mobiles = [m.phone for m in db.query(Member).filter(Member.is_active == 1, Member.phone != None, Member.phone != "").all()]
-    info = schedule_dingtalk_once(text=text, delay_seconds=delay_seconds, at_mobiles=mobiles)
+    api_logger.info("API POST schedule dingtalk: delay=%s text_len=%s audience=%s", delay_seconds, len(text or ""), audience)
+    mobiles = await run_in_db(_audience_mobiles, audience)
+    # 持久化调度模式下添加任务会写数据库，同样放到数据库线程池执行
+    info = await run_in_db_write(
+        schedule_dingtalk_once, text=text, delay_seconds=delay_seconds, at_mobiles=mobiles, default_at=False
+    )
     return JSONResponse(content=info)
 
 
@@ -356,12 +665,37 @@ async def schedule_dingtalk_post(
 async def schedule_email_get(delay_seconds: int = 0):
     """通过浏览器访问进行快速测试：/admin/email/schedule?delay_seconds=5"""
     api_logger.info("API GET schedule weekly email: delay=%s", delay_seconds)
-    info = schedule_email_once(delay_seconds=delay_seconds)
+    info = await run_in_db_write(schedule_email_once, delay_seconds=delay_seconds)
     return JSONResponse(content=info)
 
 
 @app.post("/admin/email/schedule", dependencies=[Depends(require_admin)])
 async def schedule_email_post(delay_seconds: int = Form(0)):
     api_logger.info("API POST schedule weekly email: delay=%s", delay_seconds)
-    info = schedule_email_once(delay_seconds=delay_seconds)
-    return JSONResponse(content=info)
\ No newline at end of file
+    info = await run_in_db_write(schedule_email_once, delay_seconds=delay_seconds)
+    return JSONResponse(content=info)
+
+
+@app.get("/metrics", dependencies=[Depends(require_admin)])
+async def metrics():
+    """Prometheus 文本格式指标（本进程）：抓取时通过 token 查询参数或 X-Admin-Token 请求头鉴权"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/admin/db/pool", dependencies=[Depends(require_admin)])
+async def db_pool_overview():
+    """数据库连接池使用情况（主库/只读副本）：借出连接数、溢出数、借出等待耗时与超时次数"""
+    return JSONResponse(content=pool_stats())
+
+
+# 通知发件箱：队列深度、失败（死信）消息与重新入队
+@app.get("/admin/outbox", dependencies=[Depends(require_admin)])
+async def outbox_overview(limit: int = 50):
+    return JSONResponse(content=await run_in_db(outbox_status, limit))
+
+
+@app.post("/admin/outbox/{message_id}/retry", dependencies=[Depends(require_admin)])
+async def outbox_retry(message_id: int):
+    if not await run_in_db_write(requeue, message_id):
+        return JSONResponse(content={"error": "消息不存在或不在死信状态"}, status_code=404)
+    return JSONResponse(content={"success": True})
@@ -0,0 +1,320 @@
+"""
+版本化的结构迁移：已执行的版本记录在 schema_version 表，每个迁移只执行一次。
+部署时执行一次（多个进程同时执行时由锁保证只有一个在迁移，其余等待后直接返回）：
+
+    python -m app.migrations
+    python -m app.migrations --status
+
+应用启动时只查询一次当前版本（ensure_schema）；已是最新时不做任何结构检查。
+版本落后时，DB_MIGRATE_ON_STARTUP=true（默认）在启动时执行迁移，否则拒绝启动并提示先执行上面的命令。
+
+锁：PostgreSQL 使用会话级咨询锁（pg_advisory_lock，进程退出随连接释放）；
+SQLite 等其他数据库使用 scheduler_leases 中的租约记录（持有期间后台续约，进程崩溃后 TTL 到期即可被接管）。
+
+新增迁移：在 MIGRATIONS 末尾追加 (版本号, 名称, 函数)。迁移函数接收 log（进度输出）参数，且须可重复执行——
+中途失败时该版本不会记录，修复后重新执行会从该版本重跑；升级前没有 schema_version 的旧库也会从第 1 版依次执行。
+"""
+import argparse
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, inspect, or_, select, text
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.schema import CreateTable
+from .db import (
+    Base, SessionLocal, engine, ensure_indexes, Member, Project, Report, SchedulerLease, SchemaVersion, WeeklyRollup,
+)
+
+logger = logging.getLogger("weekreport.migrations")
+
+# 启动时发现结构版本落后是否直接迁移；关闭后需在部署时执行 python -m app.migrations
+MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "true").strip().lower() in ("1", "true", "yes")
+# 等待其他进程完成迁移的最长秒数
+MIGRATION_LOCK_TIMEOUT = float(os.getenv("MIGRATION_LOCK_TIMEOUT", "600"))
+# 租约锁（非 PostgreSQL）的有效期，持有期间每 TTL/3 续约一次
+MIGRATION_LEASE_TTL = int(os.getenv("MIGRATION_LEASE_TTL", "60"))
+
+# 咨询锁的键（任意固定的 bigint，同一数据库内与其他应用的咨询锁区分即可）
+_ADVISORY_LOCK_KEY = 0x7765656B7265
+_LEASE_NAME = "schema_migration"
+_holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _migrate_report_columns():
+    """
+    轻量级迁移（只改表结构，不改写已有行，大表上也是瞬时完成）：
+    - reports 增加可空的 project_id 外键，已有周报由 utils/project_keys 分批回填；
+    - reports 增加 week_key（业务时区的 ISO 周），已有周报由 utils/week_keys 分批回填；
+    - reports 增加 submit_key / revision（重复提交改为 upsert），唯一索引由 utils/submissions 合并重复行后创建。
+    weekly_rollups 为派生数据：结构变化或周的计算方式变化时直接清空，由 backfill_rollups_if_empty 重建。
+    """
+    insp = inspect(engine)
+    tables = insp.get_table_names()
+    if "weekly_rollups" in tables and "project_id" not in [c["name"] for c in insp.get_columns("weekly_rollups")]:
+        WeeklyRollup.__table__.drop(bind=engine)
+        tables.remove("weekly_rollups")
+    if "reports" not in tables:
+        return
+    columns = [c["name"] for c in insp.get_columns("reports")]
+    with engine.begin() as conn:
+        if "project_id" not in columns:
+            conn.execute(text("ALTER TABLE reports ADD COLUMN project_id INTEGER REFERENCES projects(id)"))
+        if "submit_key" not in columns:
+            conn.execute(text("ALTER TABLE reports ADD COLUMN submit_key VARCHAR(64)"))
+        if "revision" not in columns:
+            conn.execute(text("ALTER TABLE reports ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"))
+        if "week_key" not in columns:
+            conn.execute(text("ALTER TABLE reports ADD COLUMN week_key VARCHAR(10)"))
+            # 旧汇总行按 UTC 计算周，需按业务时区重建
+            if "weekly_rollups" in tables:
+                conn.execute(text("DELETE FROM weekly_rollups"))
+        # 已被 (created_at, project_id) 索引取代的按项目名称排序的宽索引
+        conn.execute(text("DROP INDEX IF EXISTS ix_reports_created_project_member"))
+
+
+def _baseline_schema(log):
+    """建表，并把引入版本号之前的库补齐到当前模型（新增列、members.phone、缺失的非唯一索引）。"""
+    _migrate_report_columns()
+    Base.metadata.create_all(bind=engine)
+    if "phone" not in [c["name"] for c in inspect(engine).get_columns("members")]:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE members ADD COLUMN phone VARCHAR(20)"))
+    # create_all 不会给已存在的表补建索引，这里按模型声明补齐
+    ensure_indexes(Report.__table__)
+
+
+def _report_week_keys(log):
+    # 已有周报的 week_key 按业务时区回填（数据量大时提示使用命令行分批执行）
+    from .utils.week_keys import backfill_week_keys_if_small
+    backfill_week_keys_if_small(log)
+
+
+def _weekly_rollups(log):
+    # 已有周报但汇总表为空时（首次启用该表）回填
+    from .utils.rollups import backfill_rollups_if_empty
+    backfill_rollups_if_empty(log)
+
+
+def _report_project_ids(log):
+    # 已有周报的 project_id 按项目名称回填：数据量不大时直接完成，否则提示使用命令行分批执行
+    from .utils.project_keys import backfill_report_projects_if_small
+    backfill_report_projects_if_small(log)
+
+
+def _search_index(log):
+    # 全文检索索引（SQLite FTS5 / PostgreSQL GIN）：建表并在首次启用时回填
+    from .utils.search import ensure_search_index, backfill_search_index_if_empty
+    ensure_search_index()
+    backfill_search_index_if_empty(log)
+
+
+def _report_unique_indexes(log):
+    # 每个成员每周每个项目一行：合并升级前的重复周报后创建唯一索引。
+    # week_key 仍需命令行分批回填时跳过，由 python -m app.utils.week_keys 完成后创建
+    from .utils.submissions import ensure_report_unique_indexes
+    ensure_report_unique_indexes(log)
+
+
+def _default_data(log):
+    """空库时写入默认成员与项目。"""
+    db = SessionLocal()
+    try:
+        if db.query(Member.id).first() is None:
+            db.add_all([
+                Member(name="张三", department="研发部", position="高级工程师", email="zhangsan@company.com"),
+                Member(name="李四", department="产品部", position="产品经理", email="lisi@company.com"),
+                Member(name="王五", department="研发部", position="前端工程师", email="wangwu@company.com"),
+                Member(name="赵六", department="测试部", position="测试工程师", email="zhaoliu@company.com"),
+                Member(name="钱七", department="运维部", position="运维工程师", email="qianqi@company.com"),
+            ])
+        if db.query(Project.id).first() is None:
+            db.add_all([
+                Project(name="支付系统升级", description="支付通道整合与性能优化"),
+                Project(name="核心平台", description="核心服务平台建设"),
+                Project(name="移动端App", description="移动客户端迭代"),
+                Project(name="数据治理", description="数据质量与标准化治理"),
+                Project(name="运营后台", description="运营支撑后台优化"),
+            ])
+        db.commit()
+    finally:
+        db.close()
+
+
+# 按版本号顺序执行；已发布的版本不要修改或重新编号，只在末尾追加
+MIGRATIONS = [
+    (1, "baseline_schema", _baseline_schema),
+    (2, "report_week_keys", _report_week_keys),
+    (3, "weekly_rollups", _weekly_rollups),
+    (4, "report_project_ids", _report_project_ids),
+    (5, "search_index", _search_index),
+    (6, "report_unique_indexes", _report_unique_indexes),
+    (7, "default_data", _default_data),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version() -> int:
+    """数据库当前的结构版本；schema_version 表不存在（新库或引入版本号之前的库）时为 0。"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+    except (sa_exc.OperationalError, sa_exc.ProgrammingError):
+        return 0
+
+
+def _try_lease() -> bool:
+    """获取或续约迁移租约：租约不存在、已过期或本就属于本进程时成功。"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=MIGRATION_LEASE_TTL)
+    db = SessionLocal()
+    try:
+        updated = (
+            db.query(SchedulerLease)
+            .filter(
+                SchedulerLease.name == _LEASE_NAME,
+                or_(SchedulerLease.holder == _holder_id, SchedulerLease.expires_at < now),
+            )
+            .update({SchedulerLease.holder: _holder_id, SchedulerLease.expires_at: expires_at}, synchronize_session=False)
+        )
+        if not updated:
+            if db.query(SchedulerLease.name).filter(SchedulerLease.name == _LEASE_NAME).first():
+                db.rollback()
+                return False
+            db.add(SchedulerLease(name=_LEASE_NAME, holder=_holder_id, expires_at=expires_at))
+        db.commit()
+        return True
+    except sa_exc.IntegrityError:
+        # 其他进程同时插入了租约记录
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+def _release_lease():
+    db = SessionLocal()
+    try:
+        db.query(SchedulerLease).filter(
+            SchedulerLease.name == _LEASE_NAME, SchedulerLease.holder == _holder_id
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+@contextmanager
+def _advisory_lock(timeout: float):
+    with engine.connect() as conn:
+        deadline = time.monotonic() + timeout
+        while not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _ADVISORY_LOCK_KEY}).scalar():
+            conn.commit()
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"等待迁移锁超过 {timeout:g} 秒，可能有其他进程正在迁移")
+            time.sleep(1)
+        # 咨询锁为会话级，提交后仍然持有，避免连接长时间处于 idle in transaction
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+            conn.commit()
+
+
+@contextmanager
+def _lease_lock(timeout: float):
+    with engine.begin() as conn:
+        conn.execute(CreateTable(SchedulerLease.__table__, if_not_exists=True))
+    deadline = time.monotonic() + timeout
+    while not _try_lease():
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"等待迁移锁超过 {timeout:g} 秒，可能有其他进程正在迁移")
+        time.sleep(1)
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(max(1, MIGRATION_LEASE_TTL // 3)):
+            try:
+                _try_lease()
+            except Exception:
+                logger.exception("Migration lease renew failed.")
+
+    renewer = threading.Thread(target=renew, name="weekreport-migration-lease", daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        renewer.join(timeout=5)
+        _release_lease()
+
+
+def migration_lock(timeout: float = MIGRATION_LOCK_TIMEOUT):
+    """跨进程的迁移锁：同一时刻只有一个进程执行迁移，其他进程最多等待 timeout 秒。"""
+    return _advisory_lock(timeout) if engine.dialect.name == "postgresql" else _lease_lock(timeout)
+
+
+def migrate(log=logger.info, lock_timeout: float = MIGRATION_LOCK_TIMEOUT) -> list[str]:
+    """
+    执行全部未完成的迁移，返回本次执行的迁移名称；已是最新版本时不加锁直接返回。
+    进度信息默认写入日志（weekreport.migrations），命令行执行时输出到终端。
+    """
+    if current_version() >= LATEST_VERSION:
+        return []
+    applied = []
+    with migration_lock(lock_timeout):
+        with engine.begin() as conn:
+            conn.execute(CreateTable(SchemaVersion.__table__, if_not_exists=True))
+        # 加锁后重新读取：等待期间其他进程可能已完成迁移
+        version = current_version()
+        for number, name, step in MIGRATIONS:
+            if number <= version:
+                continue
+            started = time.monotonic()
+            step(log)
+            with engine.begin() as conn:
+                conn.execute(insert(SchemaVersion).values(version=number, name=name, applied_at=datetime.utcnow()))
+            log(f"已执行迁移 {number:04d}_{name}（{time.monotonic() - started:.1f}s）")
+            applied.append(name)
+    return applied
+
+
+def ensure_schema() -> int:
+    """
+    启动时调用：结构已是最新时只有一次版本查询。版本落后时按 DB_MIGRATE_ON_STARTUP 执行迁移或拒绝启动；
+    数据库版本高于代码（回滚到旧版本部署）时只记录警告。返回当前版本。
+    """
+    version = current_version()
+    if version > LATEST_VERSION:
+        logger.warning("Database schema version %s is newer than this release (%s).", version, LATEST_VERSION)
+    if version >= LATEST_VERSION:
+        return version
+    if not MIGRATE_ON_STARTUP:
+        raise RuntimeError(
+            f"数据库结构版本为 {version}，当前代码需要 {LATEST_VERSION}，请先执行 python -m app.migrations"
+        )
+    migrate()
+    return LATEST_VERSION
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="只显示当前版本与待执行的迁移；有待执行的迁移时退出码为 1")
+    parser.add_argument("--lock-timeout", type=float, default=MIGRATION_LOCK_TIMEOUT, help="等待其他进程完成迁移的最长秒数")
+    args = parser.parse_args()
+    version = current_version()
+    pending = [f"{number:04d}_{name}" for number, name, _ in MIGRATIONS if number > version]
+    if args.status:
+        print(f"当前版本 {version}，最新版本 {LATEST_VERSION}" + (f"，待执行：{', '.join(pending)}" if pending else ""))
+        sys.exit(1 if pending else 0)
+    applied = migrate(log=print, lock_timeout=args.lock_timeout)
+    print(f"完成：执行 {len(applied)} 个迁移，当前版本 {current_version()}")
+
+
+if __name__ == "__main__":
+    main()
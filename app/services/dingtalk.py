@@ -8,9 +8,47 @@ import requests
 import logging
 from typing import Optional, List
 import socket
+import threading
+from collections import deque
 
 logger = logging.getLogger("weekreport.dingtalk")
 
+# 钉钉群机器人限流约每分钟 20 条（按进程计；多 worker 时只有调度主节点发送发件箱消息）；单条消息 @ 人数上限可配置，超出时拆分为多条
+DINGTALK_RATE_PER_MINUTE = int(os.getenv("DINGTALK_RATE_PER_MINUTE", "20"))
+DINGTALK_MAX_AT_PER_MESSAGE = int(os.getenv("DINGTALK_MAX_AT_PER_MESSAGE", "50"))
+
+
+class SlidingWindowLimiter:
+    """
+    线程安全的滑动窗口限流：任意 window 秒内最多放行 limit 次，acquire 在超限时阻塞等待。
+    与令牌桶（初始满桶）不同，启动后第一个窗口内也不会超过 limit，匹配钉钉“每分钟 20 条”的配额口径。
+    """
+
+    def __init__(self, limit: int, window: float = 60.0):
+        self.limit = limit
+        self.window = window
+        self.sent: deque[float] = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.limit <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.sent and now - self.sent[0] >= self.window:
+                    self.sent.popleft()
+                if len(self.sent) < self.limit:
+                    self.sent.append(now)
+                    return
+                wait = self.window - (now - self.sent[0])
+            time.sleep(wait)
+
+
+# 复用 HTTP 连接（keep-alive），避免每条消息重新建立 TCP/TLS 连接
+_session = requests.Session()
+_limiter = SlidingWindowLimiter(DINGTALK_RATE_PER_MINUTE)
+
 
 def _gen_sign(secret: str, timestamp_ms: int) -> str:
     string_to_sign = f"{timestamp_ms}\n{secret}".encode("utf-8")
@@ -45,28 +83,80 @@ def _infer_form_url() -> str:
     return f"{scheme}://{host}:{port}/"
 
 
+def _post(webhook: str, secret: str | None, payload: dict) -> bool:
+    # 先等待限流令牌，再生成签名，确保时间戳在钉钉允许的有效期内
+    _limiter.acquire()
+    params = {}
+    if secret:
+        timestamp_ms = int(time.time() * 1000)
+        params = {"timestamp": str(timestamp_ms), "sign": _gen_sign(secret, timestamp_ms)}
+    resp = _session.post(webhook, params=params, json=payload, timeout=10)
+    ok = 200 <= resp.status_code < 300
+    # 钉钉在 HTTP 200 时仍可能返回业务错误（如发送过快 errcode=130101）
+    errcode = None
+    if ok:
+        try:
+            errcode = resp.json().get("errcode")
+        except Exception:
+            errcode = None
+        ok = not errcode
+    logger.warning("DingTalk response status=%s errcode=%s ok=%s", resp.status_code, errcode, ok)
+    return ok
+
+
+def default_at_mobiles() -> list[str]:
+    """未指定 @ 列表时使用的手机号（DINGTALK_AT_MOBILES）。"""
+    return [m.strip() for m in (os.getenv("DINGTALK_AT_MOBILES", "").split(",")) if m.strip()]
+
+
 def send_reminder(text: str, at_mobiles: Optional[List[str]] = None) -> bool:
+    return deliver_reminder(text, at_mobiles)[0]
+
+
+def deliver_reminder(text: str, at_mobiles: Optional[List[str]] = None,
+                     default_at: bool = True) -> tuple[bool, List[str]]:
+    """
+    发送提醒，返回 (是否全部发送成功, 已成功 @ 的手机号)。@ 列表过长时拆分为多条消息逐条发送，
+    部分失败时调用方（发件箱）据此只重试未送达的手机号，已收到提醒的成员不会被重复 @。
+    default_at=False 时只 @ 传入的手机号（如未提交名单），不使用环境变量中的 @ 配置；名单为空时不 @ 任何人。
+    """
     webhook = os.getenv("DINGTALK_WEBHOOK")
     secret = os.getenv("DINGTALK_SECRET")
     if not webhook:
         logger.warning("DingTalk webhook not configured, skip send.")
-        return False
-
-    timestamp_ms = int(time.time() * 1000)
-    params = {}
-    if secret:
-        sign = _gen_sign(secret, timestamp_ms)
-        params = {"timestamp": str(timestamp_ms), "sign": sign}
+        return False, []
 
     # 填写链接：优先配置，未配置时自动推断当前服务地址
     form_url = _infer_form_url()
 
     # 可选的 @ 配置：手机号或用户ID，以及是否 @ 全员
-    env_at_mobiles = [m.strip() for m in (os.getenv("DINGTALK_AT_MOBILES", "").split(",")) if m.strip()]
-    at_mobiles = at_mobiles if at_mobiles is not None and len(at_mobiles) > 0 else env_at_mobiles
-    at_user_ids = [u.strip() for u in (os.getenv("DINGTALK_AT_USER_IDS", "").split(",")) if u.strip()]
-    at_all = str(os.getenv("DINGTALK_AT_ALL", "false")).lower() in {"1", "true", "yes", "y"}
+    if default_at:
+        at_mobiles = at_mobiles if at_mobiles is not None and len(at_mobiles) > 0 else default_at_mobiles()
+        at_user_ids = [u.strip() for u in (os.getenv("DINGTALK_AT_USER_IDS", "").split(",")) if u.strip()]
+        at_all = str(os.getenv("DINGTALK_AT_ALL", "false")).lower() in {"1", "true", "yes", "y"}
+    else:
+        at_mobiles, at_user_ids, at_all = list(at_mobiles or []), [], False
 
+    # @ 列表过长时拆分为多条消息；@所有人 时只需一条
+    step = max(1, DINGTALK_MAX_AT_PER_MESSAGE)
+    chunks = [at_mobiles[i:i + step] for i in range(0, len(at_mobiles), step)] if at_mobiles and not at_all else [at_mobiles]
+
+    logger.warning("Sending DingTalk reminder. len(text)=%d messages=%d", len(text), len(chunks))
+    ok = True
+    delivered: List[str] = []
+    for chunk in chunks:
+        try:
+            sent = _post(webhook, secret, _build_payload(text, form_url, chunk, at_user_ids, at_all))
+        except Exception:
+            logger.exception("DingTalk send failed.")
+            sent = False
+        if sent:
+            delivered.extend(chunk)
+        ok = ok and sent
+    return ok, delivered
+
+
+def _build_payload(text: str, form_url: str, at_mobiles: List[str], at_user_ids: List[str], at_all: bool) -> dict:
     # 在文本中加入 @ 提示（markdown 也支持），同时提供点击入口
     at_hint = ""
     if at_all:
@@ -94,13 +184,4 @@ def send_reminder(text: str, at_mobiles: Optional[List[str]] = None) -> bool:
             **({"atMobiles": at_mobiles} if at_mobiles else {}),
             **({"atUserIds": at_user_ids} if at_user_ids else {}),
         }
-
-    try:
-        logger.warning("Sending DingTalk reminder. len(text)=%d", len(text))
-        resp = requests.post(webhook, params=params, json=payload, timeout=10)
-        ok = 200 <= resp.status_code < 300
-        logger.warning("DingTalk response status=%s ok=%s", resp.status_code, ok)
-        return ok
-    except Exception:
-        logger.exception("DingTalk send failed.")
-        return False
\ No newline at end of file
+    return payload
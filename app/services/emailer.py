@@ -1,4 +1,8 @@
 import smtplib
+import socket
+import threading
+import time
+import queue
 from email.mime.text import MIMEText
 from email.utils import formataddr
 import os
@@ -8,7 +12,8 @@ import logging
 logger = logging.getLogger("weekreport.emailer")
 
 
-def send_html_email(subject: str, html: str) -> bool:
+def _smtp_settings() -> dict | None:
+    """读取 SMTP 配置；配置不完整时记录日志并返回 None。"""
     host = os.getenv("SMTP_HOST")
     port = int(os.getenv("SMTP_PORT", "465"))
     user = os.getenv("SMTP_USER")
@@ -18,15 +23,14 @@ def send_html_email(subject: str, html: str) -> bool:
     use_tls_env = os.getenv("SMTP_USE_TLS", "").strip().lower()
     use_tls_flag = use_tls_env in ("1", "true", "yes")
 
-    if not host or not user or not password or not to_list:
+    if not host or not user or not password:
         logger.warning(
-            "SMTP config incomplete: host=%s user_present=%s pass_present=%s to_count=%s",
+            "SMTP config incomplete: host=%s user_present=%s pass_present=%s",
             host,
             bool(user),
             bool(password),
-            len(to_list),
         )
-        return False
+        return None
 
     # 网易邮箱等服务通常要求发件人地址与认证账户一致
     provider_host = (host or "").lower()
@@ -47,28 +51,265 @@ def send_html_email(subject: str, html: str) -> bool:
         )
         sender = user
 
+    return {
+        "host": host,
+        "port": port,
+        "user": user,
+        "password": password,
+        "sender": sender,
+        "to_list": to_list,
+        # 选择协议：587 端口或显式开启 SMTP_USE_TLS → STARTTLS；否则默认 SSL
+        "starttls": port == 587 or use_tls_flag,
+        "timeout": int(os.getenv("SMTP_TIMEOUT_MS", "60000")) / 1000,
+    }
+
+
+def _build_message(subject: str, html: str, sender: str, to_list: list[str], message_id: str | None = None) -> MIMEText:
     msg = MIMEText(html, "html", "utf-8")
     msg["Subject"] = subject
     msg["From"] = formataddr(("智能周报助手", sender))
     msg["To"] = ", ".join(to_list)
+    if message_id:
+        msg["Message-ID"] = message_id
+    return msg
+
+
+class _PooledConnection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.sent = 0
+        self.last_used = time.monotonic()
+        # 当前邮件是否已进入 DATA 阶段（之后失败时服务器可能已接受该邮件）
+        self.data_started = False
+
+
+class SMTPPool:
+    """
+    复用已登录的 SMTP 连接，避免每封邮件都做一次 TLS 握手与登录。
+    - max_connections：并发连接上限
+    - max_messages_per_connection：单连接发送上限，达到后主动断开重连（服务商常有此限制）
+    - rate_per_minute：全局发送速率上限（0 表示不限）
+    - idle_timeout：空闲超过该秒数的连接复用前先 NOOP 探活
+    连接断开、421（服务暂不可用）或超时发生在 DATA 之前（多为复用的连接已被服务器关闭）时自动重连并重试一次；
+    进入 DATA 后失败不重试（服务器可能已接受，重试会重复发送），由发件箱按退避策略处理。
+    """
+
+    def __init__(
+        self,
+        settings: dict,
+        max_connections: int = 2,
+        max_messages_per_connection: int = 50,
+        rate_per_minute: float = 0,
+        idle_timeout: float = 30,
+    ):
+        self.settings = settings
+        self.max_connections = max(1, max_connections)
+        self.max_messages_per_connection = max(1, max_messages_per_connection)
+        self.rate_per_minute = rate_per_minute
+        self.idle_timeout = idle_timeout
+        self._idle: queue.LifoQueue[_PooledConnection] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._rate_lock = threading.Lock()
+        self._next_send_at = 0.0
 
-    # 选择协议：587 端口或显式开启 SMTP_USE_TLS → STARTTLS；否则默认 SSL
-    try:
-        if port == 587 or use_tls_flag:
-            logger.warning("Using STARTTLS SMTP: host=%s port=%s", host, port)
-            with smtplib.SMTP(host, port) as server:
-                server.ehlo()
-                server.starttls()
-                server.ehlo()
-                server.login(user, password)
-                server.sendmail(sender, to_list, msg.as_string())
+    def _connect(self) -> _PooledConnection:
+        s = self.settings
+        if s["starttls"]:
+            logger.warning("Using STARTTLS SMTP: host=%s port=%s", s["host"], s["port"])
+            server = smtplib.SMTP(s["host"], s["port"], timeout=s["timeout"])
+            server.ehlo()
+            server.starttls()
+            server.ehlo()
         else:
-            logger.warning("Using SSL SMTP: host=%s port=%s", host, port)
-            with smtplib.SMTP_SSL(host, port) as server:
-                server.login(user, password)
-                server.sendmail(sender, to_list, msg.as_string())
+            logger.warning("Using SSL SMTP: host=%s port=%s", s["host"], s["port"])
+            server = smtplib.SMTP_SSL(s["host"], s["port"], timeout=s["timeout"])
+        server.login(s["user"], s["password"])
+        return _PooledConnection(server)
+
+    @staticmethod
+    def _discard(conn: _PooledConnection):
+        try:
+            conn.server.quit()
+        except Exception:
+            try:
+                conn.server.close()
+            except Exception:
+                pass
+
+    def _acquire(self) -> _PooledConnection:
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if time.monotonic() - conn.last_used > self.idle_timeout:
+                    try:
+                        if conn.server.noop()[0] != 250:
+                            raise smtplib.SMTPServerDisconnected("noop failed")
+                    except Exception:
+                        self._discard(conn)
+                        continue
+                return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, conn: _PooledConnection, broken: bool = False):
+        try:
+            if broken or conn.sent >= self.max_messages_per_connection:
+                self._discard(conn)
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def _throttle(self):
+        if not self.rate_per_minute or self.rate_per_minute <= 0:
+            return
+        interval = 60.0 / self.rate_per_minute
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_send_at - now
+            self._next_send_at = max(now, self._next_send_at) + interval
+        if wait > 0:
+            time.sleep(wait)
+
+    @staticmethod
+    def _is_retryable(exc: Exception) -> bool:
+        if isinstance(exc, (smtplib.SMTPServerDisconnected, socket.timeout, ConnectionError)):
+            return True
+        return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code == 421
+
+    @staticmethod
+    def _transmit(conn: _PooledConnection, sender: str, to_list: list[str], body: str):
+        """与 smtplib.sendmail 相同的步骤（MAIL / RCPT / DATA），额外记录是否已进入 DATA 阶段。"""
+        server = conn.server
+        conn.data_started = False
+        server.ehlo_or_helo_if_needed()
+        code, resp = server.mail(sender)
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, resp, sender)
+        refused = {}
+        for rcpt in to_list:
+            code, resp = server.rcpt(rcpt)
+            if code not in (250, 251):
+                refused[rcpt] = (code, resp)
+        if len(refused) == len(to_list):
+            raise smtplib.SMTPRecipientsRefused(refused)
+        conn.data_started = True
+        code, resp = server.data(body)
+        if code != 250:
+            raise smtplib.SMTPDataError(code, resp)
+
+    def send(self, msg: MIMEText, to_list: list[str]) -> bool:
+        for attempt in (1, 2):
+            self._throttle()
+            conn = None
+            try:
+                conn = self._acquire()
+                self._transmit(conn, self.settings["sender"], to_list, msg.as_string())
+                conn.sent += 1
+                self._release(conn)
+                return True
+            except Exception as e:
+                if conn is not None:
+                    self._release(conn, broken=True)
+                # 建连、登录失败（如 421 问候）同样重试一次；进入 DATA 后失败不重试
+                if attempt == 1 and (conn is None or not conn.data_started) and self._is_retryable(e):
+                    logger.warning("SMTP connection lost (%s), reconnect and retry.", e)
+                    continue
+                logger.exception("SMTP send failed: %s", str(e))
+                return False
+        return False
+
+    def send_many(self, messages: list[tuple[MIMEText, list[str]]]) -> list[bool]:
+        """批量发送，使用至多 max_connections 个线程并发，每个线程在复用的连接上顺序发送。"""
+        if not messages:
+            return []
+        results: list[bool] = [False] * len(messages)
+        cursor = iter(range(len(messages)))
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    i = next(cursor, None)
+                if i is None:
+                    return
+                msg, to_list = messages[i]
+                results[i] = self.send(msg, to_list)
+
+        threads = [threading.Thread(target=worker) for _ in range(min(self.max_connections, len(messages)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+_pool: SMTPPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPPool | None:
+    """
+    按环境变量创建全局 SMTP 连接池；SMTP 未配置时返回 None。
+    配置只在进程内首次发送时读取一次，修改 SMTP 配置后需重启服务生效。
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                settings = _smtp_settings()
+                if settings is None:
+                    return None
+                _pool = SMTPPool(
+                    settings,
+                    max_connections=int(os.getenv("SMTP_POOL_SIZE", "2")),
+                    max_messages_per_connection=int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "50")),
+                    rate_per_minute=float(os.getenv("SMTP_RATE_PER_MINUTE", "0")),
+                )
+    return _pool
+
+
+def send_html_emails(messages: list[dict]) -> list[bool]:
+    """
+    批量发送个性化邮件，messages 每项为 {"subject", "html", "to": [...], "message_id"(可选)}；
+    返回与输入一一对应的发送结果。
+    """
+    pool = get_smtp_pool()
+    if pool is None:
+        return [False] * len(messages)
+    sender = pool.settings["sender"]
+    batch = [
+        (_build_message(m["subject"], m["html"], sender, m["to"], m.get("message_id")), m["to"])
+        for m in messages
+    ]
+    results = pool.send_many(batch)
+    logger.warning("SMTP batch send done: total=%s ok=%s", len(results), sum(results))
+    return results
+
+
+def send_html_email(subject: str, html: str, message_id: str | None = None, to: list[str] | None = None) -> bool:
+    pool = get_smtp_pool()
+    if pool is None:
+        return False
+    to_list = to or pool.settings["to_list"]
+    if not to_list:
+        logger.warning("SMTP config incomplete: to_count=0")
+        return False
+    msg = _build_message(subject, html, pool.settings["sender"], to_list, message_id)
+    ok = pool.send(msg, to_list)
+    if ok:
         logger.warning("SMTP send success: subject='%s' to_count=%s", subject, len(to_list))
-        return True
-    except Exception as e:
-        logger.exception("SMTP send failed: %s", str(e))
-        return False
\ No newline at end of file
+    return ok
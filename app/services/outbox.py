@@ -0,0 +1,350 @@
+import json
+import logging
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from ..db import SessionLocal, OutboxMessage
+from ..utils.metrics import NOTIFICATION_SEND_SECONDS
+from .dingtalk import default_at_mobiles, deliver_reminder
+from .emailer import send_html_email
+
+logger = logging.getLogger("weekreport.outbox")
+
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "30"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "1800"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "2"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+# 发送租约时长：发送期间每隔 1/3 租约续期；超过该时间未续期仍处于 sending 视为处理中断（如进程崩溃）
+OUTBOX_SEND_TIMEOUT_SECONDS = int(os.getenv("OUTBOX_SEND_TIMEOUT_SECONDS", "300"))
+_STALE_ERROR = "发送结果未知（处理中断），为避免重复发送未自动重试"
+
+_wakeup = threading.Event()
+_stop = threading.Event()
+_worker_thread = None
+# 是否由本进程发送：多 worker 时只有调度主节点发送，钉钉限流配额不随 worker 数成倍放大
+_should_drain = None
+
+
+def enqueue(kind: str, payload: dict, idempotency_key: str | None = None) -> int | None:
+    """
+    写入发件箱并唤醒 worker，返回消息 id。
+    idempotency_key 已存在时不重复入队，返回已有消息 id。
+    """
+    db = SessionLocal()
+    try:
+        msg = OutboxMessage(kind=kind, payload=json.dumps(payload, ensure_ascii=False), idempotency_key=idempotency_key)
+        db.add(msg)
+        db.commit()
+        logger.info("Outbox enqueued: id=%s kind=%s key=%s", msg.id, kind, idempotency_key)
+        _wakeup.set()
+        return msg.id
+    except IntegrityError:
+        db.rollback()
+        existing = db.query(OutboxMessage.id).filter(OutboxMessage.idempotency_key == idempotency_key).first()
+        logger.info("Outbox duplicate skipped: kind=%s key=%s", kind, idempotency_key)
+        return existing.id if existing else None
+    finally:
+        db.close()
+
+
+def enqueue_dingtalk(text: str, at_mobiles: list | None = None, idempotency_key: str | None = None,
+                     default_at: bool = True) -> int | None:
+    """default_at=False：只 @ at_mobiles（可为空），不回退到 DINGTALK_AT_MOBILES 等环境变量配置。"""
+    payload = {"text": text, "at_mobiles": at_mobiles or []}
+    if not default_at:
+        payload["default_at"] = False
+    return enqueue("dingtalk", payload, idempotency_key)
+
+
+def enqueue_email(subject: str, html: str, idempotency_key: str | None = None, to: list[str] | None = None) -> int | None:
+    """to 为空时发送给 MAIL_TO 配置的收件人。"""
+    return enqueue("email", {"subject": subject, "html": html, "to": to}, idempotency_key)
+
+
+def _deliver(msg_id: int, kind: str, payload: dict) -> tuple[bool, list[str]]:
+    """发送一条消息，返回 (是否成功, 已送达的钉钉 @ 手机号)；@ 列表拆成多条发送时可能部分送达。"""
+    if kind == "dingtalk":
+        return deliver_reminder(
+            payload["text"], at_mobiles=payload.get("at_mobiles") or None, default_at=payload.get("default_at", True)
+        )
+    if kind == "email":
+        # 以发件箱 id 生成固定 Message-ID，下游可据此去重
+        return send_html_email(
+            payload["subject"], payload["html"], message_id=f"<outbox-{msg_id}@weekreport>", to=payload.get("to")
+        ), []
+    raise ValueError(f"unknown outbox kind: {kind}")
+
+
+def _backoff_seconds(attempts: int) -> float:
+    """指数退避（带 ±20% 抖动），上限 OUTBOX_BACKOFF_MAX_SECONDS。"""
+    delay = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_SECONDS * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _claim(db, msg_id: int, now: datetime) -> bool:
+    """原子地把 pending 消息置为 sending；多个 worker 并发时只有一个成功。"""
+    claimed = (
+        db.query(OutboxMessage)
+        .filter(OutboxMessage.id == msg_id, OutboxMessage.status == "pending")
+        .update(
+            {
+                OutboxMessage.status: "sending",
+                OutboxMessage.attempts: OutboxMessage.attempts + 1,
+                OutboxMessage.locked_until: now + timedelta(seconds=OUTBOX_SEND_TIMEOUT_SECONDS),
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return bool(claimed)
+
+
+def _extend_leases(msg_ids: list[int]):
+    """为发送中的消息续期租约，避免发送较慢（如等待钉钉限流）时被其他 worker 判定为处理中断。"""
+    db = SessionLocal()
+    try:
+        db.query(OutboxMessage).filter(OutboxMessage.id.in_(msg_ids), OutboxMessage.status == "sending").update(
+            {OutboxMessage.locked_until: datetime.utcnow() + timedelta(seconds=OUTBOX_SEND_TIMEOUT_SECONDS)},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _heartbeat(msg_ids: list[int], done: threading.Event):
+    while not done.wait(OUTBOX_SEND_TIMEOUT_SECONDS / 3):
+        try:
+            _extend_leases(msg_ids)
+        except Exception:
+            logger.exception("Outbox lease renew failed: ids=%s", msg_ids)
+
+
+def _ack(msg_id: int, ok: bool, error: str | None, payload: dict | None = None):
+    """确认发送结果；失败且给出 payload 时以其替换原内容（只重试未送达的部分）。"""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        msg = db.query(OutboxMessage).filter(OutboxMessage.id == msg_id).first()
+        if msg and ok and msg.status == "dead" and msg.last_error == _STALE_ERROR:
+            # 续期未及时写入（如数据库短暂不可用）而被判定为处理中断，实际已送达：以真实结果为准
+            logger.warning("Outbox late ack reconciled stale message as sent: id=%s", msg_id)
+            msg.status = "sent"
+            msg.sent_at = now
+            msg.last_error = None
+            db.commit()
+            return
+        if not msg or msg.status != "sending":
+            return
+        msg.locked_until = None
+        if ok:
+            msg.status = "sent"
+            msg.sent_at = now
+            msg.last_error = None
+        elif msg.attempts >= OUTBOX_MAX_ATTEMPTS:
+            msg.status = "dead"
+            msg.last_error = error
+            logger.warning("Outbox message dead-lettered: id=%s attempts=%s error=%s", msg_id, msg.attempts, error)
+        else:
+            msg.status = "pending"
+            msg.last_error = error
+            if payload is not None:
+                msg.payload = json.dumps(payload, ensure_ascii=False)
+            msg.next_attempt_at = now + timedelta(seconds=_backoff_seconds(msg.attempts))
+            logger.warning("Outbox send failed, retry at %s: id=%s attempts=%s", msg.next_attempt_at, msg_id, msg.attempts)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _send_group(items: list[tuple[int, str, dict]]):
+    """发送一组消息（单条，或合并后的同文案钉钉提醒）并逐条确认。"""
+    msg_id, kind, payload = items[0]
+    if len(items) > 1:
+        mobiles = list(dict.fromkeys(m for _, _, p in items for m in (p.get("at_mobiles") or [])))
+        payload = {**payload, "at_mobiles": mobiles}
+    delivered = []
+    done = threading.Event()
+    threading.Thread(
+        target=_heartbeat, args=([item_id for item_id, _, _ in items], done), name="weekreport-outbox-lease", daemon=True
+    ).start()
+    try:
+        with NOTIFICATION_SEND_SECONDS.time(channel=kind, outcome="error") as labels:
+            try:
+                ok, delivered = _deliver(msg_id, kind, payload)
+                error = None if ok else "send returned False"
+            except Exception as e:
+                logger.exception("Outbox send exception: id=%s", msg_id)
+                ok, error = False, str(e)
+            if ok:
+                labels["outcome"] = "ok"
+    finally:
+        done.set()
+    for item_id, _, item_payload in items:
+        if ok or not delivered:
+            _ack(item_id, ok, error)
+            continue
+        # 部分送达：重试时只 @ 尚未收到的成员；该消息的 @ 对象已全部送达时视为成功
+        done = set(delivered)
+        mobiles = item_payload.get("at_mobiles") or (default_at_mobiles() if item_payload.get("default_at", True) else [])
+        remaining = [m for m in mobiles if m not in done]
+        if remaining:
+            _ack(item_id, False, error, {**item_payload, "at_mobiles": remaining})
+        else:
+            _ack(item_id, True, None)
+
+
+def _merge_reminders(claimed: list[tuple[int, str, dict]]) -> list[list[tuple[int, str, dict]]]:
+    """
+    将同一批中文案相同的钉钉提醒合并为一次发送（@ 列表取并集），节省机器人限流配额；
+    未指定 @ 列表（使用环境变量默认值）或不使用环境变量 @ 配置的提醒只与同类合并。其余消息各自成组。
+    """
+    groups: dict[tuple, list] = {}
+    for item in claimed:
+        _, kind, payload = item
+        if kind == "dingtalk":
+            key = (kind, payload.get("text"), bool(payload.get("at_mobiles")), payload.get("default_at", True))
+        else:
+            key = (kind, item[0])
+        groups.setdefault(key, []).append(item)
+    return list(groups.values())
+
+
+def _recover_stale(db, now: datetime):
+    """
+    处理中断（如进程在发送后、确认前崩溃）的消息：无法判断是否已送达，
+    为避免重复发送不再自动重试，转入死信等待人工确认后重新入队。
+    """
+    stale = (
+        db.query(OutboxMessage)
+        .filter(OutboxMessage.status == "sending", OutboxMessage.locked_until < now)
+        .update(
+            {
+                OutboxMessage.status: "dead",
+                OutboxMessage.locked_until: None,
+                OutboxMessage.last_error: _STALE_ERROR,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    if stale:
+        logger.warning("Outbox stale sending messages moved to dead letter: count=%s", stale)
+
+
+def drain_once(executor: ThreadPoolExecutor, batch_size: int = 50) -> int:
+    """发送一批到期的 pending 消息，返回本批认领的数量。"""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        _recover_stale(db, now)
+        due = (
+            db.query(OutboxMessage.id, OutboxMessage.kind, OutboxMessage.payload)
+            .filter(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+            .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+            .limit(batch_size)
+            .all()
+        )
+        claimed = [(m.id, m.kind, json.loads(m.payload)) for m in due if _claim(db, m.id, now)]
+    finally:
+        db.close()
+    futures = [executor.submit(_send_group, group) for group in _merge_reminders(claimed)]
+    for f in futures:
+        f.result()
+    return len(claimed)
+
+
+def _worker_loop():
+    with ThreadPoolExecutor(max_workers=OUTBOX_CONCURRENCY, thread_name_prefix="weekreport-outbox-send") as executor:
+        while not _stop.is_set():
+            try:
+                if (_should_drain is None or _should_drain()) and drain_once(executor):
+                    continue
+            except Exception:
+                logger.exception("Outbox drain failed.")
+            _wakeup.wait(OUTBOX_POLL_SECONDS)
+            _wakeup.clear()
+
+
+def start_outbox_worker(should_drain=None):
+    """should_drain 为可选的判断函数，返回 False 时本进程暂不发送（消息留给其他 worker）。"""
+    global _worker_thread, _should_drain
+    if _worker_thread and _worker_thread.is_alive():
+        return
+    _should_drain = should_drain
+    _stop.clear()
+    _worker_thread = threading.Thread(target=_worker_loop, name="weekreport-outbox", daemon=True)
+    _worker_thread.start()
+    logger.info("Outbox worker started: concurrency=%s", OUTBOX_CONCURRENCY)
+
+
+def stop_outbox_worker():
+    _stop.set()
+    _wakeup.set()
+    if _worker_thread:
+        _worker_thread.join(timeout=5)
+
+
+def outbox_status(limit: int = 50) -> dict:
+    """队列深度与失败（死信）消息，供管理接口展示。"""
+    db = SessionLocal()
+    try:
+        counts = dict(db.query(OutboxMessage.status, func.count(OutboxMessage.id)).group_by(OutboxMessage.status).all())
+        failed = (
+            db.query(OutboxMessage)
+            .filter(OutboxMessage.status == "dead")
+            .order_by(OutboxMessage.id.desc())
+            .limit(limit)
+            .all()
+        )
+        retrying = (
+            db.query(func.count(OutboxMessage.id))
+            .filter(OutboxMessage.status == "pending", OutboxMessage.attempts > 0)
+            .scalar()
+        )
+        return {
+            "depth": counts.get("pending", 0) + counts.get("sending", 0),
+            "counts": counts,
+            "retrying": retrying,
+            "failed": [
+                {
+                    "id": m.id,
+                    "kind": m.kind,
+                    "attempts": m.attempts,
+                    "last_error": m.last_error,
+                    "created_at": m.created_at.isoformat() if m.created_at else None,
+                }
+                for m in failed
+            ],
+        }
+    finally:
+        db.close()
+
+
+def requeue(msg_id: int) -> bool:
+    """将死信消息重新入队（重置重试次数）。"""
+    db = SessionLocal()
+    try:
+        updated = (
+            db.query(OutboxMessage)
+            .filter(OutboxMessage.id == msg_id, OutboxMessage.status == "dead")
+            .update(
+                {
+                    OutboxMessage.status: "pending",
+                    OutboxMessage.attempts: 0,
+                    OutboxMessage.next_attempt_at: datetime.utcnow(),
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+    if updated:
+        _wakeup.set()
+    return bool(updated)
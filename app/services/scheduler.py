@@ -1,43 +1,105 @@
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.date import DateTrigger
+from apscheduler.events import (
+    EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES,
+)
 from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 import logging
-from ..db import SessionLocal, Member
-from ..utils.summary import generate_weekly_summary, escape_html
-from .emailer import send_html_email
-from .dingtalk import send_reminder
-from .siliconflow import summarize_weekly_html
+import os
+import socket
+import threading
+import time
+import uuid
+from ..db import SessionLocal, SchedulerLease, engine
+from ..utils.summary import generate_weekly_summary, week_report_rows, escape_html
+from ..utils.weeks import BUSINESS_TZ, current_week_key, to_business_time
+from .outbox import enqueue_dingtalk, enqueue_email
+from .siliconflow import summarize_weekly_reports
+from ..utils.missing import current_missing_members
+from ..utils.metrics import SCHEDULER_JOB_SECONDS, SCHEDULER_JOB_MISSED
 
 _scheduler = None
 logger = logging.getLogger("weekreport.scheduler")
 
+# 调度模式：local=每个进程各自的内存调度器（单 worker）；
+# leader=任务持久化到数据库，多个 worker 通过租约选出唯一主节点执行任务
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "local").strip().lower()
+LEASE_TTL_SECONDS = int(os.getenv("SCHEDULER_LEASE_TTL", "30"))
+_LEASE_NAME = "weekreport-scheduler"
+_holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_lease_stop = threading.Event()
+_lease_thread = None
+_is_leader = False
 
-def _job_dingtalk_reminder():
-    text = (
-        "每周五 10:00 周报提醒：请大家按统一格式填写，\n"
+# 周报催交：在周五 10:00 提醒之外再次提醒仍未提交的成员，逗号分隔的“星期 时:分”（业务时区），如 fri 15:00,fri 17:30；留空不催交
+DINGTALK_NUDGE_TIMES = os.getenv("DINGTALK_NUDGE_TIMES", "")
+# 提醒文本中列出的未提交成员姓名上限（@ 不受此限制）
+REMINDER_MAX_NAMES = int(os.getenv("REMINDER_MAX_NAMES", "30"))
+_NUDGE_JOB_PREFIX = "weekly_dingtalk_nudge_"
+
+
+def _parse_nudge_times(value: str) -> list[tuple[str, int, int]]:
+    """解析 DINGTALK_NUDGE_TIMES 为 [(星期, 时, 分)]；格式错误的条目记录日志后忽略。"""
+    times = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            day, clock = item.split()
+            hour, minute = (int(x) for x in clock.split(":"))
+            CronTrigger(day_of_week=day.lower(), hour=hour, minute=minute, timezone=BUSINESS_TZ)
+        except ValueError:
+            logger.warning("Invalid DINGTALK_NUDGE_TIMES entry ignored: %r", item)
+            continue
+        times.append((day.lower(), hour, minute))
+    return times
+
+
+def _reminder_text(names: list[str], nudge: bool) -> str:
+    shown = "、".join(names[:REMINDER_MAX_NAMES]) + (f" 等 {len(names)} 人" if len(names) > REMINDER_MAX_NAMES else "")
+    head = "周报催交：以下成员本周尚未提交周报，" if nudge else "每周五 10:00 周报提醒：以下成员本周尚未提交周报，"
+    return (
+        f"{head}请按统一格式填写：\n{shown}\n"
         "直达链接：访问系统首页提交周报（例如 http://localhost:8000/）。"
     )
-    logger.info("Trigger weekly DingTalk reminder job.")
-    # 从数据库读取活跃成员手机号作为 @ 参数
-    db = SessionLocal()
-    try:
-        mobiles = [m.phone for m in db.query(Member).filter(Member.is_active == 1, Member.phone != None, Member.phone != "").all()]
-    finally:
-        db.close()
-    ok = send_reminder(text, at_mobiles=mobiles)
-    logger.info("Weekly DingTalk reminder sent ok=%s", ok)
 
 
-def _job_send_weekly_email():
+def _job_dingtalk_reminder(nudge: str | None = None):
+    """
+    提醒本周尚未提交周报的活跃成员（一次查询得到名单），只 @ 这些成员；全部已提交时不发送。
+    nudge 为催交时段标识（如 fri-1500），为空时为周五 10:00 的首次提醒。
+    """
+    week = current_week_key()
+    logger.info("Trigger weekly DingTalk reminder job: week=%s nudge=%s", week, nudge)
+    missing = current_missing_members()
+    if not missing:
+        logger.info("All active members submitted for %s, reminder skipped.", week)
+        return
+    text = _reminder_text([m.name for m in missing], nudge is not None)
+    mobiles = [m.phone for m in missing if m.phone]
+    # 写入发件箱，由 outbox worker 负责发送与重试；同一周的每个提醒时段只入队一次
+    key = f"dingtalk:weekly:{week}" if nudge is None else f"dingtalk:nudge:{week}:{nudge}"
+    # 只 @ 未提交的成员：没有登记手机号时不 @，不回退到 DINGTALK_AT_MOBILES 等固定名单
+    msg_id = enqueue_dingtalk(text, at_mobiles=mobiles, idempotency_key=key, default_at=False)
+    logger.info("Weekly DingTalk reminder enqueued id=%s missing=%s", msg_id, len(missing))
+
+
+def _job_send_weekly_email(weekly: bool = False):
+    """生成周报汇总邮件并写入发件箱；weekly=True（周期任务）时同一周只入队一次，测试触发不受限制。"""
     db = SessionLocal()
     try:
         html = generate_weekly_summary(db)
+        rows = week_report_rows(db)
     finally:
         db.close()
     # 如启用硅基流动大模型摘要，则在正文前插入简洁摘要卡片
     try:
-        summary_text = summarize_weekly_html(html)
+        summary_text = summarize_weekly_reports(rows)
         if summary_text:
             insert = (
                 "<div class='card'>"
@@ -51,29 +113,211 @@ def _job_send_weekly_email():
             logger.info("Weekly email enhanced with LLM summary.")
     except Exception:
         logger.exception("Insert LLM summary failed, fallback to original HTML.")
-    subject = f"团队周报汇总 - {datetime.now():%Y-%m-%d}"
+    subject = f"团队周报汇总 - {to_business_time(datetime.utcnow()):%Y-%m-%d}"
     logger.warning("Trigger weekly email job subject=%s", subject)
-    ok = send_html_email(subject, html)
-    logger.warning("Weekly email sent ok=%s", ok)
+    key = f"email:weekly:{current_week_key()}" if weekly else None
+    msg_id = enqueue_email(subject, html, idempotency_key=key)
+    logger.warning("Weekly email enqueued id=%s", msg_id)
+
+
+def _ensure_job(func, trigger, job_id: str, kwargs: dict | None = None):
+    """
+    job store 中已有同一任务（触发器与参数不变）时保留原任务，沿用已存的 next_run_time：
+    主节点切换期间到期未执行的一次仍按 misfire_grace_time / coalesce 补执行，而不是被重新计算的下次时间跳过。
+    """
+    job = _scheduler.get_job(job_id)
+    if job is not None and repr(job.trigger) == repr(trigger) and job.kwargs == (kwargs or {}):
+        return
+    _scheduler.add_job(func, trigger, kwargs=kwargs, id=job_id, replace_existing=True)
+
+
+def _register_weekly_jobs():
+    # 固定 id：持久化 job store 中每个周期任务只保留一份；时间按业务时区（BUSINESS_TIMEZONE）。
+    # CronTrigger 实例不继承调度器的 timezone（缺省为服务器本地时区），须显式传入
+    # Friday 10:00 reminder
+    _ensure_job(
+        _job_dingtalk_reminder,
+        CronTrigger(day_of_week="fri", hour=10, minute=0, timezone=BUSINESS_TZ),
+        "weekly_dingtalk_reminder",
+    )
+    # Friday 18:00 weekly summary email
+    _ensure_job(
+        _job_send_weekly_email,
+        CronTrigger(day_of_week="fri", hour=18, minute=0, timezone=BUSINESS_TZ),
+        "weekly_summary_email",
+        kwargs={"weekly": True},
+    )
+    # 催交：只提醒仍未提交的成员；配置变更后移除持久化 job store 中已不再配置的时段
+    nudge_ids = set()
+    for day, hour, minute in _parse_nudge_times(DINGTALK_NUDGE_TIMES):
+        slot = f"{day}-{hour:02d}{minute:02d}"
+        nudge_ids.add(_NUDGE_JOB_PREFIX + slot)
+        _ensure_job(
+            _job_dingtalk_reminder,
+            CronTrigger(day_of_week=day, hour=hour, minute=minute, timezone=BUSINESS_TZ),
+            _NUDGE_JOB_PREFIX + slot,
+            kwargs={"nudge": slot},
+        )
+    for job in _scheduler.get_jobs():
+        if job.id.startswith(_NUDGE_JOB_PREFIX) and job.id not in nudge_ids:
+            _scheduler.remove_job(job.id)
+
+
+def _acquire_lease() -> bool:
+    """获取或续约主节点租约：租约不存在、已过期或本就属于本进程时成功。"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=LEASE_TTL_SECONDS)
+    db = SessionLocal()
+    try:
+        updated = (
+            db.query(SchedulerLease)
+            .filter(
+                SchedulerLease.name == _LEASE_NAME,
+                or_(SchedulerLease.holder == _holder_id, SchedulerLease.expires_at < now),
+            )
+            .update({SchedulerLease.holder: _holder_id, SchedulerLease.expires_at: expires_at}, synchronize_session=False)
+        )
+        if not updated:
+            if db.query(SchedulerLease.name).filter(SchedulerLease.name == _LEASE_NAME).first():
+                db.rollback()
+                return False
+            db.add(SchedulerLease(name=_LEASE_NAME, holder=_holder_id, expires_at=expires_at))
+        db.commit()
+        return True
+    except IntegrityError:
+        # 其他进程同时插入了租约记录
+        db.rollback()
+        return False
+    except Exception:
+        db.rollback()
+        logger.exception("Scheduler lease renew failed.")
+        return False
+    finally:
+        db.close()
+
+
+def _release_lease():
+    db = SessionLocal()
+    try:
+        db.query(SchedulerLease).filter(
+            SchedulerLease.name == _LEASE_NAME, SchedulerLease.holder == _holder_id
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Scheduler lease release failed.")
+    finally:
+        db.close()
+
+
+def _lease_loop():
+    """按 TTL/3 周期续约；成为主节点时恢复调度器，失去租约（含数据库不可用）时立即暂停。"""
+    global _is_leader
+    interval = max(1, LEASE_TTL_SECONDS // 3)
+    while not _lease_stop.is_set():
+        leader = _acquire_lease()
+        if leader and not _is_leader:
+            logger.warning("Scheduler leadership acquired: holder=%s", _holder_id)
+            _register_weekly_jobs()
+            _scheduler.resume()
+        elif not leader and _is_leader:
+            logger.warning("Scheduler leadership lost: holder=%s", _holder_id)
+            _scheduler.pause()
+        elif leader:
+            # 其他 worker 写入 job store 的一次性任务不会唤醒本进程，这里定期唤醒以便及时执行
+            _scheduler.wakeup()
+        _is_leader = leader
+        _lease_stop.wait(interval)
+
+
+def is_scheduler_leader() -> bool:
+    """local 模式下每个进程各自执行任务；leader 模式下为本进程当前是否持有主节点租约。"""
+    return SCHEDULER_MODE != "leader" or _is_leader
+
+
+_job_started: dict[str, float] = {}
+_job_started_lock = threading.Lock()
+
+
+def _job_metric_name(job_id: str) -> str:
+    # 一次性任务的 id 含随机后缀（once_<类型>_<uuid>），去掉后缀以控制指标标签数量
+    return job_id.rsplit("_", 1)[0] if job_id.startswith("once_") else job_id
+
+
+def _on_job_event(event):
+    """记录任务耗时（提交到执行器 → 执行结束）与错过执行（misfire、超过并发上限）次数。"""
+    # 默认 max_instances=1，同一任务同时只有一个实例在执行，按任务 id 配对提交与结束事件
+    key = event.job_id
+    job = _job_metric_name(event.job_id)
+    if event.code == EVENT_JOB_SUBMITTED:
+        with _job_started_lock:
+            _job_started[key] = time.perf_counter()
+    elif event.code in (EVENT_JOB_EXECUTED, EVENT_JOB_ERROR):
+        with _job_started_lock:
+            started = _job_started.pop(key, None)
+        if started is not None:
+            outcome = "error" if event.code == EVENT_JOB_ERROR else "ok"
+            SCHEDULER_JOB_SECONDS.observe(time.perf_counter() - started, job=job, outcome=outcome)
+    elif event.code == EVENT_JOB_MISSED:
+        SCHEDULER_JOB_MISSED.inc(job=job, reason="misfire")
+        logger.warning("Scheduler job missed: id=%s run_time=%s", event.job_id, event.scheduled_run_time)
+    elif event.code == EVENT_JOB_MAX_INSTANCES:
+        SCHEDULER_JOB_MISSED.inc(job=job, reason="max_instances")
+
+
+_JOB_EVENTS = EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES
 
 
 def start_scheduler():
-    global _scheduler
+    global _scheduler, _lease_thread
     if _scheduler:
         logger.info("Scheduler already started.")
         return
-    _scheduler = BackgroundScheduler()
-    # Friday 10:00 reminder
-    _scheduler.add_job(_job_dingtalk_reminder, CronTrigger(day_of_week="fri", hour=10, minute=0))
-    # Friday 18:00 weekly summary email
-    _scheduler.add_job(_job_send_weekly_email, CronTrigger(day_of_week="fri", hour=18, minute=0))
+    if SCHEDULER_MODE == "leader":
+        _scheduler = BackgroundScheduler(
+            timezone=BUSINESS_TZ,
+            jobstores={"default": SQLAlchemyJobStore(engine=engine, tablename="apscheduler_jobs")},
+            job_defaults={"coalesce": True, "misfire_grace_time": 3600},
+        )
+        _scheduler.add_listener(_on_job_event, _JOB_EVENTS)
+        # 以暂停状态启动：可向 job store 写入任务，但只有主节点会执行
+        _scheduler.start(paused=True)
+        _lease_stop.clear()
+        _lease_thread = threading.Thread(target=_lease_loop, name="weekreport-scheduler-lease", daemon=True)
+        _lease_thread.start()
+        logger.info("Scheduler started in leader mode: holder=%s", _holder_id)
+        return
+    _scheduler = BackgroundScheduler(timezone=BUSINESS_TZ)
+    _scheduler.add_listener(_on_job_event, _JOB_EVENTS)
+    _register_weekly_jobs()
     _scheduler.start()
     logger.info("Scheduler started. Weekly jobs registered.")
 
 
-def schedule_dingtalk_once(text: str, delay_seconds: int = 0, at_mobiles: list = None) -> dict:
+def stop_scheduler():
+    """进程退出时停止调度器；主节点主动释放租约，便于其他 worker 尽快接管。"""
+    global _scheduler, _is_leader
+    if not _scheduler:
+        return
+    _lease_stop.set()
+    if _lease_thread:
+        _lease_thread.join(timeout=5)
+    if _is_leader:
+        _release_lease()
+        _is_leader = False
+    if SCHEDULER_MODE == "leader":
+        # shutdown 会唤醒调度线程再处理一轮到期任务（即使处于暂停状态），此时执行器已关闭、提交失败，
+        # 却仍会推进共享 job store 中的 next_run_time，导致接管的主节点错过这次执行；先移除 job store 再关闭
+        _scheduler.remove_jobstore("default")
+    _scheduler.shutdown(wait=False)
+    _scheduler = None
+    logger.info("Scheduler stopped.")
+
+
+def schedule_dingtalk_once(text: str, delay_seconds: int = 0, at_mobiles: list = None, default_at: bool = True) -> dict:
     """
     添加一次性钉钉消息发送任务，默认立即发送；可设置延迟秒数。
+    default_at=False 时只 @ at_mobiles，不使用环境变量中的 @ 配置。
     返回计划信息：是否成功、计划时间。
     """
     global _scheduler
@@ -87,10 +331,11 @@ def schedule_dingtalk_once(text: str, delay_seconds: int = 0, at_mobiles: list =
             preview = preview[:80] + "..."
         logger.info("Schedule one-off DingTalk. delay=%s run_at=%s text='%s'", delay_seconds, run_time.isoformat(), preview)
         _scheduler.add_job(
-            send_reminder,
+            enqueue_dingtalk,
             DateTrigger(run_date=run_time),
             args=[text],
-            kwargs={"at_mobiles": at_mobiles or []}
+            kwargs={"at_mobiles": at_mobiles or [], "default_at": default_at},
+            id=f"once_dingtalk_{uuid.uuid4().hex}",
         )
         logger.info("One-off DingTalk scheduled at %s", run_time.isoformat())
         return {"scheduled": True, "run_at": run_time.isoformat(), "delay_seconds": delay_seconds}
@@ -118,6 +363,7 @@ def schedule_email_once(delay_seconds: int = 0) -> dict:
         _scheduler.add_job(
             _job_send_weekly_email,
             DateTrigger(run_date=run_time),
+            id=f"once_email_{uuid.uuid4().hex}",
         )
         logger.info("One-off Weekly Email scheduled at %s", run_time.isoformat())
         return {"scheduled": True, "run_at": run_time.isoformat(), "delay_seconds": delay_seconds}
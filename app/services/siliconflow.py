@@ -1,6 +1,15 @@
 import os
+import hashlib
+import json
 import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import requests
+from sqlalchemy.exc import IntegrityError
+from ..db import SessionLocal, LLMCacheEntry
+from ..utils.metrics import LLM_CACHE, LLM_REQUEST_SECONDS, LLM_TOKENS
 
 
 logger = logging.getLogger("weekreport.siliconflow")
@@ -14,7 +23,6 @@ def llm_summary_enabled() -> bool:
 
 def _strip_html(html: str) -> str:
     """简单移除 HTML 标签，保留换行，便于喂给大模型。"""
-    import re
     text = re.sub(r"<br\s*/?>", "\n", html or "")
     text = re.sub(r"<style[^>]*>.*?</style>", "", text, flags=re.S)
     text = re.sub(r"<script[^>]*>.*?</script>", "", text, flags=re.S)
@@ -22,78 +30,167 @@ def _strip_html(html: str) -> str:
     return text
 
 
-def summarize_weekly_html(html: str) -> str | None:
-    """
-    使用硅基流动平台的大模型对周报整体内容进行中文摘要。
-    返回纯文本摘要；失败或未启用时返回 None。
-    """
-    if not llm_summary_enabled():
-        return None
+# 提示词版本：修改提示词或输出格式后递增，使旧的缓存结果失效
+PROMPT_VERSION = "1"
 
-    api_key = os.getenv("SILICONFLOW_API_KEY")
-    base_url = os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1").rstrip("/")
-    model = os.getenv("SILICONFLOW_MODEL", "Qwen2.5-14B-Instruct")
+# 固定输出模板：map 阶段与 reduce 阶段共用，保证各段摘要格式一致、便于合并
+_FORMAT_SPEC = (
+    "请仅按以下固定格式输出，不要添加任何开头/结尾/致敬语/说明文字：\n\n"
+    "本周工作内容\n"
+    "人名A\n"
+    "- 任务1\n"
+    "- 任务2\n"
+    "人名B\n"
+    "- 任务1\n"
+    "- 任务2\n"
+    "下周待办\n"
+    "人名A\n"
+    "- 待办1\n"
+    "- 待办2\n"
+    "人名B\n"
+    "- 待办1\n"
+    "- 待办2\n"
+    "目前风险\n"
+    "- 风险描述1\n"
+    "- 风险描述2\n\n"
+    "要求：\n"
+    "- 语言为中文、内容简洁可执行；每人每部分 1-4 条；相似项合并、避免重复。\n"
+    "- 仅保留人名与事项，不含部门/职位/项目名（除非必要理解）。\n"
+    "- 无信息则写‘暂无’；无风险则输出‘暂无’。\n"
+    "- 严格保持以上标题与短横线格式，避免多余空行与额外说明。"
+)
+
+_MAP_SYSTEM_PROMPT = (
+    "你是资深项目经理。阅读输入的‘本周周报汇总’文本（表格列包含：成员、本周工作、下周计划、风险与问题），"
+    + _FORMAT_SPEC
+)
+
+_MAP_USER_PREFIX = (
+    "以下是本周周报的聚合文本（包含成员、本周工作、下周计划、风险与问题），"
+    "请抽取各成员对应的工作、下周计划与总体风险，按指定模板输出：\n\n"
+)
+
+_REDUCE_SYSTEM_PROMPT = (
+    "你是资深项目经理。输入是同一周周报按项目分段生成的多份摘要，格式相同。"
+    "请将它们合并为一份：同一人名下的条目合并去重，风险合并去重。"
+    + _FORMAT_SPEC
+)
 
+
+def _llm_config() -> dict | None:
+    api_key = os.getenv("SILICONFLOW_API_KEY")
     if not api_key:
         logger.warning("SiliconFlow API key missing, skip LLM summary.")
         return None
-
-    url = f"{base_url}/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
+    return {
+        "api_key": api_key,
+        "url": os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1").rstrip("/") + "/chat/completions",
+        "model": os.getenv("SILICONFLOW_MODEL", "Qwen2.5-14B-Instruct"),
+        "temperature": float(os.getenv("SILICONFLOW_TEMPERATURE", "0.2")),
+        "max_tokens": int(os.getenv("SILICONFLOW_MAX_TOKENS", "1024")),
+        "timeout": float(os.getenv("SILICONFLOW_TIMEOUT", "30")),
     }
 
-    content = _strip_html(html)
-    system_prompt = (
-        "你是资深项目经理。阅读输入的‘本周周报汇总’文本（表格列包含：成员、本周工作、下周计划、风险与问题），"
-        "请仅按以下固定格式输出，不要添加任何开头/结尾/致敬语/说明文字：\n\n"
-        "本周工作内容\n"
-        "人名A\n"
-        "- 任务1\n"
-        "- 任务2\n"
-        "人名B\n"
-        "- 任务1\n"
-        "- 任务2\n"
-        "下周待办\n"
-        "人名A\n"
-        "- 待办1\n"
-        "- 待办2\n"
-        "人名B\n"
-        "- 待办1\n"
-        "- 待办2\n"
-        "目前风险\n"
-        "- 风险描述1\n"
-        "- 风险描述2\n\n"
-        "要求：\n"
-        "- 语言为中文、内容简洁可执行；每人每部分 1-4 条；相似项合并、避免重复。\n"
-        "- 仅保留人名与事项，不含部门/职位/项目名（除非必要理解）。\n"
-        "- 无信息则写‘暂无’；无风险则输出‘暂无’。\n"
-        "- 严格保持以上标题与短横线格式，避免多余空行与额外说明。"
-    )
-    user_prompt = (
-        "以下是本周周报的聚合文本（包含成员、本周工作、下周计划、风险与问题），"
-        "请抽取各成员对应的工作、下周计划与总体风险，按指定模板输出：\n\n"
-        + content
+
+def llm_cache_enabled() -> bool:
+    flag = str(os.getenv("LLM_CACHE_ENABLED", "true")).strip().lower()
+    return flag in {"1", "true", "yes", "y"}
+
+
+def _cache_key(config: dict, system_prompt: str, user_prompt: str) -> str:
+    """内容寻址键：规范化空白后的提示词 + 模型 + 采样参数 + 提示词版本。"""
+    normalize = lambda text: re.sub(r"\s+", " ", text).strip()
+    material = json.dumps(
+        [PROMPT_VERSION, config["model"], config["temperature"], config["max_tokens"],
+         normalize(system_prompt), normalize(user_prompt)],
+        ensure_ascii=False,
     )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _cache_get(key: str) -> str | None:
+    ttl = timedelta(seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", "604800")))
+    db = SessionLocal()
+    try:
+        entry = db.query(LLMCacheEntry).filter(LLMCacheEntry.key == key).first()
+        if not entry or entry.created_at < datetime.utcnow() - ttl:
+            return None
+        entry.last_used_at = datetime.utcnow()
+        db.commit()
+        return entry.response
+    except Exception:
+        db.rollback()
+        logger.exception("LLM cache read failed.")
+        return None
+    finally:
+        db.close()
 
+
+def _cache_put(key: str, model: str, response: str):
+    """写入缓存并淘汰：先删除过期条目，再按最近使用时间删除超出 LLM_CACHE_MAX_ENTRIES 的部分。"""
+    ttl = timedelta(seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", "604800")))
+    max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500"))
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.merge(LLMCacheEntry(key=key, model=model, response=response, created_at=now, last_used_at=now))
+        db.query(LLMCacheEntry).filter(LLMCacheEntry.created_at < now - ttl).delete(synchronize_session=False)
+        overflow = db.query(LLMCacheEntry).count() - max_entries
+        if overflow > 0:
+            stale = [
+                k for (k,) in db.query(LLMCacheEntry.key).order_by(LLMCacheEntry.last_used_at).limit(overflow)
+            ]
+            db.query(LLMCacheEntry).filter(LLMCacheEntry.key.in_(stale)).delete(synchronize_session=False)
+        db.commit()
+    except IntegrityError:
+        # 并发写入同一键，保留先写入的结果即可
+        db.rollback()
+    except Exception:
+        db.rollback()
+        logger.exception("LLM cache write failed.")
+    finally:
+        db.close()
+
+
+def _chat(config: dict, system_prompt: str, user_prompt: str) -> str | None:
+    """调用 chat/completions，返回文本内容；失败返回 None。相同输入命中缓存时不再调用接口。"""
+    key = None
+    if llm_cache_enabled():
+        key = _cache_key(config, system_prompt, user_prompt)
+        cached = _cache_get(key)
+        if cached is not None:
+            LLM_CACHE.inc(result="hit")
+            logger.info("SiliconFlow cache hit key=%s", key[:12])
+            return cached
+        LLM_CACHE.inc(result="miss")
+    headers = {
+        "Authorization": f"Bearer {config['api_key']}",
+        "Content-Type": "application/json",
+    }
     payload = {
-        "model": model,
+        "model": config["model"],
         "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ],
-        "temperature": float(os.getenv("SILICONFLOW_TEMPERATURE", "0.2")),
-        "max_tokens": int(os.getenv("SILICONFLOW_MAX_TOKENS", "1024")),
+        "temperature": config["temperature"],
+        "max_tokens": config["max_tokens"],
     }
-
+    started = time.perf_counter()
+    outcome = "error"
     try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=30)
+        resp = requests.post(config["url"], headers=headers, json=payload, timeout=config["timeout"])
         ok = 200 <= resp.status_code < 300
         if not ok:
+            outcome = f"http_{resp.status_code}"
             logger.warning("SiliconFlow summary failed status=%s body=%s", resp.status_code, resp.text[:300])
             return None
         data = resp.json()
+        outcome = "ok"
+        usage = data.get("usage") or {}
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                LLM_TOKENS.inc(usage[kind], model=config["model"], type=kind.replace("_tokens", ""))
         text = (
             (data.get("choices") or [{}])[0]
             .get("message", {})
@@ -103,8 +200,110 @@ def summarize_weekly_html(html: str) -> str | None:
         if not text:
             logger.warning("SiliconFlow summary empty content.")
             return None
-        logger.info("SiliconFlow summary generated, len=%s", len(text))
+        if key:
+            _cache_put(key, config["model"], text)
         return text
     except Exception:
         logger.exception("SiliconFlow summary exception")
-        return None
\ No newline at end of file
+        return None
+    finally:
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=config["model"], outcome=outcome)
+
+
+def _format_report(row) -> str:
+    return (
+        f"成员：{row.member_name}\n"
+        f"本周工作：{row.work_desc}\n"
+        f"下周计划：{row.next_week_plan}\n"
+        f"风险与问题：{row.risks or '无'}\n"
+    )
+
+
+def _chunk_reports(rows, max_chars: int) -> list[str]:
+    """
+    按项目切块：小项目拼接到同一块以减少调用次数，超出 max_chars 的项目再按成员拆分。
+    rows 需按项目排序（与汇总查询一致）。
+    """
+    chunks: list[str] = []
+    current = ""
+    last_project = None
+    for row in rows:
+        text = _format_report(row)
+        header = f"\n【项目：{row.project}】\n" if row.project != last_project else ""
+        if current and len(current) + len(header) + len(text) > max_chars:
+            chunks.append(current)
+            current = ""
+            header = f"\n【项目：{row.project}】\n"
+        current += header + text
+        last_project = row.project
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _reduce(config: dict, parts: list[str], max_chars: int, pool: ThreadPoolExecutor) -> str | None:
+    """分层合并：各段摘要超出单次输入上限时先分组合并，直到只剩一份。"""
+    while len(parts) > 1:
+        groups: list[list[str]] = [[]]
+        size = 0
+        for part in parts:
+            if groups[-1] and size + len(part) > max_chars:
+                groups.append([])
+                size = 0
+            groups[-1].append(part)
+            size += len(part)
+        if len(groups) == len(parts) and len(parts) > 1:
+            # 每段都已超过上限，两两合并以保证收敛
+            groups = [parts[i:i + 2] for i in range(0, len(parts), 2)]
+        prompts = [
+            "以下是同一周周报的多份分段摘要，请合并为一份：\n\n" + "\n\n---\n\n".join(group)
+            for group in groups
+        ]
+        merged = list(pool.map(lambda p: _chat(config, _REDUCE_SYSTEM_PROMPT, p), prompts))
+        if any(m is None for m in merged):
+            return None
+        parts = merged
+    return parts[0] if parts else None
+
+
+def summarize_weekly_reports(rows) -> str | None:
+    """
+    对本周周报（结构化行，需含 project/member_name/work_desc/next_week_plan/risks 且按项目排序）
+    做 map-reduce 摘要：先按项目分块并发摘要（并发数 SILICONFLOW_CONCURRENCY），
+    再合并为固定格式输出。任一分块失败时返回 None，避免输出不完整的摘要。
+    """
+    if not llm_summary_enabled():
+        return None
+    config = _llm_config()
+    if not config:
+        return None
+    max_chars = int(os.getenv("SILICONFLOW_CHUNK_CHARS", "6000"))
+    chunks = _chunk_reports(rows, max_chars)
+    if not chunks:
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(1, int(os.getenv("SILICONFLOW_CONCURRENCY", "4")))) as pool:
+        parts = list(pool.map(lambda c: _chat(config, _MAP_SYSTEM_PROMPT, _MAP_USER_PREFIX + c), chunks))
+        if any(p is None for p in parts):
+            logger.warning("SiliconFlow map stage failed: chunks=%s failed=%s", len(chunks), parts.count(None))
+            return None
+        text = _reduce(config, parts, max_chars, pool)
+    if text:
+        logger.info("SiliconFlow summary generated, chunks=%s len=%s", len(chunks), len(text))
+    return text
+
+
+def summarize_weekly_html(html: str) -> str | None:
+    """
+    使用硅基流动平台的大模型对周报整体内容（汇总 HTML）进行中文摘要，单次调用。
+    返回纯文本摘要；失败或未启用时返回 None。周报较多时请使用 summarize_weekly_reports。
+    """
+    if not llm_summary_enabled():
+        return None
+    config = _llm_config()
+    if not config:
+        return None
+    text = _chat(config, _MAP_SYSTEM_PROMPT, _MAP_USER_PREFIX + _strip_html(html))
+    if text:
+        logger.info("SiliconFlow summary generated, len=%s", len(text))
+    return text
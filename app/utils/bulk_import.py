@@ -0,0 +1,271 @@
+import csv
+import json
+import os
+from datetime import datetime
+from typing import AsyncIterator
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from ..db import SessionLocal, Report, Member, Project
+from .project_keys import normalize_project_name
+from .rollups import record_reports
+from .search import index_reports
+from .weeks import week_key
+
+# 每批写入的行数（一次 executemany 插入 + 一次事务提交）
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+# 单次响应中返回的行级错误上限，避免错误过多时响应体过大
+MAX_REPORTED_ERRORS = 1000
+
+_REQUIRED_TEXT = ("work_desc", "next_week_plan")
+
+
+def load_lookups() -> dict:
+    """一次性加载成员（按 id / 姓名）与项目名称映射，导入过程中不再逐行查库。"""
+    db = SessionLocal()
+    try:
+        members = db.query(Member.id, Member.name).all()
+        projects = db.query(Project.id, Project.name).all()
+    finally:
+        db.close()
+    return {
+        "member_by_id": {m.id: m.name for m in members},
+        "member_by_name": {m.name.strip(): m.id for m in members},
+        "project_by_name": {normalize_project_name(p.name): (p.id, p.name) for p in projects},
+    }
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[tuple[int, dict | Exception]]:
+    """
+    增量解析请求体：NDJSON 每行一个 JSON 对象；CSV 首行为表头，支持引号内换行。
+    产出 (记录序号, dict)，单条解析失败（含非 UTF-8 编码的行）时产出 (序号, 异常) 而不中断。
+    """
+    pending = b""
+    first = True
+    header = None
+    record = ""
+    number = 0
+
+    def lines_from(data: bytes, final: bool) -> list[str | Exception]:
+        # 按字节切行后逐行解码（UTF-8 中换行符不会出现在多字节字符内），编码错误只影响所在行
+        nonlocal pending, first
+        pending += data
+        parts = pending.splitlines(keepends=True)
+        pending = b""
+        if parts and not final and not parts[-1].endswith((b"\n", b"\r")):
+            pending = parts.pop()
+        out = []
+        for part in parts:
+            try:
+                out.append(part.decode("utf-8-sig" if first else "utf-8"))
+            except UnicodeDecodeError as e:
+                out.append(ValueError(f"不是有效的 UTF-8 编码: {e.reason}"))
+            first = False
+        return out
+
+    async def feed():
+        async for chunk in chunks:
+            yield from_lines(lines_from(chunk, False))
+        yield from_lines(lines_from(b"", True))
+
+    def from_lines(lines):
+        nonlocal header, record, number
+        out = []
+        for line in lines:
+            if isinstance(line, Exception):
+                # CSV 中丢弃该行所在的未完成记录
+                record = ""
+                number += 1
+                out.append((number, line))
+                continue
+            if fmt == "csv":
+                record += line
+                # 引号未闭合说明字段内含换行，继续拼接下一行
+                if record.count('"') % 2:
+                    continue
+                text, record = record, ""
+                if not text.strip():
+                    continue
+                try:
+                    values = next(csv.reader([text]))
+                except csv.Error as e:
+                    number += 1
+                    out.append((number, e))
+                    continue
+                if header is None:
+                    header = [h.strip() for h in values]
+                    continue
+                number += 1
+                out.append((number, dict(zip(header, values))))
+            else:
+                if not line.strip():
+                    continue
+                number += 1
+                try:
+                    obj = json.loads(line)
+                    out.append((number, obj if isinstance(obj, dict) else ValueError("每行应为 JSON 对象")))
+                except (ValueError, RecursionError) as e:
+                    out.append((number, e))
+        return out
+
+    async for batch in feed():
+        for item in batch:
+            yield item
+
+
+class BulkImporter:
+    """
+    逐条校验并攒批写入：校验失败的行记录错误后跳过；
+    每批用一次 executemany 插入并在同一事务中更新周汇总，批量失败时逐行重试以定位错误行。
+    """
+
+    def __init__(self, lookups: dict, batch_size: int = BULK_BATCH_SIZE):
+        self.lookups = lookups
+        self.batch_size = max(1, batch_size)
+        self.batch: list[tuple[int, dict]] = []
+        self.inserted = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+        # 受影响的 (周标识, 项目)，用于使对应周的汇总卡片缓存失效（导入的多为历史周报）
+        self.week_projects: set[tuple[str, str]] = set()
+
+    @property
+    def batch_full(self) -> bool:
+        return len(self.batch) >= self.batch_size
+
+    def _error(self, number: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": number, "error": message})
+
+    @staticmethod
+    def _text(raw: dict, field: str) -> str:
+        """取文本字段：缺失或 null 视为空串，其他非字符串类型（数字、数组等）按行报错。"""
+        value = raw.get(field)
+        if value is None:
+            return ""
+        if not isinstance(value, str):
+            raise ValueError(f"{field} 应为字符串")
+        return value
+
+    def _validate(self, raw: dict) -> dict:
+        member_id = raw.get("member_id")
+        member_name = self._text(raw, "member_name").strip()
+        if isinstance(member_id, bool):
+            raise ValueError("member_id 必须为整数")
+        if member_id not in (None, ""):
+            try:
+                member_id = int(member_id)
+            except (TypeError, ValueError):
+                raise ValueError("member_id 必须为整数")
+            if member_id not in self.lookups["member_by_id"]:
+                raise ValueError(f"成员不存在: member_id={member_id}")
+            member_name = member_name or self.lookups["member_by_id"][member_id]
+        elif member_name:
+            member_id = self.lookups["member_by_name"].get(member_name)
+            if member_id is None:
+                raise ValueError(f"成员不存在: {member_name}")
+        else:
+            raise ValueError("缺少 member_id 或 member_name")
+
+        project_name = self._text(raw, "project")
+        project = self.lookups["project_by_name"].get(normalize_project_name(project_name))
+        if not project:
+            raise ValueError(f"项目不存在: {project_name!r}")
+        project_id, project = project
+
+        progress = raw.get("progress")
+        if isinstance(progress, bool):
+            raise ValueError("progress 必须为数字")
+        try:
+            progress = float(progress)
+        except (TypeError, ValueError):
+            raise ValueError("progress 必须为数字")
+        if not 0 <= progress <= 100:
+            raise ValueError("progress 应在 0-100 之间")
+
+        text = {field: self._text(raw, field) for field in (*_REQUIRED_TEXT, "risks")}
+        for field in _REQUIRED_TEXT:
+            if not text[field].strip():
+                raise ValueError(f"缺少 {field}")
+
+        created_at = self._text(raw, "created_at").strip()
+        if created_at:
+            try:
+                created_at = datetime.fromisoformat(created_at)
+            except ValueError:
+                raise ValueError("created_at 应为 ISO 格式，如 2024-03-01T10:00:00")
+            if created_at.tzinfo is not None:
+                raise ValueError("created_at 请使用不带时区的 UTC 时间")
+        else:
+            created_at = datetime.utcnow()
+
+        return {
+            "member_id": member_id,
+            "member_name": member_name,
+            "project_id": project_id,
+            "project": project,
+            "work_desc": text["work_desc"],
+            "progress": progress,
+            "next_week_plan": text["next_week_plan"],
+            "risks": text["risks"],
+            "created_at": created_at,
+            "week_key": week_key(created_at),
+        }
+
+    def add(self, number: int, raw: dict | Exception):
+        if isinstance(raw, Exception):
+            self._error(number, f"解析失败: {raw}")
+            return
+        try:
+            self.batch.append((number, self._validate(raw)))
+        except ValueError as e:
+            self._error(number, str(e))
+
+    @staticmethod
+    def _insert(db, rows: list[dict]):
+        # executemany + RETURNING 取回新 id（保持参数顺序），用于同步全文检索索引
+        ids = db.execute(insert(Report).returning(Report.id, sort_by_parameter_order=True), rows).scalars().all()
+        record_reports(db, rows)
+        index_reports(db, [{**row, "id": id_} for row, id_ in zip(rows, ids)])
+
+    def flush(self):
+        """写入当前批次（在数据库线程中调用）。"""
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        db = SessionLocal()
+        try:
+            try:
+                rows = [row for _, row in batch]
+                self._insert(db, rows)
+                db.commit()
+                self._done(rows)
+                return
+            except Exception:
+                db.rollback()
+            # 整批失败：逐行写入，定位失败行，其余行照常入库
+            for number, row in batch:
+                try:
+                    with db.begin_nested():
+                        self._insert(db, [row])
+                    self._done([row])
+                except IntegrityError:
+                    # 每个成员每周每个项目只保留一行（ux_reports_week_member_*），导入不覆盖已有周报
+                    self._error(number, "该成员当周已有该项目的周报")
+                except Exception as e:
+                    self._error(number, f"写入失败: {e.__class__.__name__}: {e}")
+            db.commit()
+        finally:
+            db.close()
+
+    def _done(self, rows: list[dict]):
+        self.inserted += len(rows)
+        self.week_projects.update((row["week_key"], row["project"]) for row in rows)
+
+    def result(self) -> dict:
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
@@ -0,0 +1,187 @@
+import os
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+from ..db import SessionLocal, CacheEntry
+from .metrics import CallbackGauge
+
+logger = logging.getLogger("weekreport.cache")
+
+
+class CacheBackend:
+    """
+    字符串缓存后端基类：统计命中/未命中次数。
+    set 的 since 为调用方开始读取源数据的时间戳；若该键在此之后被失效，
+    写入会被丢弃，避免并发失效后又写回旧内容。
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> str | None:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, since: float | None = None):
+        raise NotImplementedError
+
+    def invalidate(self, keys: Iterable[str]):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "hits": self.hits, "misses": self.misses}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """进程内 LRU 缓存，线程安全；仅适用于单 worker 部署。"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 256):
+        super().__init__()
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, str] = OrderedDict()
+        self._invalidated_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, str]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._data.get(key)
+                if value is not None:
+                    self._data.move_to_end(key)
+                    found[key] = value
+                self._count(value is not None)
+        return found
+
+    def set(self, key: str, value: str, since: float | None = None):
+        with self._lock:
+            if since is not None and self._invalidated_at.get(key, 0) > since:
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                old_key, _ = self._data.popitem(last=False)
+                self._invalidated_at.pop(old_key, None)
+
+    def invalidate(self, keys: Iterable[str]):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+                self._invalidated_at[key] = now
+
+    def stats(self) -> dict:
+        data = super().stats()
+        data.update({"entries": len(self._data), "max_entries": self.max_entries})
+        return data
+
+
+class DatabaseCacheBackend(CacheBackend):
+    """共享缓存：存于现有数据库的 cache_entries 表，多 worker 间失效即时可见。"""
+
+    name = "database"
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, str]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(CacheEntry.key, CacheEntry.value)
+                .filter(CacheEntry.key.in_(keys), CacheEntry.value != None)
+                .all()
+            )
+        finally:
+            db.close()
+        found = {key: value for key, value in rows}
+        for key in keys:
+            self._count(key in found)
+        return found
+
+    def set(self, key: str, value: str, since: float | None = None):
+        db = SessionLocal()
+        try:
+            entry = db.query(CacheEntry).filter(CacheEntry.key == key).first()
+            if entry is None:
+                db.add(CacheEntry(key=key, value=value, updated_at=time.time()))
+            elif since is None or entry.updated_at <= since:
+                entry.value = value
+                entry.updated_at = time.time()
+            else:
+                return
+            db.commit()
+        except Exception:
+            # 并发写入同一键时可能违反主键约束，缓存写失败不影响主流程
+            db.rollback()
+        finally:
+            db.close()
+
+    def invalidate(self, keys: Iterable[str]):
+        keys = list(keys)
+        if not keys:
+            return
+        now = time.time()
+        db = SessionLocal()
+        try:
+            # 保留失效时间戳（value 置空），用于拒绝失效前开始的渲染写回
+            existing = {
+                e.key: e for e in db.query(CacheEntry).filter(CacheEntry.key.in_(keys)).all()
+            }
+            for key in keys:
+                entry = existing.get(key)
+                if entry is None:
+                    db.add(CacheEntry(key=key, value=None, updated_at=now))
+                else:
+                    entry.value = None
+                    entry.updated_at = now
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Cache invalidate failed: keys=%s", keys)
+        finally:
+            db.close()
+
+
+_cache: CacheBackend | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> CacheBackend:
+    """按 CACHE_BACKEND 环境变量（memory/database）创建全局缓存后端。"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend = os.getenv("CACHE_BACKEND", "memory").strip().lower()
+                if backend in {"database", "db"}:
+                    _cache = DatabaseCacheBackend()
+                else:
+                    _cache = MemoryCacheBackend(int(os.getenv("CACHE_MAX_ENTRIES", "256")))
+    return _cache
+
+
+def _cache_samples():
+    stats = get_cache().stats()
+    for key in ("hits", "misses", "entries"):
+        if key in stats:
+            yield {"backend": stats["backend"], "stat": key}, stats[key]
+
+
+CallbackGauge("weekreport_summary_cache", "汇总卡片缓存命中/未命中次数与条目数", ("backend", "stat"), _cache_samples)
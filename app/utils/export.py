@@ -0,0 +1,190 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from typing import Iterator
+from xml.sax.saxutils import escape
+from ..db import SessionLocal, Report, Member, Project
+from .project_keys import report_project_name, report_project_filter
+
+# 导出列：(表头, 取值函数)
+_COLUMNS = [
+    ("ID", lambda r: r.id),
+    ("提交时间", lambda r: r.created_at.strftime("%Y-%m-%d %H:%M:%S") if r.created_at else ""),
+    ("成员", lambda r: r.member_name),
+    ("部门", lambda r: r.department or ""),
+    ("职位", lambda r: r.position or ""),
+    ("邮箱", lambda r: r.email or ""),
+    ("项目", lambda r: r.project),
+    ("进度", lambda r: r.progress),
+    ("本周工作", lambda r: r.work_desc),
+    ("下周计划", lambda r: r.next_week_plan),
+    ("风险与问题", lambda r: r.risks or ""),
+]
+
+_FETCH_BATCH = 1000
+_CHUNK_BYTES = 64 * 1024
+
+
+def _export_rows(db, start: datetime | None, end: datetime | None, project: str | None, member_id: int | None,
+                 week: str | None = None):
+    """服务端游标分批读取（yield_per），内存占用与总行数无关。"""
+    query = db.query(
+        Report.id,
+        Report.created_at,
+        Report.member_name,
+        Member.department,
+        Member.position,
+        Member.email,
+        report_project_name.label("project"),
+        Report.progress,
+        Report.work_desc,
+        Report.next_week_plan,
+        Report.risks,
+    ).outerjoin(Member, Report.member_id == Member.id).outerjoin(Project, Report.project_id == Project.id)
+    if week:
+        query = query.filter(Report.week_key == week)
+    if start:
+        query = query.filter(Report.created_at >= start)
+    if end:
+        query = query.filter(Report.created_at < end)
+    if project:
+        query = query.filter(report_project_filter(project))
+    if member_id:
+        query = query.filter(Report.member_id == member_id)
+    return query.order_by(Report.created_at, Report.id).execution_options(stream_results=True).yield_per(_FETCH_BATCH)
+
+
+def _iter_csv(rows) -> Iterator[bytes]:
+    buf = io.StringIO()
+    # BOM 便于 Excel 正确识别 UTF-8 中文
+    buf.write("\ufeff")
+    writer = csv.writer(buf)
+    writer.writerow([name for name, _ in _COLUMNS])
+    for row in rows:
+        writer.writerow([get(row) for _, get in _COLUMNS])
+        if buf.tell() >= _CHUNK_BYTES:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """不可 seek 的写入目标：zipfile 写入的数据暂存于此，由生成器取走后发送。"""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+# XML 1.0 不允许的控制字符
+_ILLEGAL_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="周报" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+def _xlsx_row(values) -> str:
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f"<c t=\"n\"><v>{value}</v></c>")
+        else:
+            text = escape(_ILLEGAL_XML.sub("", str(value)))
+            cells.append(f"<c t=\"inlineStr\"><is><t xml:space=\"preserve\">{text}</t></is></c>")
+    return "<row>" + "".join(cells) + "</row>"
+
+
+def _iter_xlsx(rows) -> Iterator[bytes]:
+    """
+    流式生成 xlsx：工作表使用内联字符串逐行写入 zip 条目，
+    zip 以数据描述符方式写入不可 seek 的输出，已压缩的数据随时取走发送。
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in _XLSX_PARTS.items():
+            zf.writestr(name, content)
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row([name for name, _ in _COLUMNS]).encode("utf-8"))
+            pending = 0
+            for row in rows:
+                data = _xlsx_row([get(row) for _, get in _COLUMNS]).encode("utf-8")
+                sheet.write(data)
+                pending += len(data)
+                if pending >= _CHUNK_BYTES:
+                    pending = 0
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+def stream_report_export(
+    fmt: str = "csv",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    project: str | None = None,
+    member_id: int | None = None,
+    session_factory=SessionLocal,
+    week: str | None = None,
+) -> Iterator[bytes]:
+    """按业务周、日期区间 [start, end)、项目、成员筛选导出周报，自带会话（可指定只读副本），供 StreamingResponse 使用。"""
+    db = session_factory()
+    try:
+        rows = _export_rows(db, start, end, project, member_id, week)
+        yield from (_iter_xlsx(rows) if fmt == "xlsx" else _iter_csv(rows))
+    finally:
+        db.close()
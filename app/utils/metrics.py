@@ -0,0 +1,264 @@
+"""
+进程内指标注册表，按 Prometheus 文本格式（0.0.4）输出，供 /metrics 抓取。
+多 worker 部署时每个进程各自计数，抓取到的是处理该请求的 worker 的数据。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable
+
+# 默认耗时分桶（秒）：覆盖毫秒级查询到分钟级的 LLM / 定时任务
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry: list["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: tuple = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：[各分桶计数..., 总和, 总数]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：退出时记录耗时；可在块内修改 labels（如根据结果设置 outcome）。"""
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        inf = 'le="+Inf"'
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {state[-1]}')
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """抓取时通过回调取值的 gauge；回调返回 [(标签 dict, 值)]，回调异常时本次不输出样本。"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str], callback: Callable):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self) -> list[str]:
+        try:
+            items = list(self.callback())
+        except Exception:
+            return []
+        return [
+            f"{self.name}{_format_labels(self.labelnames, self._key(labels))} {_format_value(value)}"
+            for labels, value in items
+            if value is not None
+        ]
+
+
+def render_metrics() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(m.render() for m in metrics) + "\n"
+
+
+# ---- 各模块共用的指标定义 ----
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "weekreport_http_request_duration_seconds", "HTTP 请求耗时（含流式响应发送完毕）", ("method", "route", "status")
+)
+DB_QUERY_SECONDS = Histogram(
+    "weekreport_db_query_duration_seconds", "数据库语句执行耗时", ("engine", "statement")
+)
+SUMMARY_RENDER_SECONDS = Histogram(
+    "weekreport_summary_render_seconds", "周报汇总 HTML 渲染耗时（不含等待客户端接收的时间）"
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "weekreport_llm_request_duration_seconds", "大模型接口调用耗时", ("model", "outcome")
+)
+LLM_TOKENS = Counter("weekreport_llm_tokens_total", "大模型接口消耗的 token 数", ("model", "type"))
+LLM_CACHE = Counter("weekreport_llm_cache_total", "大模型结果缓存命中情况", ("result",))
+NOTIFICATION_SEND_SECONDS = Histogram(
+    "weekreport_notification_send_duration_seconds", "通知发送耗时（邮件 SMTP / 钉钉）", ("channel", "outcome")
+)
+HTTP_DB_QUERIES = Histogram(
+    "weekreport_http_db_queries", "每个请求执行的数据库语句数", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+HTTP_DB_QUERY_SECONDS = Histogram(
+    "weekreport_http_db_query_seconds", "每个请求的数据库语句累计耗时", ("method", "route")
+)
+SCHEDULER_JOB_SECONDS = Histogram(
+    "weekreport_scheduler_job_duration_seconds", "定时任务执行耗时", ("job", "outcome")
+)
+SCHEDULER_JOB_MISSED = Counter(
+    "weekreport_scheduler_job_missed_total", "定时任务错过执行次数（misfire / 超过并发上限被跳过）", ("job", "reason")
+)
+
+
+class _RequestQueries:
+    """单个请求的数据库语句计数与累计耗时；请求的语句可能在多个数据库线程中执行，累加时加锁。"""
+
+    __slots__ = ("count", "seconds", "lock")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.count += 1
+            self.seconds += seconds
+
+
+# 当前请求的语句统计：由 MetricsMiddleware 设置，db.run_in_db 等把上下文复制到数据库线程池中
+_request_queries: ContextVar[_RequestQueries | None] = ContextVar("weekreport_request_queries", default=None)
+
+
+def _statement_type(statement: str) -> str:
+    head = statement.lstrip()[:8].lower()
+    for kind in ("select", "insert", "update", "delete"):
+        if head.startswith(kind):
+            return kind
+    return "other"
+
+
+def instrument_engine(engine, name: str):
+    """通过引擎事件记录每条语句的执行耗时（按引擎与语句类型分组），并计入当前请求的语句统计。"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._weekreport_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_weekreport_started", None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            DB_QUERY_SECONDS.observe(elapsed, engine=name, statement=_statement_type(statement))
+            queries = _request_queries.get()
+            if queries is not None:
+                queries.add(elapsed)
+
+
+class MetricsMiddleware:
+    """
+    纯 ASGI 中间件：按路由模板（而非实际路径）记录请求耗时与每个请求的数据库语句数、语句累计耗时，
+    避免标签基数随路径参数膨胀。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        queries = _RequestQueries()
+        token = _request_queries.set(queries)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=scope["method"], route=route, status=status)
+            HTTP_DB_QUERIES.observe(queries.count, method=scope["method"], route=route)
+            HTTP_DB_QUERY_SECONDS.observe(queries.seconds, method=scope["method"], route=route)
@@ -0,0 +1,31 @@
+"""
+未提交周报的成员：活跃成员与当周周报的一次反连接查询（NOT EXISTS，走 ix_reports_week_member 索引），
+查询次数与团队规模无关。用于管理端查看与钉钉提醒（只 @ 尚未提交的成员）。
+"""
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+from ..db import SessionLocal, Member, Report
+from .refdata import MemberInfo
+from .weeks import current_week_key
+
+
+def missing_members(db: Session, week: str | None = None) -> list[MemberInfo]:
+    """week 周（默认本周）尚未提交任何周报的活跃成员，按姓名排序。"""
+    week = week or current_week_key()
+    submitted = exists().where(Report.week_key == week, Report.member_id == Member.id)
+    rows = (
+        db.query(Member.id, Member.name, Member.department, Member.position, Member.email, Member.phone)
+        .filter(Member.is_active == 1, ~submitted)
+        .order_by(Member.name)
+        .all()
+    )
+    return [MemberInfo(*row) for row in rows]
+
+
+def current_missing_members() -> list[MemberInfo]:
+    """自带会话的版本，供定时任务使用；读主库，避免副本延迟导致刚提交的成员仍被提醒。"""
+    db = SessionLocal()
+    try:
+        return missing_members(db)
+    finally:
+        db.close()
@@ -0,0 +1,241 @@
+"""
+周报与项目的整数外键关联（reports.project_id）：提交/导入时按名称解析项目 id；
+已有周报按名称分批回填，未匹配到项目的保留为孤儿周报（project_id 为空，按原始名称展示）。
+
+回填可在线执行：每批只处理一小段 id 区间并单独提交，不长时间持有锁；
+进度由数据本身记录（只扫描 project_id 为空的行，走部分索引 ix_reports_unlinked），中断后重新执行即可续跑。
+
+    python -m app.utils.project_keys --chunk-size 5000 --pause 0.05
+    python -m app.utils.project_keys --orphans
+"""
+import argparse
+import os
+import time
+from sqlalchemy import and_, exists, func, or_, select, update
+from sqlalchemy.orm import Session, aliased
+from ..db import SessionLocal, Project, Report, WeeklyRollup
+from .refdata import project_list
+from .versions import SUMMARY, bump_versions
+
+# 回填每批处理的周报数（一批一个事务）
+PROJECT_BACKFILL_CHUNK = int(os.getenv("PROJECT_BACKFILL_CHUNK", "5000"))
+# 迁移（app/migrations）时可关联的周报不超过该数量则直接回填，否则只打印提示，由命令行分批执行
+PROJECT_BACKFILL_STARTUP_LIMIT = int(os.getenv("PROJECT_BACKFILL_STARTUP_LIMIT", "50000"))
+
+# 展示用的项目名称：已关联的取项目当前名称（改名后历史周报随之更新），未关联的取提交时的名称
+report_project_name = func.coalesce(Project.name, Report.project)
+
+
+def normalize_project_name(name: str | None) -> str:
+    """名称匹配规则：忽略首尾空白与大小写（与批量导入一致）。"""
+    return (name or "").strip().lower()
+
+
+def project_id_of(name: str):
+    """项目名称对应 id 的标量子查询（名称唯一），按名称过滤时转换为整数键比较。"""
+    return select(Project.id).where(Project.name == name).scalar_subquery()
+
+
+def report_project_filter(name: str):
+    """按项目名称过滤周报：已关联的按 project_id（含改名前提交的周报），未关联的按原始名称。"""
+    return or_(
+        Report.project_id == project_id_of(name),
+        and_(Report.project_id.is_(None), Report.project == name),
+    )
+
+
+def resolve_project(db: Session, name: str) -> tuple[int, str] | None:
+    """按名称解析项目，返回 (id, 当前名称)，未匹配返回 None；优先使用进程内项目快照（在数据库线程中调用）。"""
+    key = normalize_project_name(name)
+    if not key:
+        return None
+    for project in project_list().items:
+        if normalize_project_name(project.name) == key:
+            return project.id, project.name
+    # 快照可能尚未包含其他 worker 刚添加的项目
+    row = db.query(Project.id, Project.name).filter(func.lower(Project.name) == key).first()
+    return (row.id, row.name) if row else None
+
+
+def _project_lookup(db: Session) -> dict[str, int]:
+    lookup: dict[str, int] = {}
+    for project_id, name in db.query(Project.id, Project.name).order_by(Project.id):
+        lookup.setdefault(normalize_project_name(name), project_id)
+    return lookup
+
+
+def backfill_chunk(db: Session, lookup: dict[str, int], after_id: int, chunk_size: int) -> tuple[int, int, int]:
+    """
+    关联 id > after_id 的下一批未关联周报并同步周汇总（调用方负责 commit）。
+    返回 (扫描行数, 关联行数, 本批最大 id)；扫描行数为 0 表示已扫描完毕。
+    """
+    # rollups / submissions 依赖本模块，在函数内导入避免循环引用
+    from .rollups import record_reports, retract_reports
+    from .submissions import unique_indexes_ready
+
+    rows = (
+        db.query(
+            Report.id, Report.project_id, Report.project, Report.member_id, Report.member_name,
+            Report.progress, Report.risks, Report.created_at, Report.week_key,
+        )
+        .filter(Report.project_id.is_(None), Report.id > after_id)
+        .order_by(Report.id)
+        .limit(chunk_size)
+        .all()
+    )
+    if not rows:
+        return 0, 0, after_id
+    # 每个成员每周每个项目只能有一行：唯一索引已创建时，同一批内按名称映射到同一项目的多行只关联最新的一行，
+    # 该成员当周已有该项目周报的保持未关联（可在 /admin/projects/orphans 查看）。
+    # 唯一索引尚未创建（升级过程中）时直接关联，重复行随后由 utils/submissions 合并
+    unique = unique_indexes_ready()
+    targets: dict[tuple, int] = {}
+    for row in rows:
+        project_id = lookup.get(normalize_project_name(row.project))
+        if project_id:
+            targets[(project_id, row.week_key, row.member_id) if unique and row.week_key else (project_id, row.id)] = row.id
+    by_project: dict[int, list[int]] = {}
+    for key, report_id in targets.items():
+        by_project.setdefault(key[0], []).append(report_id)
+
+    linked: set[int] = set()
+    existing = aliased(Report)
+    for project_id, ids in by_project.items():
+        # 只更新仍未关联的行，多个回填进程并发执行时同一行只会被处理一次
+        conditions = [Report.id.in_(ids), Report.project_id.is_(None)]
+        if unique:
+            conditions.append(~exists().where(
+                existing.week_key == Report.week_key,
+                existing.member_id == Report.member_id,
+                existing.project_id == project_id,
+            ))
+        stmt = (
+            update(Report)
+            .where(*conditions)
+            .values(project_id=project_id)
+            .returning(Report.id)
+            .execution_options(synchronize_session=False)
+        )
+        linked.update(db.execute(stmt).scalars())
+
+    # 汇总行按项目键存储：把这些周报的计数从按名称归类的汇总行移到项目的汇总行
+    moved = [row._asdict() for row in rows if row.id in linked]
+    if moved:
+        retract_reports(db, moved)
+        record_reports(db, [{**row, "project_id": lookup[normalize_project_name(row["project"])]} for row in moved])
+    return len(rows), len(linked), rows[-1].id
+
+
+def backfill_report_projects(chunk_size: int = PROJECT_BACKFILL_CHUNK, pause: float = 0.0, after_id: int = 0,
+                             log=print) -> dict:
+    """
+    按名称为所有未关联的周报回填 project_id，每批单独提交；pause 为批间休眠秒数，用于降低对线上写入的影响。
+    after_id 可跳过已确认无法关联的前段 id（进度日志中的 last_id）。
+    """
+    db = SessionLocal()
+    scanned = linked = 0
+    cursor = after_id
+    started = time.monotonic()
+    try:
+        lookup = _project_lookup(db)
+        while True:
+            n, m, cursor = backfill_chunk(db, lookup, cursor, chunk_size)
+            db.commit()
+            if not n:
+                break
+            scanned += n
+            linked += m
+            log(f"scanned={scanned} linked={linked} last_id={cursor} elapsed={time.monotonic() - started:.1f}s")
+            if pause:
+                time.sleep(pause)
+        orphans = orphan_projects(db)
+    finally:
+        db.close()
+    if linked:
+        # 其他进程中的汇总页 ETag 随之失效
+        bump_versions(SUMMARY)
+    return {
+        "scanned": scanned,
+        "linked": linked,
+        "last_id": cursor,
+        "orphan_reports": sum(item["reports"] for item in orphans),
+        "orphans": orphans,
+    }
+
+
+def orphan_projects(db: Session, limit: int = 100) -> list[dict]:
+    """未关联项目的周报按原始项目名称分组统计，周报数多的在前。"""
+    rows = (
+        db.query(Report.project, func.count(Report.id), func.min(Report.created_at), func.max(Report.created_at))
+        .filter(Report.project_id.is_(None))
+        .group_by(Report.project)
+        .order_by(func.count(Report.id).desc(), Report.project)
+        .limit(limit)
+    )
+    return [
+        {
+            "project": project,
+            "reports": count,
+            "first_at": first_at.isoformat() if first_at else None,
+            "last_at": last_at.isoformat() if last_at else None,
+        }
+        for project, count, first_at, last_at in rows
+    ]
+
+
+def backfill_report_projects_if_small(log=print):
+    """迁移时调用：可按名称关联的周报数量不大时直接回填，否则提示使用命令行分批执行。"""
+    db = SessionLocal()
+    try:
+        names = list(_project_lookup(db))
+        pending = db.query(func.count(Report.id)).filter(
+            Report.project_id.is_(None), func.lower(func.trim(Report.project)).in_(names)
+        ).scalar() if names else 0
+    finally:
+        db.close()
+    if not pending:
+        return
+    if pending > PROJECT_BACKFILL_STARTUP_LIMIT:
+        log(f"有 {pending} 条周报待关联项目，请执行 python -m app.utils.project_keys 分批回填")
+        return
+    result = backfill_report_projects(log=lambda _: None)
+    log(f"已回填 reports.project_id: {result['linked']} 条，未关联项目的周报 {result['orphan_reports']} 条")
+
+
+def detach_project_reports(db: Session, project_id: int, name: str):
+    """删除项目前调用（调用方负责 commit）：其周报改为未关联（保留删除前的项目名称），并重新计算受影响的汇总行。"""
+    from .rollups import recompute_rollups
+    week_members: dict[str, set[int]] = {}
+    for week, member_id in (
+        db.query(WeeklyRollup.week, WeeklyRollup.member_id).filter(WeeklyRollup.project_id == project_id).distinct()
+    ):
+        week_members.setdefault(week, set()).add(member_id)
+    db.query(Report).filter(Report.project_id == project_id).update(
+        {Report.project_id: None, Report.project: name}, synchronize_session=False
+    )
+    recompute_rollups(db, week_members)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=PROJECT_BACKFILL_CHUNK, help="每批处理的周报数")
+    parser.add_argument("--pause", type=float, default=0.0, help="批间休眠秒数")
+    parser.add_argument("--after-id", type=int, default=0, help="从该 id 之后开始扫描")
+    parser.add_argument("--orphans", action="store_true", help="只列出未关联项目的周报统计")
+    args = parser.parse_args()
+
+    if not args.orphans:
+        result = backfill_report_projects(args.chunk_size, args.pause, args.after_id)
+        print(f"完成：扫描 {result['scanned']} 条，关联 {result['linked']} 条，"
+              f"未关联项目的周报 {result['orphan_reports']} 条")
+    db = SessionLocal()
+    try:
+        orphans = orphan_projects(db)
+    finally:
+        db.close()
+    for item in orphans:
+        print(f"{item['reports']:>8}  {item['project']}  ({item['first_at']} ~ {item['last_at']})")
+
+
+if __name__ == "__main__":
+    main()
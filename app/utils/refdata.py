@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from typing import Callable
+from ..db import ReadSessionLocal, Member, Project
+from .versions import MEMBERS, PROJECTS, get_version
+
+# 距上次确认版本号超过该秒数时，读取前先查询一次版本号（其他 worker 的修改最多延迟这么久可见）；
+# 间隔内直接返回内存中的快照，不访问数据库。本进程内的写操作会立即失效
+REFDATA_CHECK_SECONDS = float(os.getenv("REFDATA_CHECK_SECONDS", "5"))
+
+MemberInfo = namedtuple("MemberInfo", "id name department position email phone")
+ProjectInfo = namedtuple("ProjectInfo", "id name description start_date expected_end_date")
+
+Snapshot = namedtuple("Snapshot", "version updated_at items")
+
+
+class ReferenceCache:
+    """
+    读穿缓存：以 resource_versions 中的版本号作为版本戳。
+    快照为不可变的元组列表，可在线程间共享；重新加载由锁串行化。
+    """
+
+    def __init__(self, resource: str, loader: Callable[[], list]):
+        self.resource = resource
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._snapshot: Snapshot | None = None
+        self._checked_at = 0.0
+        # 每次失效递增；加载期间发生失效时不保存（可能已过时的）加载结果
+        self._generation = 0
+
+    def fresh(self) -> Snapshot | None:
+        """无需确认版本号即可使用的快照；需要访问数据库时返回 None（可在事件循环中直接调用）。"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < REFDATA_CHECK_SECONDS:
+            return snapshot
+        return None
+
+    def get(self) -> Snapshot:
+        snapshot = self.fresh()
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - self._checked_at < REFDATA_CHECK_SECONDS:
+                return snapshot
+            generation = self._generation
+            # 先读版本号再读数据：两次读取之间若有写入，下次检查时版本号不同会再次加载
+            version, updated_at = get_version(self.resource, ReadSessionLocal)
+            if snapshot is None or snapshot.version != version:
+                snapshot = Snapshot(version, updated_at, self.loader())
+            if generation == self._generation:
+                self._snapshot = snapshot
+                self._checked_at = time.monotonic()
+            return snapshot
+
+    def invalidate(self):
+        # 不加锁，避免等待正在进行的加载；加载方通过 generation 发现失效后不会保存结果
+        self._generation += 1
+        self._snapshot = None
+
+
+def _load_members() -> list[MemberInfo]:
+    db = ReadSessionLocal()
+    try:
+        rows = (
+            db.query(Member.id, Member.name, Member.department, Member.position, Member.email, Member.phone)
+            .filter(Member.is_active == 1)
+            .order_by(Member.name)
+            .all()
+        )
+        return [MemberInfo(*row) for row in rows]
+    finally:
+        db.close()
+
+
+def _load_projects() -> list[ProjectInfo]:
+    db = ReadSessionLocal()
+    try:
+        rows = (
+            db.query(Project.id, Project.name, Project.description, Project.start_date, Project.expected_end_date)
+            .order_by(Project.name)
+            .all()
+        )
+        return [ProjectInfo(*row) for row in rows]
+    finally:
+        db.close()
+
+
+_caches = {
+    MEMBERS: ReferenceCache(MEMBERS, _load_members),
+    PROJECTS: ReferenceCache(PROJECTS, _load_projects),
+}
+
+
+def active_members() -> Snapshot:
+    """活跃成员（按姓名排序）及其版本号。"""
+    return _caches[MEMBERS].get()
+
+
+def active_mobiles() -> list[str]:
+    """活跃成员中已填写手机号的列表，用于钉钉 @。"""
+    return [m.phone for m in active_members().items if m.phone]
+
+
+def project_list() -> Snapshot:
+    """全部项目（按名称排序）及其版本号。"""
+    return _caches[PROJECTS].get()
+
+
+def fresh_snapshot(resource: str) -> Snapshot | None:
+    """不访问数据库的快速路径：快照仍在检查间隔内时返回，否则返回 None，调用方再经 run_in_db 调用读取函数。"""
+    return _caches[resource].fresh()
+
+
+def invalidate_reference_data(*resources: str):
+    """写操作提交后调用（与 bump_versions 配合）：立即丢弃本进程的快照。"""
+    for name in resources:
+        cache = _caches.get(name)
+        if cache:
+            cache.invalidate()
@@ -0,0 +1,284 @@
+from datetime import datetime
+from sqlalchemy import and_, bindparam, case, delete, func, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..db import SessionLocal, Project, Report, WeeklyRollup
+from .weeks import week_key
+from .project_keys import project_id_of
+
+
+def _has_risk(risks: str | None) -> bool:
+    return bool((risks or "").strip())
+
+
+def _project_key(project_id: int | None, project: str) -> tuple[int, str]:
+    """汇总行的项目键：已关联的周报按 (project_id, "")，未关联的按 (0, 项目名称)。"""
+    return (project_id, "") if project_id else (0, project)
+
+
+# 展示用的项目名称：已关联的取项目当前名称（改名后历史汇总随之更新），未关联的取原始名称
+_rollup_project_name = func.coalesce(Project.name, WeeklyRollup.project)
+
+
+def _apply_delta(db: Session, week: str, project_key: tuple[int, str], member_id: int, delta: dict):
+    """
+    将一组增量累加到 (week, 项目键, member_id) 汇总行（调用方负责 commit）。
+    先尝试原子 UPDATE；不存在时插入，并发插入冲突则回退为 UPDATE。
+    """
+    project_id, project = project_key
+    key = (
+        WeeklyRollup.week == week,
+        WeeklyRollup.project_id == project_id,
+        WeeklyRollup.project == project,
+        WeeklyRollup.member_id == member_id,
+    )
+    # 仅当增量中的提交时间不早于已有记录时才覆盖“最新”字段（历史数据可能乱序导入）
+    newer = or_(WeeklyRollup.last_report_at == None, WeeklyRollup.last_report_at <= delta["last_report_at"])
+    changes = {
+        WeeklyRollup.report_count: WeeklyRollup.report_count + delta["report_count"],
+        WeeklyRollup.progress_sum: WeeklyRollup.progress_sum + delta["progress_sum"],
+        WeeklyRollup.last_progress: case((newer, delta["last_progress"]), else_=WeeklyRollup.last_progress),
+        WeeklyRollup.member_name: case((newer, delta["member_name"]), else_=WeeklyRollup.member_name),
+        WeeklyRollup.last_report_at: case((newer, delta["last_report_at"]), else_=WeeklyRollup.last_report_at),
+        WeeklyRollup.risk_count: WeeklyRollup.risk_count + delta["risk_count"],
+    }
+    if db.query(WeeklyRollup).filter(*key).update(changes, synchronize_session=False):
+        return
+    try:
+        with db.begin_nested():
+            db.add(WeeklyRollup(week=week, project_id=project_id, project=project, member_id=member_id, **delta))
+    except IntegrityError:
+        db.query(WeeklyRollup).filter(*key).update(changes, synchronize_session=False)
+
+
+# 支持 INSERT ... ON CONFLICT DO UPDATE 的数据库：批量增量用一次 executemany 完成
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+_ROLLUP_KEY = ("week", "project_id", "project", "member_id")
+
+
+def _upsert_deltas(db: Session, insert, acc: dict):
+    stmt = insert(WeeklyRollup)
+    new = stmt.excluded
+    newer = or_(WeeklyRollup.last_report_at == None, WeeklyRollup.last_report_at <= new.last_report_at)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(_ROLLUP_KEY),
+        set_={
+            "report_count": WeeklyRollup.report_count + new.report_count,
+            "progress_sum": WeeklyRollup.progress_sum + new.progress_sum,
+            "last_progress": case((newer, new.last_progress), else_=WeeklyRollup.last_progress),
+            "member_name": case((newer, new.member_name), else_=WeeklyRollup.member_name),
+            "last_report_at": case((newer, new.last_report_at), else_=WeeklyRollup.last_report_at),
+            "risk_count": WeeklyRollup.risk_count + new.risk_count,
+        },
+    )
+    db.connection().execute(stmt, _rollup_values(acc))
+
+
+def _rollup_values(acc: dict) -> list[dict]:
+    return [
+        {"week": week, "project_id": project_id, "project": project, "member_id": member_id, **delta}
+        for (week, (project_id, project), member_id), delta in acc.items()
+    ]
+
+
+def _accumulate(acc: dict, week: str, project_key: tuple[int, str], member_id: int, member_name: str,
+                progress: float, risks: str | None, created_at: datetime):
+    item = acc.get((week, project_key, member_id))
+    if item is None:
+        item = acc[(week, project_key, member_id)] = {"report_count": 0, "progress_sum": 0.0, "risk_count": 0}
+    item["report_count"] += 1
+    item["progress_sum"] += progress
+    item["risk_count"] += 1 if _has_risk(risks) else 0
+    # 历史数据可能乱序导入，“最新进度”以提交时间最晚者为准
+    if item.get("last_report_at") is None or created_at >= item["last_report_at"]:
+        item["last_progress"] = progress
+        item["last_report_at"] = created_at
+        item["member_name"] = member_name
+
+
+def record_report(db: Session, report: Report):
+    """在提交周报的同一事务中增量更新汇总行（调用方负责 commit）。"""
+    record_reports(db, [report])
+
+
+def record_reports(db: Session, reports) -> None:
+    """
+    批量版本：先在内存中按 (周, 项目, 成员) 合并增量，每个键只执行一次更新；
+    SQLite / PostgreSQL 上合并为一次 executemany 的 upsert。
+    reports 可以是 Report 对象或含相同字段名的 dict。
+    """
+    acc = _deltas(reports)
+    if not acc:
+        return
+    insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        _upsert_deltas(db, insert, acc)
+        return
+    for (week, project_key, member_id), delta in acc.items():
+        _apply_delta(db, week, project_key, member_id, delta)
+
+
+def _deltas(reports) -> dict[tuple, dict]:
+    acc: dict[tuple, dict] = {}
+    for r in reports:
+        get = r.get if isinstance(r, dict) else (lambda name, r=r: getattr(r, name))
+        created_at = get("created_at") or datetime.utcnow()
+        _accumulate(acc, get("week_key") or week_key(created_at), _project_key(get("project_id"), get("project")), get("member_id"),
+                    get("member_name"), get("progress"), get("risks"), created_at)
+    return acc
+
+
+def retract_reports(db: Session, reports) -> None:
+    """
+    从汇总行中扣除这些周报的计数（调用方负责 commit），用于周报改挂到其他项目键之前；
+    reports 需带原来的 project_id/project。“最新进度”等字段无法回退，汇总行的周报全部移出后整行删除。
+    """
+    values = _rollup_values(_deltas(reports))
+    if not values:
+        return
+    key = [getattr(WeeklyRollup, name) == bindparam(f"k_{name}") for name in _ROLLUP_KEY]
+    params = [{f"k_{name}": v[name] for name in _ROLLUP_KEY} | {
+        "d_count": v["report_count"], "d_progress": v["progress_sum"], "d_risks": v["risk_count"],
+    } for v in values]
+    conn = db.connection()
+    conn.execute(
+        update(WeeklyRollup).where(*key).values(
+            report_count=WeeklyRollup.report_count - bindparam("d_count"),
+            progress_sum=WeeklyRollup.progress_sum - bindparam("d_progress"),
+            risk_count=WeeklyRollup.risk_count - bindparam("d_risks"),
+        ),
+        params,
+    )
+    conn.execute(
+        delete(WeeklyRollup).where(*key, WeeklyRollup.report_count <= 0),
+        [{f"k_{name}": v[name] for name in _ROLLUP_KEY} for v in values],
+    )
+
+
+_ROLLUP_SOURCE_COLUMNS = (
+    Report.project_id, Report.project, Report.member_id, Report.member_name,
+    Report.progress, Report.risks, Report.created_at, Report.week_key,
+)
+
+
+def _accumulate_rows(acc: dict, rows):
+    for row in rows:
+        _accumulate(acc, row.week_key or week_key(row.created_at), _project_key(row.project_id, row.project), row.member_id,
+                    row.member_name, row.progress, row.risks, row.created_at)
+
+
+def _insert_rollups(db: Session, acc: dict, batch_size: int = 2000) -> int:
+    values = _rollup_values(acc)
+    for i in range(0, len(values), batch_size):
+        db.bulk_insert_mappings(WeeklyRollup, values[i:i + batch_size])
+    return len(values)
+
+
+def rebuild_rollups(db: Session, batch_size: int = 2000) -> int:
+    """从 reports 全量重建汇总表（分批读取），返回写入的汇总行数。"""
+    acc: dict[tuple, dict] = {}
+    _accumulate_rows(acc, db.query(*_ROLLUP_SOURCE_COLUMNS).order_by(Report.created_at, Report.id).yield_per(batch_size))
+    db.query(WeeklyRollup).delete(synchronize_session=False)
+    count = _insert_rollups(db, acc, batch_size)
+    db.commit()
+    return count
+
+
+def recompute_rollups(db: Session, week_members: dict[str, set[int]]) -> int:
+    """
+    按周 × 成员从 reports 重新计算汇总行（调用方负责 commit），用于周报的项目归属整体变化后（如删除项目），
+    需要连同“最新进度”等字段一并准确更新的场景。
+    每周一次按 week_key 等值的查询，返回写入的汇总行数。
+    """
+    count = 0
+    for week, members in week_members.items():
+        if not members:
+            continue
+        acc: dict[tuple, dict] = {}
+        _accumulate_rows(acc, db.query(*_ROLLUP_SOURCE_COLUMNS).filter(
+            Report.week_key == week, Report.member_id.in_(members)
+        ))
+        db.query(WeeklyRollup).filter(
+            WeeklyRollup.week == week, WeeklyRollup.member_id.in_(members)
+        ).delete(synchronize_session=False)
+        count += _insert_rollups(db, acc)
+    return count
+
+
+def backfill_rollups_if_empty(log=print):
+    db = SessionLocal()
+    try:
+        if db.query(WeeklyRollup.id).first() is None and db.query(Report.id).first() is not None:
+            count = rebuild_rollups(db)
+            log(f"已回填 weekly_rollups: {count} 行")
+    finally:
+        db.close()
+
+
+def _rollup_project_filter(project: str):
+    """按项目名称过滤汇总行：已关联的按项目 id（含改名前的历史数据），未关联的按原始名称。"""
+    return or_(
+        WeeklyRollup.project_id == project_id_of(project),
+        and_(WeeklyRollup.project_id == 0, WeeklyRollup.project == project),
+    )
+
+
+def range_summary(db: Session, start_week: str, end_week: str, project: str | None = None) -> list[dict]:
+    """区间内每周各项目的汇总（提交人数、周报数、平均进度、风险数），按周、项目排序。"""
+    query = (
+        db.query(
+            WeeklyRollup.week,
+            _rollup_project_name,
+            func.count(WeeklyRollup.member_id),
+            func.sum(WeeklyRollup.report_count),
+            func.sum(WeeklyRollup.progress_sum),
+            func.sum(WeeklyRollup.risk_count),
+        )
+        .outerjoin(Project, WeeklyRollup.project_id == Project.id)
+        .filter(WeeklyRollup.week >= start_week, WeeklyRollup.week <= end_week)
+        .group_by(WeeklyRollup.week, WeeklyRollup.project_id, WeeklyRollup.project, _rollup_project_name)
+        .order_by(WeeklyRollup.week, _rollup_project_name)
+    )
+    if project:
+        query = query.filter(_rollup_project_filter(project))
+    weeks: dict[str, dict] = {}
+    for week, proj, members, reports, progress_sum, risks in query:
+        weeks.setdefault(week, {"week": week, "projects": []})["projects"].append({
+            "project": proj,
+            "members": members,
+            "reports": reports,
+            "avg_progress": round(progress_sum / reports, 1) if reports else None,
+            "risk_count": risks,
+        })
+    return list(weeks.values())
+
+
+def project_trend(db: Session, project: str, start_week: str, end_week: str) -> list[dict]:
+    """项目逐周进度趋势：平均进度与各成员最新进度的平均值。"""
+    rows = (
+        db.query(
+            WeeklyRollup.week,
+            func.sum(WeeklyRollup.report_count),
+            func.sum(WeeklyRollup.progress_sum),
+            func.avg(WeeklyRollup.last_progress),
+            func.sum(WeeklyRollup.risk_count),
+        )
+        .filter(
+            _rollup_project_filter(project),
+            WeeklyRollup.week >= start_week,
+            WeeklyRollup.week <= end_week,
+        )
+        .group_by(WeeklyRollup.week)
+        .order_by(WeeklyRollup.week)
+    )
+    return [
+        {
+            "week": week,
+            "reports": reports,
+            "avg_progress": round(progress_sum / reports, 1) if reports else None,
+            "last_progress": round(last_progress, 1) if last_progress is not None else None,
+            "risk_count": risks,
+        }
+        for week, reports, progress_sum, last_progress, risks in rows
+    ]
@@ -0,0 +1,289 @@
+import re
+from datetime import datetime
+from markupsafe import Markup, escape
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from ..db import SessionLocal, engine, Report
+
+# 参与检索的周报字段（按权重从高到低）
+SEARCH_FIELDS = ("work_desc", "next_week_plan", "risks")
+_FIELD_WEIGHTS = ("A", "B", "C")
+
+_IS_SQLITE = engine.dialect.name == "sqlite"
+
+# 中日韩文字（连续片段切成二元组）；其余按字母数字切词
+_CJK = r"㐀-䶿一-鿿豈-﫿぀-ヿ가-힯"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+
+_SNIPPET_RADIUS = 40
+
+
+def _tokens(value: str | None) -> list[str]:
+    """
+    中文无空格分词：连续 CJK 片段切成重叠二元组，并追加片段末字，
+    这样任意单字都是某个词元的前缀（单字查询用前缀匹配）；英文与数字按词切分并转小写。
+    数据库侧只需按空白切词（FTS5 unicode61 / PostgreSQL simple 配置），无需中文分词插件。
+    """
+    out = []
+    for run in _TOKEN_RE.findall((value or "").lower()):
+        if _CJK_RE.match(run):
+            out.extend(run[i:i + 2] for i in range(len(run) - 1))
+            out.append(run[-1])
+        else:
+            out.append(run)
+    return out
+
+
+def tokenize(value: str | None) -> str:
+    return " ".join(_tokens(value))
+
+
+def _query_groups(q: str) -> list[tuple[list[str], bool]]:
+    """
+    查询串按空白拆成多个关键词（AND 关系）；每个关键词转为相邻词元序列（短语匹配）。
+    返回 [(词元列表, 是否前缀匹配)]，单个中文字符使用前缀匹配。
+    """
+    groups = []
+    for term in q.split():
+        runs = _TOKEN_RE.findall(term.lower())
+        if len(runs) == 1 and len(runs[0]) == 1 and _CJK_RE.match(runs[0]):
+            groups.append((runs, True))
+            continue
+        tokens = []
+        for run in runs:
+            if not _CJK_RE.match(run):
+                tokens.append(run)
+            elif len(run) > 1:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            # 混在词中的单个汉字（如 “v2版”）不一定是独立词元，忽略以免漏召回
+        if tokens:
+            groups.append((tokens, False))
+    return groups
+
+
+def _fts5_match(groups) -> str:
+    parts = []
+    for tokens, prefix in groups:
+        phrase = '"' + " ".join(tokens) + '"'
+        parts.append(phrase + "*" if prefix else phrase)
+    return " AND ".join(parts)
+
+
+def _pg_tsquery(groups) -> str:
+    parts = []
+    for tokens, prefix in groups:
+        if prefix:
+            parts.append(f"'{tokens[0]}':*")
+        else:
+            parts.append("(" + " <-> ".join(f"'{t}'" for t in tokens) + ")")
+    return " & ".join(parts)
+
+
+def ensure_search_index():
+    """创建检索索引结构（幂等）：SQLite 使用 FTS5 虚拟表，PostgreSQL 使用 tsvector 列 + GIN 索引。"""
+    with engine.begin() as conn:
+        if _IS_SQLITE:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5("
+                + ", ".join(SEARCH_FIELDS)
+                + ", tokenize='unicode61 remove_diacritics 0')"
+            ))
+        else:
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS report_search ("
+                "report_id INTEGER PRIMARY KEY REFERENCES reports(id) ON DELETE CASCADE, "
+                "document tsvector NOT NULL)"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_report_search_document ON report_search USING GIN (document)"
+            ))
+
+
+def _index_rows(db: Session, rows: list[dict]):
+    """rows 每项包含 id 与 SEARCH_FIELDS 字段；已存在的记录会被覆盖。"""
+    if not rows:
+        return
+    params = [
+        {"id": r["id"], **{f: tokenize(r.get(f)) for f in SEARCH_FIELDS}}
+        for r in rows
+    ]
+    if _IS_SQLITE:
+        db.execute(text("DELETE FROM reports_fts WHERE rowid = :id"), [{"id": p["id"]} for p in params])
+        db.execute(
+            text(
+                f"INSERT INTO reports_fts (rowid, {', '.join(SEARCH_FIELDS)}) "
+                f"VALUES (:id, {', '.join(':' + f for f in SEARCH_FIELDS)})"
+            ),
+            params,
+        )
+    else:
+        document = " || ".join(
+            f"setweight(to_tsvector('simple', :{f}), '{w}')" for f, w in zip(SEARCH_FIELDS, _FIELD_WEIGHTS)
+        )
+        db.execute(
+            text(
+                f"INSERT INTO report_search (report_id, document) VALUES (:id, {document}) "
+                "ON CONFLICT (report_id) DO UPDATE SET document = EXCLUDED.document"
+            ),
+            params,
+        )
+
+
+def index_reports(db: Session, reports):
+    """在写入周报的同一事务中同步检索索引（调用方负责 commit）；reports 为已 flush 的 Report 对象或含 id 的 dict。"""
+    _index_rows(db, [
+        r if isinstance(r, dict) else {"id": r.id, **{f: getattr(r, f) for f in SEARCH_FIELDS}}
+        for r in reports
+    ])
+
+
+def unindex_reports(db: Session, ids: list[int]):
+    """删除周报前移除其检索记录（调用方负责 commit）；PostgreSQL 上 report_search 随周报级联删除，这里同样显式删除。"""
+    if not ids:
+        return
+    if _IS_SQLITE:
+        db.execute(text("DELETE FROM reports_fts WHERE rowid = :id"), [{"id": id_} for id_ in ids])
+    else:
+        db.execute(text("DELETE FROM report_search WHERE report_id = :id"), [{"id": id_} for id_ in ids])
+
+
+def rebuild_search_index(db: Session, batch_size: int = 2000) -> int:
+    """按 id 分批重建全部索引，返回索引的周报数。"""
+    db.execute(text("DELETE FROM reports_fts" if _IS_SQLITE else "DELETE FROM report_search"))
+    last_id, total = 0, 0
+    while True:
+        rows = (
+            db.query(Report.id, *[getattr(Report, f) for f in SEARCH_FIELDS])
+            .filter(Report.id > last_id)
+            .order_by(Report.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        _index_rows(db, [row._asdict() for row in rows])
+        last_id = rows[-1].id
+        total += len(rows)
+    db.commit()
+    return total
+
+
+def backfill_search_index_if_empty(log=print):
+    db = SessionLocal()
+    try:
+        table = "reports_fts" if _IS_SQLITE else "report_search"
+        empty = db.execute(text(f"SELECT 1 FROM {table} LIMIT 1")).first() is None
+        if empty and db.query(Report.id).first() is not None:
+            count = rebuild_search_index(db)
+            log(f"已回填全文检索索引: {count} 条周报")
+    finally:
+        db.close()
+
+
+def _highlight(value: str, needles: list[str]) -> str | None:
+    """在原文中定位第一个命中的关键词，截取前后片段并用 <mark> 高亮所有关键词（已转义）。"""
+    if not value:
+        return None
+    lower = value.lower()
+    hits = [i for i in (lower.find(n) for n in needles) if i >= 0]
+    if not hits:
+        return None
+    first = min(hits)
+    start = max(0, first - _SNIPPET_RADIUS)
+    end = min(len(value), first + _SNIPPET_RADIUS * 2)
+    fragment = value[start:end]
+    pattern = re.compile("|".join(re.escape(n) for n in sorted(needles, key=len, reverse=True)), re.IGNORECASE)
+    out, pos = [], 0
+    for m in pattern.finditer(fragment):
+        out.append(escape(fragment[pos:m.start()]))
+        out.append(Markup("<mark>%s</mark>") % m.group())
+        pos = m.end()
+    out.append(escape(fragment[pos:]))
+    snippet = "".join(str(part) for part in out)
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(value) else "")
+
+
+def search_reports(
+    db: Session,
+    q: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    project: str | None = None,
+    member_id: int | None = None,
+    page: int = 1,
+    page_size: int = 20,
+) -> dict:
+    """
+    全文检索周报，按相关度（字段加权）排序、时间倒序兜底，分页返回带高亮片段的结果。
+    日期区间为 [start, end)。
+    """
+    groups = _query_groups(q)
+    result = {"q": q, "page": page, "page_size": page_size, "total": 0, "items": []}
+    if not groups:
+        return result
+
+    filters, params = [], {}
+    if start:
+        filters.append("r.created_at >= :start")
+        params["start"] = start
+    if end:
+        filters.append("r.created_at < :end")
+        params["end"] = end
+    if project:
+        # 已关联的按项目 id 匹配（含改名前提交的周报），未关联的按原始名称
+        filters.append(
+            "(r.project_id = (SELECT id FROM projects WHERE name = :project)"
+            " OR (r.project_id IS NULL AND r.project = :project))"
+        )
+        params["project"] = project
+    if member_id:
+        filters.append("r.member_id = :member_id")
+        params["member_id"] = member_id
+    where = "".join(" AND " + f for f in filters)
+
+    if _IS_SQLITE:
+        params["q"] = _fts5_match(groups)
+        # bm25 越小越相关；列权重与 SEARCH_FIELDS 顺序对应
+        tables = "FROM reports_fts f JOIN reports r ON r.id = f.rowid"
+        match = " WHERE reports_fts MATCH :q" + where
+        rank = "bm25(reports_fts, 3.0, 2.0, 1.0)"
+    else:
+        params["q"] = _pg_tsquery(groups)
+        tables = "FROM report_search s JOIN reports r ON r.id = s.report_id"
+        match = " WHERE s.document @@ to_tsquery('simple', :q)" + where
+        rank = "-ts_rank_cd(s.document, to_tsquery('simple', :q))"
+
+    result["total"] = db.execute(text("SELECT COUNT(*) " + tables + match), params).scalar() or 0
+    rows = db.execute(
+        text(
+            "SELECT r.id, r.member_id, r.member_name, COALESCE(p.name, r.project) AS project, r.progress, "
+            f"r.created_at, r.work_desc, r.next_week_plan, r.risks, {rank} AS rank "
+            + tables
+            + " LEFT JOIN projects p ON p.id = r.project_id"
+            + match
+            + " ORDER BY rank, r.created_at DESC LIMIT :limit OFFSET :offset"
+        ),
+        {**params, "limit": page_size, "offset": (page - 1) * page_size},
+    ).mappings()
+
+    needles = [t for t in q.lower().split() if t]
+    for row in rows:
+        created_at = row["created_at"]
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        snippets = {}
+        for field in SEARCH_FIELDS:
+            snippet = _highlight(row[field], needles)
+            if snippet:
+                snippets[field] = snippet
+        result["items"].append({
+            "id": row["id"],
+            "member_id": row["member_id"],
+            "member_name": row["member_name"],
+            "project": row["project"],
+            "progress": row["progress"],
+            "created_at": created_at.isoformat() if created_at else None,
+            "snippets": snippets,
+        })
+    return result
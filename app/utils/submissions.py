@@ -0,0 +1,244 @@
+"""
+周报提交：每个成员每周每个项目只保留一行（reports 上的两个唯一索引），重新提交改为原子 upsert
+（SQLite / PostgreSQL 均为 INSERT ... ON CONFLICT DO UPDATE），被覆盖版本中发生变化的字段写入 report_revisions。
+同一幂等键（表单随页面生成，或 Idempotency-Key 请求头）的重复请求（双击、浏览器重试）不会重复写入。
+
+升级前已有的重复周报由 ensure_report_unique_indexes 合并（保留最新提交的一行，其余作为修改历史）后再建唯一索引。
+"""
+import json
+import time
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import and_, bindparam, func, insert, inspect, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..db import SessionLocal, engine, ensure_indexes, Report, ReportRevision
+from .project_keys import resolve_project
+from .rollups import record_reports, retract_reports
+from .search import index_reports, unindex_reports
+from .weeks import week_key
+
+# 周报内容字段：重新提交时覆盖，变化字段的旧值写入修改历史
+CONTENT_FIELDS = ("member_name", "work_desc", "progress", "next_week_plan", "risks")
+
+_UNIQUE_INDEXES = [index for index in Report.__table__.indexes if index.unique]
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+# 唯一索引尚未创建时（升级后 week_key 仍在回填）提交走加锁查询 + 插入/更新；未就绪时每隔该秒数重新检查一次
+_READY_RECHECK_SECONDS = 60
+_ready = False
+_ready_checked_at = float("-inf")
+
+_OLD_COLUMNS = (
+    Report.id, Report.member_id, Report.project_id, Report.project, Report.week_key, Report.created_at,
+    Report.submit_key, Report.revision, *[getattr(Report, f) for f in CONTENT_FIELDS],
+)
+
+
+class SubmitConflict(Exception):
+    """并发提交同一周报：upsert 命中了本事务查询时尚不存在的行。调用方回滚后重试即可。"""
+
+
+def unique_indexes_ready() -> bool:
+    global _ready, _ready_checked_at
+    if not _ready and time.monotonic() - _ready_checked_at >= _READY_RECHECK_SECONDS:
+        existing = {item["name"] for item in inspect(engine).get_indexes(Report.__tablename__)}
+        _ready = all(index.name in existing for index in _UNIQUE_INDEXES)
+        _ready_checked_at = time.monotonic()
+    return _ready
+
+
+def _key_filter(values: dict):
+    """与唯一索引一致的周报键：已关联项目按 project_id，未关联的按提交时的项目名称。"""
+    conditions = [Report.week_key == values["week_key"], Report.member_id == values["member_id"]]
+    if values["project_id"] is not None:
+        conditions.append(Report.project_id == values["project_id"])
+    else:
+        conditions += [Report.project_id.is_(None), Report.project == values["project"]]
+    return and_(*conditions)
+
+
+def _changes(old, new) -> dict:
+    """new 相对 old 发生变化的字段及其旧值。"""
+    get = new.get if isinstance(new, dict) else (lambda name: getattr(new, name))
+    return {f: getattr(old, f) for f in CONTENT_FIELDS if getattr(old, f) != get(f)}
+
+
+def _write(db: Session, values: dict, old) -> tuple[int, int]:
+    """写入一次提交，返回 (id, revision)；revision 为 0 表示新插入。"""
+    upsert = _UPSERT_INSERTS.get(engine.dialect.name)
+    if upsert is not None and unique_indexes_ready():
+        stmt = upsert(Report).values(**values)
+        if values["project_id"] is not None:
+            target = {"index_elements": ["week_key", "member_id", "project_id"]}
+        else:
+            target = {"index_elements": ["week_key", "member_id", "project"], "index_where": text("project_id IS NULL")}
+        stmt = stmt.on_conflict_do_update(
+            **target,
+            set_={
+                **{f: stmt.excluded[f] for f in (*CONTENT_FIELDS, "created_at", "submit_key")},
+                "revision": Report.revision + 1,
+            },
+        )
+        return tuple(db.execute(stmt.returning(Report.id, Report.revision)).one())
+    if old is None:
+        return tuple(db.execute(insert(Report).values(**values).returning(Report.id, Report.revision)).one())
+    db.execute(
+        update(Report).where(Report.id == old.id).values(
+            **{f: values[f] for f in (*CONTENT_FIELDS, "created_at", "submit_key")}, revision=old.revision + 1
+        )
+    )
+    return old.id, old.revision + 1
+
+
+def submit_report(db: Session, fields: dict, submit_key: str | None = None) -> tuple[str, str]:
+    """
+    保存一次提交（调用方负责 commit）：fields 为 member_id、project（名称）与 CONTENT_FIELDS。
+    返回 (结果, 项目名称)，结果为 created / updated / unchanged / duplicate：
+    同一幂等键的重复请求返回 duplicate，内容与当前版本相同返回 unchanged，两者都不写入。
+    周汇总统计与全文检索索引在同一事务中同步（覆盖时先扣除旧版本的统计）。
+    """
+    now = datetime.utcnow()
+    values = {
+        **fields, "project_id": None, "created_at": now, "week_key": week_key(now),
+        "submit_key": submit_key, "revision": 0,
+    }
+    # 按名称关联项目；未匹配的作为未关联周报保存（可在项目补建后回填）
+    matched = resolve_project(db, fields["project"])
+    if matched:
+        values["project_id"], values["project"] = matched
+    # PostgreSQL 上锁定当前版本，并发的重新提交依次执行
+    old = db.query(*_OLD_COLUMNS).filter(_key_filter(values)).with_for_update().one_or_none()
+    if old is not None:
+        if submit_key and (old.submit_key == submit_key or db.query(ReportRevision.id).filter(
+            ReportRevision.report_id == old.id, ReportRevision.submit_key == submit_key
+        ).first() is not None):
+            return "duplicate", values["project"]
+        changes = _changes(old, values)
+        if not changes:
+            return "unchanged", values["project"]
+
+    report_id, revision = _write(db, values, old)
+    if (old is None) != (revision == 0):
+        raise SubmitConflict()
+    current = {**values, "id": report_id}
+    if old is not None:
+        retract_reports(db, [old._asdict()])
+        db.add(ReportRevision(
+            report_id=report_id, submitted_at=old.created_at, replaced_at=now, submit_key=old.submit_key,
+            changes=json.dumps(changes, ensure_ascii=False),
+        ))
+    record_reports(db, [current])
+    index_reports(db, [current])
+    return ("updated" if old is not None else "created"), values["project"]
+
+
+def report_revisions(db: Session, report_id: int) -> list[dict]:
+    """周报的修改历史（最新在前）：每项为被覆盖版本的提交时间与变化字段的旧值。"""
+    rows = (
+        db.query(ReportRevision)
+        .filter(ReportRevision.report_id == report_id)
+        .order_by(ReportRevision.replaced_at.desc(), ReportRevision.id.desc())
+        .all()
+    )
+    return [
+        {
+            "submitted_at": r.submitted_at.isoformat(),
+            "replaced_at": r.replaced_at.isoformat(),
+            "changes": json.loads(r.changes),
+        }
+        for r in rows
+    ]
+
+
+def _duplicate_rows(db: Session):
+    """按唯一键分组的重复周报（组内按提交时间排序），已关联与未关联项目的各一次查询。"""
+    for columns, condition in (
+        ((Report.week_key, Report.member_id, Report.project_id), Report.project_id.isnot(None)),
+        ((Report.week_key, Report.member_id, Report.project), Report.project_id.is_(None)),
+    ):
+        dup = (
+            db.query(*columns)
+            .filter(Report.week_key.isnot(None), condition)
+            .group_by(*columns)
+            .having(func.count(Report.id) > 1)
+            .subquery()
+        )
+        rows = (
+            db.query(*_OLD_COLUMNS)
+            .join(dup, and_(*[column == dup.c[column.key] for column in columns]))
+            .filter(condition)
+            .order_by(*columns, Report.created_at, Report.id)
+            .all()
+        )
+        yield from groupby(rows, key=lambda row, columns=columns: tuple(getattr(row, c.key) for c in columns))
+
+
+def merge_duplicate_reports(db: Session) -> int:
+    """
+    合并重复周报（调用方负责 commit）：每组保留最新提交的一行，更早的版本按时间顺序记为修改历史
+    （内容完全相同的重复提交不记录）后删除，同步扣除周汇总统计与检索记录。返回删除的行数。
+    """
+    removed, revisions, kept = [], [], []
+    for _, group in _duplicate_rows(db):
+        rows = list(group)
+        keep = rows[-1]
+        count = 0
+        for older, newer in zip(rows, rows[1:]):
+            changes = _changes(older, newer)
+            if changes:
+                revisions.append({
+                    "report_id": keep.id, "submitted_at": older.created_at, "replaced_at": newer.created_at,
+                    "submit_key": older.submit_key, "changes": json.dumps(changes, ensure_ascii=False),
+                })
+                count += 1
+        kept.append({"b_id": keep.id, "b_revision": keep.revision + count})
+        removed.extend(rows[:-1])
+    if not removed:
+        return 0
+    retract_reports(db, [row._asdict() for row in removed])
+    ids = [row.id for row in removed]
+    unindex_reports(db, ids)
+    if revisions:
+        db.execute(insert(ReportRevision), revisions)
+    db.connection().execute(
+        update(Report).where(Report.id == bindparam("b_id")).values(revision=bindparam("b_revision")), kept
+    )
+    for i in range(0, len(ids), 500):
+        db.query(Report).filter(Report.id.in_(ids[i:i + 500])).delete(synchronize_session=False)
+    return len(removed)
+
+
+def ensure_report_unique_indexes(log=print) -> bool:
+    """
+    合并已有的重复周报后创建唯一索引（幂等）。仍有周报未回填 week_key 时跳过并返回 False：
+    回填后才能判断是否重复，由 week_keys 回填完成时再次调用。
+    """
+    global _ready
+    existing = {item["name"] for item in inspect(engine).get_indexes(Report.__tablename__)}
+    missing = [index for index in _UNIQUE_INDEXES if index.name not in existing]
+    if not missing:
+        _ready = True
+        return True
+    db = SessionLocal()
+    try:
+        if db.query(Report.id).filter(Report.week_key.is_(None)).first() is not None:
+            log("reports.week_key 尚未回填完成，暂不创建周报唯一索引（回填完成后自动创建）")
+            return False
+        removed = merge_duplicate_reports(db)
+        db.commit()
+    finally:
+        db.close()
+    if removed:
+        log(f"已合并重复周报: {removed} 条（变化的旧内容保存在 report_revisions）")
+    ensure_indexes(Report.__table__, missing)
+    _ready = True
+    return True
+
+
+def drop_report_unique_indexes():
+    """重新计算 week_key 前删除唯一索引（重算后原本不同周的周报可能落在同一周），重算完成后再次 ensure。"""
+    global _ready
+    with engine.begin() as conn:
+        for index in _UNIQUE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    _ready = False
@@ -1,86 +1,178 @@
-from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Iterable, Iterator
+import os
+import time
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
 from sqlalchemy.orm import Session
-from collections import defaultdict
-from ..db import Report, Member
+from ..db import SessionLocal, Report, Member, Project
+from .project_keys import report_project_name
+from .weeks import current_week_key, week_dates
+from .cache import get_cache
+from .metrics import SUMMARY_RENDER_SECONDS
 
+# 每批从数据库游标读取的行数
+_FETCH_BATCH = 500
 
-def get_week_range(dt: datetime) -> tuple[datetime, datetime]:
-    # ISO week: Monday=0 ... Sunday=6
-    start = dt - timedelta(days=dt.weekday())
-    start = datetime(start.year, start.month, start.day)
-    end = start + timedelta(days=6, hours=23, minutes=59, seconds=59)
-    return start, end
 
+def _br_filter(text) -> Markup:
+    """转义文本并将换行替换为 <br>，与 escape_html 的展示效果一致。"""
+    return Markup(str(Markup.escape(text)).replace("\n", "<br>"))
 
-def generate_weekly_summary(db: Session) -> str:
-    now = datetime.utcnow()
-    start, end = get_week_range(now)
-    
-    # 联表查询获取报告和成员信息
-    reports_with_members = (
-        db.query(Report, Member)
+
+# 汇总模板在导入时加载并编译一次，后续渲染直接复用
+_env = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")),
+    autoescape=select_autoescape(["html"]),
+)
+_env.filters["br"] = _br_filter
+_summary_template = _env.get_template("summary.html")
+_card_template = _env.get_template("summary_card.html")
+
+
+def _section_cache_key(week: str, project: str) -> str:
+    return f"summary:{week}:{project}"
+
+
+def _query_week_rows(db: Session, week: str, projects: list[str] | None = None):
+    """按 项目名称, member_name 顺序分批读取 week 周的周报（仅取展示所需列），不一次性载入全部结果。"""
+    query = (
+        db.query(
+            report_project_name.label("project"),
+            Report.member_name,
+            Report.work_desc,
+            Report.progress,
+            Report.next_week_plan,
+            Report.risks,
+            Member.department,
+            Member.position,
+        )
         .outerjoin(Member, Report.member_id == Member.id)
-        .filter(Report.created_at >= start, Report.created_at <= end)
-        .order_by(Report.project, Report.member_name)
-        .all()
+        .outerjoin(Project, Report.project_id == Project.id)
+        .filter(Report.week_key == week)
+    )
+    if projects is not None:
+        query = query.filter(report_project_name.in_(projects))
+    return query.order_by(report_project_name, Report.member_name).yield_per(_FETCH_BATCH)
+
+
+def _week_projects(db: Session, week: str) -> list[str]:
+    """
+    week 周有周报的项目名称（与 _query_week_rows 的排序一致）：按 project_id 分组，
+    名称取项目当前名称；未关联项目的周报按原始名称分组。
+    """
+    names = (
+        db.query(report_project_name)
+        .select_from(Report)
+        .outerjoin(Project, Report.project_id == Project.id)
+        .filter(Report.week_key == week)
+        .group_by(Report.project_id, report_project_name)
+        .order_by(report_project_name)
     )
+    # 回填期间同名的已关联/未关联周报会各成一组，合并为同一张卡片
+    return list(dict.fromkeys(name for (name,) in names))
+
+
+def _iter_sections(db: Session, week: str) -> Iterator[Markup]:
+    """
+    逐个产出项目卡片 HTML：命中缓存的直接复用，未命中的项目用一次查询取回并渲染后写入缓存。
+    两路结果都按项目名排序，按分组的项目名与项目列表对齐后归并。
+    """
+    cache = get_cache()
+    since = time.time()
+    projects = _week_projects(db, week)
+    cached = cache.get_many(_section_cache_key(week, p) for p in projects)
+    missing = [p for p in projects if _section_cache_key(week, p) not in cached]
+    fresh = groupby(_query_week_rows(db, week, missing), key=lambda row: row.project) if missing else iter(())
+    group = next(fresh, None)
+    remaining = set(missing)
+
+    for project in projects:
+        key = _section_cache_key(week, project)
+        html = cached.get(key)
+        if html is None:
+            remaining.discard(project)
+            # 两次查询之间项目可能被改名或周报被删除：跳过不属于后续项目的分组
+            while group is not None and group[0] != project and group[0] not in remaining:
+                group = next(fresh, None)
+            if group is None or group[0] != project:
+                # 该项目已没有周报：不输出卡片，也不写入缓存
+                continue
+            html = _card_template.render(project=project, rows=group[1])
+            cache.set(key, html, since)
+            group = next(fresh, None)
+        yield Markup(html)
 
-    grouped: dict[str, list[tuple[Report, Member]]] = defaultdict(list)
-    for report, member in reports_with_members:
-        grouped[report.project].append((report, member))
-
-    # Build HTML summary
-    head = f"""
-    <html><head><meta charset='utf-8'>
-    <title>本周周报汇总</title>
-    <style>
-    body {{ font-family: system-ui, -apple-system, Segoe UI, Helvetica, Arial; background:#f7f9fc; color:#1f2937; }}
-    .wrap {{ max-width: 960px; margin: 20px auto; }}
-    .card {{ background:#fff; border-radius:12px; box-shadow:0 6px 18px rgba(0,0,0,0.06); padding:18px; margin-bottom:16px; }}
-    h1 {{ font-size:22px; margin:10px 0 16px; }}
-    h2 {{ font-size:18px; margin:0 0 12px; }}
-    table {{ width:100%; border-collapse: collapse; }}
-    th, td {{ border-bottom:1px solid #e5e7eb; padding:10px; text-align:left; vertical-align:top; }}
-    th {{ background:#f3f4f6; font-weight:600; }}
-    .muted {{ color:#6b7280; }}
-    </style></head><body>
-    <div class='wrap'>
-    <h1>本周周报汇总（{start:%Y-%m-%d} ~ {end:%Y-%m-%d}）</h1>
+
+def iter_weekly_summary(db: Session, chunk_size: int = 8192, week: str | None = None) -> Iterator[str]:
+    """
+    以生成器方式渲染 week 周（周标识，默认本周）的汇总 HTML：边读取数据边输出，
+    模板片段按 chunk_size 合并后产出，避免大量细碎写入。
     """
+    this_week = current_week_key()
+    week = week or this_week
+    start, end = week_dates(week)
+    current = week == this_week
+    sections = _iter_sections(db, week)
+
+    buf: list[str] = []
+    size = 0
+    # 渲染耗时只统计生成器自身执行的时间，不含等待消费方（客户端）接收的时间
+    rendering = 0.0
+    resumed = time.perf_counter()
+    for piece in _summary_template.generate(start=start, end=end, current=current, sections=sections):
+        buf.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            rendering += time.perf_counter() - resumed
+            yield "".join(buf)
+            resumed = time.perf_counter()
+            buf.clear()
+            size = 0
+    SUMMARY_RENDER_SECONDS.observe(rendering + time.perf_counter() - resumed)
+    if buf:
+        yield "".join(buf)
+
+
+def week_report_rows(db: Session) -> list:
+    """本周周报的结构化行（按项目、成员排序），供大模型摘要等按项目处理的场景使用。"""
+    return list(_query_week_rows(db, current_week_key()))
+
+
+def invalidate_summary_sections(projects: Iterable[str], week: str | None = None):
+    """使指定项目在 week 周（默认本周）的汇总卡片缓存失效。"""
+    week = week or current_week_key()
+    get_cache().invalidate({_section_cache_key(week, p) for p in projects})
+
 
-    if not grouped:
-        head += "<p class='card muted'>暂无数据，本周尚未提交。</p>"
-
-    for project, items in grouped.items():
-        head += f"<div class='card'><h2>项目：{project}</h2>"
-        head += "<table><thead><tr><th>成员</th><th>部门/职位</th><th>本周工作</th><th>进度</th><th>下周计划</th><th>风险与问题</th></tr></thead><tbody>"
-        for report, member in items:
-            # 构建成员信息显示
-            member_info = ""
-            if member:
-                dept_pos = []
-                if member.department:
-                    dept_pos.append(member.department)
-                if member.position:
-                    dept_pos.append(member.position)
-                member_info = " / ".join(dept_pos) if dept_pos else "-"
-            else:
-                member_info = "-"
-            
-            head += (
-                f"<tr>"
-                f"<td>{report.member_name}</td>"
-                f"<td class='muted'>{member_info}</td>"
-                f"<td>{escape_html(report.work_desc)}</td>"
-                f"<td>{report.progress}%</td>"
-                f"<td>{escape_html(report.next_week_plan)}</td>"
-                f"<td>{escape_html(report.risks or '')}</td>"
-                f"</tr>"
-            )
-        head += "</tbody></table></div>"
-
-    head += "</div></body></html>"
-    return head
+def invalidate_week_sections(sections: Iterable[tuple[str, str]]):
+    """使若干 (周标识, 项目) 的汇总卡片缓存失效，用于批量导入等跨多周的写入。"""
+    get_cache().invalidate({_section_cache_key(week, p) for week, p in sections})
+
+
+def member_sections(db: Session, member_id: int) -> list[tuple[str, str]]:
+    """成员提交过周报的 (周标识, 项目)，含历史周，用于成员信息变更时定位受影响的卡片。"""
+    return [
+        (week, project)
+        for week, project in db.query(Report.week_key, report_project_name)
+        .select_from(Report)
+        .outerjoin(Project, Report.project_id == Project.id)
+        .filter(Report.member_id == member_id, Report.week_key.isnot(None))
+        .distinct()
+    ]
+
+
+def stream_weekly_summary(chunk_size: int = 8192, week: str | None = None) -> Iterator[str]:
+    """自带会话的流式版本，会话随生成器结束（或被关闭）一并释放，供 StreamingResponse 使用。"""
+    db = SessionLocal()
+    try:
+        yield from iter_weekly_summary(db, chunk_size, week)
+    finally:
+        db.close()
+
+
+def generate_weekly_summary(db: Session) -> str:
+    return "".join(iter_weekly_summary(db))
 
 
 def escape_html(text: str) -> str:
@@ -89,4 +181,4 @@ def escape_html(text: str) -> str:
         .replace("<", "&lt;")
         .replace(">", "&gt;")
         .replace("\n", "<br>")
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from sqlalchemy.exc import IntegrityError
+from ..db import SessionLocal, ResourceVersion
+
+# 资源名称：成员列表、项目列表、本周汇总
+MEMBERS = "members"
+PROJECTS = "projects"
+SUMMARY = "summary"
+
+
+def get_version(name: str, session_factory=SessionLocal) -> tuple[int, datetime | None]:
+    """
+    读取资源当前版本号与最后修改时间（UTC）；从未写过时返回 (0, None)。
+    数据从只读副本读取时，版本号也应从同一副本读取，保证 ETag 与响应内容一致。
+    """
+    db = session_factory()
+    try:
+        row = db.query(ResourceVersion.version, ResourceVersion.updated_at).filter(ResourceVersion.name == name).first()
+        return (row.version, row.updated_at) if row else (0, None)
+    finally:
+        db.close()
+
+
+def bump_versions(*names: str):
+    """在写操作提交之后调用：递增资源版本号，使客户端缓存的 ETag 失效。"""
+    now = datetime.utcnow().replace(microsecond=0)
+    db = SessionLocal()
+    try:
+        for name in names:
+            updated = (
+                db.query(ResourceVersion)
+                .filter(ResourceVersion.name == name)
+                .update({ResourceVersion.version: ResourceVersion.version + 1, ResourceVersion.updated_at: now})
+            )
+            if not updated:
+                try:
+                    with db.begin_nested():
+                        db.add(ResourceVersion(name=name, version=1, updated_at=now))
+                except IntegrityError:
+                    # 其他进程已插入同名记录，改为递增
+                    db.query(ResourceVersion).filter(ResourceVersion.name == name).update(
+                        {ResourceVersion.version: ResourceVersion.version + 1, ResourceVersion.updated_at: now}
+                    )
+        db.commit()
+    finally:
+        db.close()
+
+
+def make_etag(name: str, version: int, extra: str = "") -> str:
+    return f'"{name}-{extra + "-" if extra else ""}{version}"'
+
+
+def http_date(dt: datetime) -> str:
+    return format_datetime(dt.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def is_not_modified(headers, etag: str, last_modified: datetime | None) -> bool:
+    """按 RFC 7232：存在 If-None-Match 时只比较 ETag，否则比较 If-Modified-Since。"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
@@ -0,0 +1,116 @@
+"""
+reports.week_key 回填：升级前的历史周报按业务时区（BUSINESS_TIMEZONE）计算所在 ISO 周。
+
+从最新的周报开始按 id 倒序分批处理（最近几周的汇总最先可用），每批单独提交；
+进度由数据本身记录（只扫描 week_key 为空的行，走部分索引 ix_reports_week_pending），中断后重新执行即可续跑。
+回填完成后合并重复周报并创建每个成员每周每个项目一行的唯一索引（utils/submissions）。
+修改 BUSINESS_TIMEZONE 后停止服务，使用 --recompute 重新计算全部周报的 week_key 并重建周汇总表。
+
+    python -m app.utils.week_keys --chunk-size 5000 --pause 0.05
+    python -m app.utils.week_keys --recompute
+"""
+import argparse
+import os
+import time
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.orm import Session
+from ..db import SessionLocal, Report
+from .weeks import BUSINESS_TIMEZONE, week_key
+
+# 回填每批处理的周报数（一批一个事务）
+WEEK_KEY_BACKFILL_CHUNK = int(os.getenv("WEEK_KEY_BACKFILL_CHUNK", "5000"))
+# 迁移（app/migrations）时待回填的周报不超过该数量则直接回填，否则只打印提示，由命令行分批执行
+WEEK_KEY_BACKFILL_STARTUP_LIMIT = int(os.getenv("WEEK_KEY_BACKFILL_STARTUP_LIMIT", "50000"))
+
+
+def backfill_chunk(db: Session, before_id: int | None, chunk_size: int, recompute: bool = False) -> tuple[int, int, int]:
+    """
+    为 id < before_id 的下一批周报计算 week_key（调用方负责 commit）；recompute=False 时只处理 week_key 为空的行。
+    返回 (扫描行数, 更新行数, 本批最小 id)；扫描行数为 0 表示已扫描完毕。
+    """
+    query = db.query(Report.id, Report.created_at, Report.week_key)
+    if not recompute:
+        query = query.filter(Report.week_key.is_(None))
+    if before_id is not None:
+        query = query.filter(Report.id < before_id)
+    rows = query.order_by(Report.id.desc()).limit(chunk_size).all()
+    if not rows:
+        return 0, 0, before_id or 0
+    changes = [
+        {"b_id": row.id, "b_week": key}
+        for row in rows
+        if row.created_at and (key := week_key(row.created_at)) != row.week_key
+    ]
+    if changes:
+        db.connection().execute(
+            update(Report).where(Report.id == bindparam("b_id")).values(week_key=bindparam("b_week")), changes
+        )
+    return len(rows), len(changes), rows[-1].id
+
+
+def backfill_week_keys(chunk_size: int = WEEK_KEY_BACKFILL_CHUNK, pause: float = 0.0, recompute: bool = False,
+                       log=print, unique: bool = True) -> dict:
+    """
+    按 id 倒序分批回填 week_key；pause 为批间休眠秒数。unique=True 时完成后创建周报唯一索引。
+    recompute=True 时重算全部周报（期间暂时删除唯一索引）并重建周汇总表。
+    """
+    from .submissions import drop_report_unique_indexes, ensure_report_unique_indexes
+    if recompute:
+        # 重算后原本不同周的周报可能落在同一周，先删除唯一索引，完成后合并重复行再重建
+        drop_report_unique_indexes()
+    db = SessionLocal()
+    scanned = updated = 0
+    cursor = None
+    started = time.monotonic()
+    try:
+        while True:
+            n, m, cursor = backfill_chunk(db, cursor, chunk_size, recompute)
+            db.commit()
+            if not n:
+                break
+            scanned += n
+            updated += m
+            log(f"scanned={scanned} updated={updated} last_id={cursor} elapsed={time.monotonic() - started:.1f}s")
+            if pause:
+                time.sleep(pause)
+        if unique or recompute:
+            ensure_report_unique_indexes(log)
+        rollups = None
+        if recompute:
+            from .rollups import rebuild_rollups
+            rollups = rebuild_rollups(db)
+    finally:
+        db.close()
+    return {"timezone": BUSINESS_TIMEZONE, "scanned": scanned, "updated": updated, "rollup_rows": rollups}
+
+
+def backfill_week_keys_if_small(log=print):
+    """迁移时调用：待回填的周报数量不大时直接回填，否则提示使用命令行分批执行。"""
+    db = SessionLocal()
+    try:
+        pending = db.query(func.count(Report.id)).filter(Report.week_key.is_(None)).scalar()
+    finally:
+        db.close()
+    if not pending:
+        return
+    if pending > WEEK_KEY_BACKFILL_STARTUP_LIMIT:
+        log(f"有 {pending} 条周报待回填 week_key，请执行 python -m app.utils.week_keys 分批回填")
+        return
+    # 唯一索引由后续迁移（app/migrations）在汇总表与检索索引就绪后创建
+    result = backfill_week_keys(log=lambda _: None, unique=False)
+    log(f"已回填 reports.week_key（{BUSINESS_TIMEZONE}）: {result['updated']} 条")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=WEEK_KEY_BACKFILL_CHUNK, help="每批处理的周报数")
+    parser.add_argument("--pause", type=float, default=0.0, help="批间休眠秒数")
+    parser.add_argument("--recompute", action="store_true", help="按当前 BUSINESS_TIMEZONE 重算全部周报并重建周汇总表")
+    args = parser.parse_args()
+    result = backfill_week_keys(args.chunk_size, args.pause, args.recompute)
+    print(f"完成（{result['timezone']}）：扫描 {result['scanned']} 条，更新 {result['updated']} 条"
+          + (f"，重建周汇总 {result['rollup_rows']} 行" if result["rollup_rows"] is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
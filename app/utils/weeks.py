@@ -0,0 +1,77 @@
+"""
+业务时区与周标识：周报按业务时区（BUSINESS_TIMEZONE）的 ISO 周归属；数据库中的时间统一为不带时区的 UTC。
+本模块不依赖数据库，db 模型的默认值也使用这里的 week_key。
+"""
+import os
+import re
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo
+
+
+def _load_timezone(name: str) -> tzinfo:
+    """IANA 时区名（如 Asia/Shanghai）或固定偏移（如 +08:00、UTC+8、UTC）。"""
+    if name.upper() in ("UTC", "GMT", "Z"):
+        return timezone.utc
+    match = re.fullmatch(r"(?:UTC|GMT)?([+-])(\d{1,2})(?::?(\d{2}))?", name, re.IGNORECASE)
+    if match:
+        sign, hours, minutes = match.groups()
+        offset = timedelta(hours=int(hours), minutes=int(minutes or 0))
+        return timezone(-offset if sign == "-" else offset)
+    return ZoneInfo(name)
+
+
+BUSINESS_TIMEZONE = os.getenv("BUSINESS_TIMEZONE", "Asia/Shanghai").strip() or "UTC"
+BUSINESS_TZ = _load_timezone(BUSINESS_TIMEZONE)
+
+
+def to_business_time(dt: datetime) -> datetime:
+    """不带时区的 UTC 时间 → 业务时区的本地时间（带时区）。"""
+    return dt.replace(tzinfo=timezone.utc).astimezone(BUSINESS_TZ)
+
+
+def _iso_key(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def week_key(dt: datetime) -> str:
+    """UTC 时间所在的业务周标识（ISO 周，如 2024-W07），用于 reports.week_key、汇总表与缓存键。"""
+    return _iso_key(to_business_time(dt).date())
+
+
+def current_week_key() -> str:
+    return week_key(datetime.utcnow())
+
+
+def parse_week_key(key: str) -> date:
+    """解析周标识（如 2024-W07，大小写与首尾空白不敏感）为该周周一的日期；格式错误时抛出 ValueError。"""
+    year, sep, week = key.strip().upper().partition("-W")
+    if not sep:
+        raise ValueError(f"invalid week key: {key!r}")
+    return date.fromisocalendar(int(year), int(week), 1)
+
+
+def normalize_week_key(key: str) -> str:
+    """校验并规范化周标识（如 2024-w7 → 2024-W07）。"""
+    return _iso_key(parse_week_key(key))
+
+
+def shift_week_key(key: str, weeks: int) -> str:
+    return _iso_key(parse_week_key(key) + timedelta(weeks=weeks))
+
+
+def week_dates(key: str) -> tuple[date, date]:
+    """该周的周一与周日（业务时区的日历日期），用于页面展示。"""
+    monday = parse_week_key(key)
+    return monday, monday + timedelta(days=6)
+
+
+def local_day_start_utc(day: date) -> datetime:
+    """业务时区某日 00:00 对应的 UTC 时间（不带时区），用于把按日期的筛选条件换算为 created_at 区间。"""
+    return datetime.combine(day, time(), tzinfo=BUSINESS_TZ).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def week_bounds(key: str) -> tuple[datetime, datetime]:
+    """该周在 UTC 下的 [开始, 结束) 区间。"""
+    monday = parse_week_key(key)
+    return local_day_start_utc(monday), local_day_start_utc(monday + timedelta(days=7))
@@ -0,0 +1 @@
+"""性能基准与压测脚本（离线运行，基于 SQLite），在项目根目录执行：python -m benchmarks.<模块名>"""
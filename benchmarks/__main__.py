@@ -0,0 +1,38 @@
+"""
+完整基准：导入数据 → 微基准 → 进程内 ASGI 压测，结果写为 JSON（默认使用临时 SQLite 文件，离线可运行）。
+
+    python -m benchmarks --reports 20000 --concurrency 1,8,32 --output bench-$(git rev-parse --short HEAD).json
+    python -m benchmarks.compare bench-old.json bench-new.json
+"""
+import argparse
+
+from .common import configure_database, environment_info, write_json
+from .load import add_load_arguments
+from .seed import add_seed_arguments
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    add_load_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=20, help="微基准重复次数")
+    parser.add_argument("--skip-load", action="store_true", help="只运行微基准")
+    parser.add_argument("--output", help="结果 JSON 文件路径（默认仅打印）")
+    args = parser.parse_args()
+
+    # 必须在导入 app 之前确定数据库
+    configure_database(args.database_url)
+    from .load import load_from_args
+    from .micro import run_micro
+    from .seed import seed_from_args
+
+    result = {"benchmark": "suite", "meta": environment_info(), "seed": seed_from_args(args)}
+    result["micro"] = run_micro(args.repeat)
+    if not args.skip_load:
+        result["load"] = load_from_args(args)
+    write_json(result, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import asyncio
+from urllib.parse import urlencode
+
+
+async def request(app, method: str, path: str, query: dict | None = None, form: dict | None = None,
+                  headers: dict | None = None) -> tuple[int, bytes]:
+    """
+    进程内直接调用 ASGI 应用（不经网络与 HTTP 客户端库），返回 (状态码, 响应体)。
+    form 按 application/x-www-form-urlencoded 编码作为请求体。
+    """
+    body = urlencode(form).encode() if form is not None else b""
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    if form is not None:
+        raw_headers.append((b"content-type", b"application/x-www-form-urlencoded"))
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(query or {}).encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    request_sent = False
+    response_done = asyncio.Event()
+    status = 0
+    chunks: list[bytes] = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                response_done.set()
+
+    await app(scope, receive, send)
+    response_done.set()
+    return status, b"".join(chunks)
@@ -0,0 +1,61 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def latency_stats(latencies_ms: list[float]) -> dict:
+    return {
+        "p50_ms": round(percentile(latencies_ms, 50), 2) if latencies_ms else None,
+        "p95_ms": round(percentile(latencies_ms, 95), 2) if latencies_ms else None,
+        "p99_ms": round(percentile(latencies_ms, 99), 2) if latencies_ms else None,
+        "max_ms": round(max(latencies_ms), 2) if latencies_ms else None,
+    }
+
+
+def configure_database(database_url: str | None) -> str:
+    """
+    在导入 app 之前调用：未指定时使用临时目录下的全新 SQLite 文件，
+    并关闭与基准无关的后台组件（定时任务不会启动，缓存使用进程内 LRU）。
+    """
+    if not database_url:
+        database_url = f"sqlite:///{tempfile.mkdtemp(prefix='weekreport-bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("CACHE_BACKEND", "memory")
+    os.environ.setdefault("LLM_SUMMARY_ENABLED", "false")
+    return database_url
+
+
+def environment_info() -> dict:
+    """记录运行环境与代码版本，便于对比不同提交的结果。"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "database": os.environ.get("DATABASE_URL"),
+    }
+
+
+def write_json(result: dict, path: str | None):
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,56 @@
+"""
+对比两次基准结果（python -m benchmarks 输出的 JSON），列出各项指标及变化百分比，
+耗时增加或吞吐下降超过 --threshold 的项标记为回退，存在回退时以退出码 1 结束。
+
+    python -m benchmarks.compare base.json head.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+
+def _rows(result: dict):
+    """展开为 (指标名, 数值, 越小越好)。"""
+    for name, stats in (result.get("micro") or {}).items():
+        if isinstance(stats, dict) and "median_ms" in stats:
+            yield f"micro.{name}.median_ms", stats["median_ms"], True
+    for item in result.get("load") or []:
+        prefix = f"load.{item['endpoint']}@c{item['concurrency']}"
+        yield f"{prefix}.throughput_rps", item.get("throughput_rps"), False
+        for key in ("p50_ms", "p95_ms"):
+            yield f"{prefix}.{key}", item.get(key), True
+
+
+def compare(base: dict, head: dict, threshold: float) -> tuple[list[str], int]:
+    base_values = {name: (value, lower) for name, value, lower in _rows(base)}
+    lines = [f"{'metric':<48} {'base':>12} {'head':>12} {'change':>9}"]
+    regressions = 0
+    for name, value, lower_is_better in _rows(head):
+        if name not in base_values or value is None or not base_values[name][0]:
+            continue
+        old = base_values[name][0]
+        change = (value - old) / old * 100
+        worse = change > threshold if lower_is_better else change < -threshold
+        regressions += worse
+        lines.append(f"{name:<48} {old:>12} {value:>12} {change:>+8.1f}%{'  REGRESSION' if worse else ''}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="判定为回退的变化百分比")
+    args = parser.parse_args()
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+    lines, regressions = compare(base, head, args.threshold)
+    print(f"base: {base.get('meta', {}).get('commit')}  head: {head.get('meta', {}).get('commit')}")
+    print("\n".join(lines))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+进程内 ASGI 压测：按给定并发级别依次请求 /submit、/、/api/members、/api/projects、/admin/summary，
+统计每个接口在各并发下的吞吐与延迟分位。需先导入数据（见 benchmarks.seed）。
+
+    python -m benchmarks.load --reports 20000 --concurrency 1,8,32 --requests 200
+"""
+import argparse
+import asyncio
+import time
+
+ENDPOINTS = ("submit", "form", "api_members", "api_projects", "admin_summary")
+
+
+async def _run_endpoint(app, endpoint: str, concurrency: int, total: int, members, projects, admin_token: str) -> dict:
+    from .asgi import request
+    from .common import latency_stats
+
+    counter = iter(range(total))
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+
+    async def one(i: int):
+        if endpoint == "submit":
+            member_id, member_name = members[i % len(members)]
+            call = request(app, "POST", "/submit", form={
+                "member_id": member_id,
+                "member_name": member_name,
+                "project": projects[i % len(projects)],
+                "work_desc": f"压测周报 {i}",
+                "progress": i % 100,
+                "next_week_plan": "继续推进",
+                "risks": "",
+            })
+            expected = 303
+        elif endpoint == "form":
+            call, expected = request(app, "GET", "/"), 200
+        elif endpoint == "api_members":
+            call, expected = request(app, "GET", "/api/members"), 200
+        elif endpoint == "api_projects":
+            call, expected = request(app, "GET", "/api/projects"), 200
+        else:
+            call, expected = request(app, "GET", "/admin/summary", headers={"X-Admin-Token": admin_token}), 200
+        started = time.perf_counter()
+        try:
+            status, _ = await call
+        except Exception as e:
+            key = e.__class__.__name__
+            errors[key] = errors.get(key, 0) + 1
+            return
+        if status != expected:
+            errors[f"HTTP {status}"] = errors.get(f"HTTP {status}", 0) + 1
+            return
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    async def worker():
+        for i in counter:
+            await one(i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        **latency_stats(latencies),
+        "errors": errors,
+    }
+
+
+def run_load(concurrency_levels: list[int], requests_per_level: int, endpoints=ENDPOINTS) -> list[dict]:
+    import os
+    from app.main import app, ADMIN_TOKEN
+    from app.db import SessionLocal, Member, Project
+    from .asgi import request
+
+    db = SessionLocal()
+    try:
+        members = [(m.id, m.name) for m in db.query(Member.id, Member.name).filter(Member.is_active == 1)]
+        projects = [name for (name,) in db.query(Project.name)]
+    finally:
+        db.close()
+    token = ADMIN_TOKEN or os.getenv("ADMIN_TOKEN", "")
+
+    async def main():
+        results = []
+        for endpoint in endpoints:
+            # 预热：首次请求包含模板编译、连接建立与缓存填充
+            if endpoint != "submit":
+                await _run_endpoint(app, endpoint, 1, 2, members, projects, token)
+            for level in concurrency_levels:
+                results.append(await _run_endpoint(app, endpoint, level, requests_per_level, members, projects, token))
+        return results
+
+    return asyncio.run(main())
+
+
+def add_load_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--concurrency", default="1,8,32", help="逗号分隔的并发级别")
+    parser.add_argument("--requests", type=int, default=200, help="每个接口每个并发级别的请求数")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+
+
+def load_from_args(args) -> list[dict]:
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    endpoints = [x.strip() for x in args.endpoints.split(",") if x.strip()]
+    return run_load(levels, args.requests, endpoints)
+
+
+def main():
+    from .common import configure_database, environment_info, write_json
+    from .seed import add_seed_arguments, seed_from_args
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    add_load_arguments(parser)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    configure_database(args.database_url)
+    result = {"benchmark": "load", "meta": environment_info(), "seed": seed_from_args(args)}
+    result["load"] = load_from_args(args)
+    write_json(result, args.output)
+
+
+if __name__ == "__main__":
+    main()
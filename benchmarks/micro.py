@@ -0,0 +1,75 @@
+"""
+微基准：周报汇总渲染（缓存冷/热）、escape_html、_strip_html。需先导入数据（见 benchmarks.seed）。
+
+    python -m benchmarks.micro --reports 20000 --repeat 20
+"""
+import argparse
+import statistics
+import time
+
+
+def _measure(func, repeat: int, setup=None) -> dict:
+    """执行 repeat 次并统计单次耗时（毫秒）；setup 在每次计时前调用，不计入耗时。"""
+    if setup:
+        setup()
+    func()  # 预热
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "max_ms": round(max(samples), 4),
+    }
+
+
+def run_micro(repeat: int = 20) -> dict:
+    from app.db import SessionLocal, Project
+    from app.utils.summary import generate_weekly_summary, escape_html, invalidate_summary_sections
+    from app.services.siliconflow import _strip_html
+
+    db = SessionLocal()
+    try:
+        projects = [name for (name,) in db.query(Project.name).all()]
+
+        def clear_cache():
+            invalidate_summary_sections(projects)
+
+        html = generate_weekly_summary(db)
+        results = {
+            "summary_html_bytes": len(html.encode("utf-8")),
+            "generate_weekly_summary_cold": _measure(lambda: generate_weekly_summary(db), repeat, clear_cache),
+            "generate_weekly_summary_warm": _measure(lambda: generate_weekly_summary(db), repeat),
+        }
+    finally:
+        db.close()
+
+    sample = "完成<b>接口</b>联调 & 自测\n修复 \"支付超时\" 问题\n" * 200
+    results["escape_html_10kb"] = _measure(lambda: escape_html(sample), repeat * 50)
+    results["strip_html_summary"] = _measure(lambda: _strip_html(html), repeat)
+    return results
+
+
+def main():
+    from .common import configure_database, environment_info, write_json
+    from .seed import add_seed_arguments, seed_from_args
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    configure_database(args.database_url)
+    result = {"benchmark": "micro", "meta": environment_info(), "seed": seed_from_args(args)}
+    result["micro"] = run_micro(args.repeat)
+    write_json(result, args.output)
+
+
+if __name__ == "__main__":
+    main()
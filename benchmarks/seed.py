@@ -0,0 +1,139 @@
+"""
+生成基准数据：成员、项目与跨多周的周报（含本周），并重建周汇总表与全文检索索引。
+数据由固定随机种子生成，同样的参数得到同样的数据。
+
+    python -m benchmarks.seed --members 200 --projects 30 --reports 20000 --weeks 52
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+_WORK = ["完成接口联调与自测", "修复支付超时问题", "推进需求评审", "优化查询性能", "编写单元测试", "上线灰度发布", "整理技术文档"]
+_PLAN = ["继续推进联调", "准备上线评审", "补充监控告警", "重构数据访问层", "跟进遗留缺陷"]
+_RISK = ["", "", "", "依赖方接口延期", "测试环境不稳定", "人力不足"]
+
+
+def _text(rng: random.Random, phrases: list[str], count: int) -> str:
+    return "\n".join(f"{i + 1}. {rng.choice(phrases)}" for i in range(count))
+
+
+def seed(members: int = 200, projects: int = 30, reports: int = 20000, weeks: int = 52,
+         current_week_share: float = 0.1, seed_value: int = 42, batch_size: int = 5000) -> dict:
+    """
+    向当前 DATABASE_URL 写入数据（应为空库），返回各项数量与耗时。
+    current_week_share 为本周周报占比，其余均匀分布在之前的 weeks 周内。
+    """
+    from sqlalchemy import insert
+    from app.db import SessionLocal, Member, Project, Report, init_db
+    from app.utils.rollups import rebuild_rollups
+    from app.utils.search import rebuild_search_index
+    from app.utils.weeks import current_week_key, week_bounds, week_key
+
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+    init_db()
+    db = SessionLocal()
+    try:
+        existing_members = db.query(Member.id).count()
+        db.execute(insert(Member), [
+            {
+                "name": f"成员{i:04d}",
+                "department": rng.choice(["研发部", "产品部", "测试部", "运维部"]),
+                "position": rng.choice(["工程师", "高级工程师", "产品经理", "测试工程师"]),
+                "email": f"member{i:04d}@example.com",
+                "is_active": 1,
+                "created_at": datetime.utcnow(),
+            }
+            for i in range(existing_members, members)
+        ])
+        existing_projects = db.query(Project.id).count()
+        db.execute(insert(Project), [
+            {"name": f"项目{i:03d}", "description": f"基准测试项目 {i}", "created_at": datetime.utcnow()}
+            for i in range(existing_projects, projects)
+        ])
+        db.commit()
+
+        member_rows = db.query(Member.id, Member.name).all()
+        project_rows = db.query(Project.id, Project.name).all()
+        now = datetime.utcnow()
+        # “本周”按业务时区划分
+        elapsed = int((now - week_bounds(current_week_key())[0]).total_seconds())
+        batch = []
+        taken: set[tuple] = set()
+        for i in range(reports):
+            if rng.random() < current_week_share:
+                created_at = now - timedelta(seconds=rng.randint(0, elapsed))
+            else:
+                created_at = now - timedelta(days=rng.randint(7, max(7, weeks * 7)), seconds=rng.randint(0, 86399))
+            # 每个成员每周每个项目只有一条周报（唯一索引）：组合已被占用时重新抽取，多次仍冲突则跳过
+            for _ in range(20):
+                member_id, member_name = rng.choice(member_rows)
+                project_id, project = rng.choice(project_rows)
+                key = (week_key(created_at), member_id, project_id)
+                if key not in taken:
+                    break
+            else:
+                continue
+            taken.add(key)
+            batch.append({
+                "member_id": member_id,
+                "member_name": member_name,
+                "project_id": project_id,
+                "project": project,
+                "work_desc": _text(rng, _WORK, rng.randint(1, 4)),
+                "progress": float(rng.randint(0, 100)),
+                "next_week_plan": _text(rng, _PLAN, rng.randint(1, 3)),
+                "risks": rng.choice(_RISK),
+                "created_at": created_at,
+                "week_key": key[0],
+            })
+            if len(batch) >= batch_size:
+                db.execute(insert(Report), batch)
+                batch.clear()
+        if batch:
+            db.execute(insert(Report), batch)
+        db.commit()
+        inserted = time.perf_counter() - started
+
+        rollups = rebuild_rollups(db)
+        indexed = rebuild_search_index(db)
+        return {
+            "members": len(member_rows),
+            "projects": len(project_rows),
+            "reports": len(taken),
+            "weeks": weeks,
+            "rollup_rows": rollups,
+            "indexed_reports": indexed,
+            "insert_seconds": round(inserted, 3),
+            "total_seconds": round(time.perf_counter() - started, 3),
+        }
+    finally:
+        db.close()
+
+
+def add_seed_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--projects", type=int, default=30)
+    parser.add_argument("--reports", type=int, default=20000)
+    parser.add_argument("--weeks", type=int, default=52, help="历史周报分布的周数")
+    parser.add_argument("--current-week-share", type=float, default=0.1, help="本周周报占比")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--database-url", help="目标数据库（默认新建临时 SQLite 文件）")
+
+
+def seed_from_args(args) -> dict:
+    return seed(args.members, args.projects, args.reports, args.weeks, args.current_week_share, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+    from .common import configure_database, write_json
+    configure_database(args.database_url)
+    write_json(seed_from_args(args), None)
+
+
+if __name__ == "__main__":
+    main()
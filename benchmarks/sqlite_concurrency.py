@@ -0,0 +1,154 @@
+"""
+SQLite 并发写入对比：原始配置（回滚日志 + synchronous=FULL，无写队列）与生产配置（WAL + NORMAL + 写队列）。
+每种配置在独立子进程中导入应用（引擎参数在导入时确定），以 --processes 个进程模拟多 worker，
+每个进程按 --concurrency 并发发起 /submit 与 /api/members 请求，输出吞吐、延迟分位与错误数（JSON）。
+
+    python -m benchmarks.sqlite_concurrency --requests 400 --concurrency 32 --processes 2 --output sqlite.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from .common import environment_info, latency_stats, write_json
+
+PROFILES = {
+    # 改造前的默认行为：pysqlite 默认 5 秒忙等，其余为 SQLite 默认值
+    "baseline": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_BUSY_TIMEOUT_MS": "5000",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_CACHE_SIZE": "-2000",
+        "SQLITE_WRITE_QUEUE": "0",
+    },
+    "tuned": {},
+}
+
+
+async def _load(total: int, concurrency: int, write_ratio: float) -> dict:
+    from app.main import app
+    from app.db import SessionLocal, Member, Project
+    from .asgi import request
+
+    db = SessionLocal()
+    members = [(m.id, m.name) for m in db.query(Member).all()]
+    projects = [p.name for p in db.query(Project).all()]
+    db.close()
+
+    counter = iter(range(total))
+    writes, reads, errors = [], [], {}
+
+    async def one(i: int):
+        is_write = (i % 100) < write_ratio * 100
+        started = time.perf_counter()
+        try:
+            if is_write:
+                member_id, member_name = members[i % len(members)]
+                status, _ = await request(app, "POST", "/submit", form={
+                    "member_id": member_id,
+                    "member_name": member_name,
+                    "project": projects[i % len(projects)],
+                    "work_desc": f"基准测试周报 {i}",
+                    "progress": i % 100,
+                    "next_week_plan": "继续推进",
+                    "risks": "",
+                })
+                ok = status == 303
+            else:
+                status, _ = await request(app, "GET", "/api/members")
+                ok = status == 200
+            if not ok:
+                errors[f"HTTP {status}"] = errors.get(f"HTTP {status}", 0) + 1
+                return
+        except Exception as e:
+            name = f"{e.__class__.__name__}: {str(e).splitlines()[0][:80]}"
+            errors[name] = errors.get(name, 0) + 1
+            return
+        (writes if is_write else reads).append((time.perf_counter() - started) * 1000)
+
+    async def worker():
+        for i in counter:
+            await one(i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"elapsed_s": time.perf_counter() - started, "writes": writes, "reads": reads, "errors": errors}
+
+
+def _worker_main(args):
+    """子进程：按 profile 环境变量导入应用并执行负载（库表已由父进程初始化），结果以 JSON 打印到 stdout。"""
+    result = asyncio.run(_load(args.requests, args.concurrency, args.write_ratio))
+    print(json.dumps(result))
+
+
+def run_profile(name: str, args) -> dict:
+    db_dir = tempfile.mkdtemp(prefix=f"weekreport-bench-{name}-")
+    env = {
+        **os.environ,
+        **PROFILES[name],
+        "DATABASE_URL": f"sqlite:///{db_dir}/bench.db",
+        "SCHEDULER_MODE": "local",
+        "CACHE_BACKEND": "memory",
+    }
+    cmd = [
+        sys.executable, "-m", "benchmarks.sqlite_concurrency", "--worker",
+        "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+        "--write-ratio", str(args.write_ratio),
+    ]
+    # 先单独初始化建表，避免多个进程同时建表
+    subprocess.run([sys.executable, "-c", "from app.db import init_db; init_db()"], env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    procs = [subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, text=True) for _ in range(args.processes)]
+    outputs = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+    # 以各进程负载阶段的最长耗时计（不含解释器启动与导入）
+    elapsed = max(o["elapsed_s"] for o in outputs)
+
+    writes = [x for o in outputs for x in o["writes"]]
+    reads = [x for o in outputs for x in o["reads"]]
+    errors: dict[str, int] = {}
+    for o in outputs:
+        for k, v in o["errors"].items():
+            errors[k] = errors.get(k, 0) + v
+    total = args.requests * args.processes
+    return {
+        "profile": name,
+        "env": PROFILES[name],
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(writes + reads) / elapsed, 1),
+        "submit": {"ok": len(writes), **latency_stats(writes)},
+        "read": {"ok": len(reads), **latency_stats(reads)},
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400, help="每个进程的请求数")
+    parser.add_argument("--concurrency", type=int, default=32, help="每个进程的并发数")
+    parser.add_argument("--processes", type=int, default=2, help="模拟的 worker 进程数")
+    parser.add_argument("--write-ratio", type=float, default=0.8, help="写请求（/submit）占比")
+    parser.add_argument("--profiles", default="baseline,tuned")
+    parser.add_argument("--output", help="结果 JSON 文件路径（默认打印到标准输出）")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker_main(args)
+        return
+
+    results = {
+        "benchmark": "sqlite_concurrency",
+        "meta": environment_info(),
+        "params": {k: getattr(args, k) for k in ("requests", "concurrency", "processes", "write_ratio")},
+        "results": [run_profile(name.strip(), args) for name in args.profiles.split(",") if name.strip()],
+    }
+    write_json(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import os
+import socketserver
+import tempfile
+import threading
+
+import pytest
+
+# 在导入 app 之前指定测试数据库，避免写入工作目录下的 weekreports.db
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='weekreport-tests-')}/test.db"
+
+from app.services import emailer  # noqa: E402
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(b"220 fake\r\n")
+        while line := self.rfile.readline():
+            command = line[:4].upper()
+            if command == b"DATA":
+                self.wfile.write(b"354 go ahead\r\n")
+                body = b"".join(iter(self.rfile.readline, b".\r\n"))
+                reply = self.server.data_replies.pop(0) if self.server.data_replies else b"250 ok"
+                if reply.startswith(b"250"):
+                    self.server.messages.append(body)
+                self.wfile.write(reply + b"\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """假 SMTP 服务器（明文、免登录）：按 data_replies 依次应答 DATA，用完后返回 250。"""
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.messages, server.data_replies = [], []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    for name, value in {"SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(port), "SMTP_USER": "bot@example.com",
+                        "SMTP_PASS": "secret", "MAIL_TO": "team@example.com"}.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(emailer, "_pool", None)
+    monkeypatch.setattr(
+        emailer.SMTPPool, "_connect", lambda self: emailer._PooledConnection(emailer.smtplib.SMTP("127.0.0.1", port, timeout=5))
+    )
+    yield server
+    server.shutdown()
+    emailer._pool.close()
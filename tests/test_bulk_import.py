@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from app.utils.bulk_import import BulkImporter, iter_records
+
+LOOKUPS = {
+    "member_by_id": {1: "张三"},
+    "member_by_name": {"张三": 1},
+    "project_by_name": {"alpha": (10, "Alpha")},
+}
+
+GOOD = {"member_id": 1, "project": "Alpha", "work_desc": "开发", "progress": 50, "next_week_plan": "测试"}
+
+
+async def _chunks(data: bytes, size: int = 7):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def _import(data: bytes, fmt: str = "ndjson") -> BulkImporter:
+    importer = BulkImporter(LOOKUPS)
+
+    async def run():
+        async for number, raw in iter_records(_chunks(data), fmt):
+            importer.add(number, raw)
+
+    asyncio.run(run())
+    return importer
+
+
+def test_bad_rows_are_reported_without_aborting():
+    rows = [
+        GOOD,
+        {**GOOD, "work_desc": 123},
+        {**GOOD, "project": 7},
+        {**GOOD, "member_name": ["张三"], "member_id": None},
+        {**GOOD, "progress": True},
+        {**GOOD, "risks": {"a": 1}},
+        {**GOOD, "created_at": 20240301},
+        {**GOOD, "member_id": None, "member_name": "张三", "risks": None},
+    ]
+    lines = [json.dumps(row, ensure_ascii=False).encode() for row in rows]
+    lines.insert(3, b'{"work_desc": "\xff\xfe"}')
+    importer = _import(b"\n".join(lines) + b"\n")
+
+    assert [number for number, _ in importer.batch] == [1, 9]
+    assert [error["row"] for error in importer.errors] == [2, 3, 4, 5, 6, 7, 8]
+    assert importer.errors[0]["error"] == "work_desc 应为字符串"
+    assert importer.errors[1]["error"] == "project 应为字符串"
+    assert "UTF-8" in importer.errors[2]["error"]
+    assert importer.batch[1][1]["risks"] == ""
+
+
+def test_csv_undecodable_row_is_reported():
+    data = "﻿member_id,project,work_desc,progress,next_week_plan\n".encode()
+    data += "1,Alpha,开发,50,测试\n".encode()
+    data += b"1,Alpha,\xe5\xbc,50,x\n"
+    data += '1,alpha,"多行\n描述",80,测试\n'.encode()
+    importer = _import(data, "csv")
+
+    assert [number for number, _ in importer.batch] == [1, 3]
+    assert importer.batch[1][1]["work_desc"] == "多行\n描述"
+    assert [error["row"] for error in importer.errors] == [2]
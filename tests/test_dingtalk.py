@@ -0,0 +1,16 @@
+import time
+
+from app.services.dingtalk import SlidingWindowLimiter
+
+
+def test_limiter_never_exceeds_limit_within_window():
+    limiter = SlidingWindowLimiter(3, window=0.3)
+    started = time.monotonic()
+    stamps = []
+    for _ in range(7):
+        limiter.acquire()
+        stamps.append(time.monotonic() - started)
+    # 首个窗口内也只放行 limit 次（令牌桶初始满桶时会多放行一倍）
+    for i in range(len(stamps) - 3):
+        assert stamps[i + 3] - stamps[i] >= 0.3
+    assert stamps[2] < 0.1
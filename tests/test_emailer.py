@@ -0,0 +1,22 @@
+from app.services import emailer
+
+
+def test_connect_failure_is_retried_then_contained(smtp_server, monkeypatch):
+    connect = emailer.SMTPPool._connect
+    failures = [emailer.smtplib.SMTPConnectError(421, b"busy")]
+
+    def flaky_connect(self):
+        if failures:
+            raise failures.pop(0)
+        return connect(self)
+
+    monkeypatch.setattr(emailer.SMTPPool, "_connect", flaky_connect)
+    # 421 问候：重连重试后送达
+    assert emailer.send_html_email("周报汇总", "<p>本周</p>")
+    assert len(smtp_server.messages) == 1
+    # 认证失败：不重试，返回 False 而不是抛出
+    failures.append(emailer.smtplib.SMTPAuthenticationError(535, b"bad"))
+    emailer.get_smtp_pool().close()
+    assert emailer.get_smtp_pool().send_many(
+        [(emailer._build_message("s", "<p>x</p>", "bot@example.com", ["a@example.com"]), ["a@example.com"])]
+    ) == [False]
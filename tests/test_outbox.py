@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.db import SessionLocal, OutboxMessage, init_db
+from app.services import outbox
+
+
+@pytest.fixture
+def outbox_db():
+    init_db()
+    db = SessionLocal()
+    db.query(OutboxMessage).delete()
+    db.commit()
+    db.close()
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        self.server.posts.append(body)
+        time.sleep(self.server.delay)
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b'{"errcode": 0}' if status == 200 else b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    """假钉钉机器人：按 statuses 依次返回 HTTP 状态码，用完后返回 200。"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _WebhookHandler)
+    server.posts, server.statuses, server.delay = [], [], 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("DINGTALK_WEBHOOK", f"http://127.0.0.1:{server.server_port}/")
+    monkeypatch.delenv("DINGTALK_SECRET", raising=False)
+    yield server
+    server.shutdown()
+
+
+def _message(msg_id: int) -> OutboxMessage:
+    db = SessionLocal()
+    try:
+        return db.query(OutboxMessage).filter(OutboxMessage.id == msg_id).one()
+    finally:
+        db.close()
+
+
+def _make_due(msg_id: int):
+    db = SessionLocal()
+    db.query(OutboxMessage).filter(OutboxMessage.id == msg_id).update({OutboxMessage.next_attempt_at: datetime.utcnow()})
+    db.commit()
+    db.close()
+
+
+def test_failed_send_backs_off_then_succeeds(outbox_db, executor, webhook, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_BACKOFF_SECONDS", 30)
+    webhook.statuses = [500, 500]
+    msg_id = outbox.enqueue_dingtalk("提醒", at_mobiles=["13800000000"])
+
+    for attempt, base in ((1, 30), (2, 60)):
+        before = datetime.utcnow()
+        assert outbox.drain_once(executor) == 1
+        msg = _message(msg_id)
+        assert (msg.status, msg.attempts) == ("pending", attempt)
+        delay = (msg.next_attempt_at - before).total_seconds()
+        assert base * 0.8 - 1 <= delay <= base * 1.2 + 1
+        # 未到重试时间不会再次发送
+        assert outbox.drain_once(executor) == 0
+        _make_due(msg_id)
+
+    assert outbox.drain_once(executor) == 1
+    msg = _message(msg_id)
+    assert (msg.status, msg.attempts, msg.last_error) == ("sent", 3, None)
+    assert len(webhook.posts) == 3
+
+
+def test_message_is_dead_lettered_after_max_attempts(outbox_db, executor, webhook, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    webhook.statuses = [500, 500, 500]
+    msg_id = outbox.enqueue_dingtalk("提醒", at_mobiles=["13800000000"])
+
+    outbox.drain_once(executor)
+    _make_due(msg_id)
+    outbox.drain_once(executor)
+
+    msg = _message(msg_id)
+    assert (msg.status, msg.attempts) == ("dead", 2)
+    assert outbox.outbox_status()["failed"][0]["id"] == msg_id
+    assert outbox.requeue(msg_id)
+    assert outbox.drain_once(executor) == 1
+    assert _message(msg_id).status == "pending"
+
+
+def test_email_rejected_at_data_is_retried_by_outbox(outbox_db, executor, smtp_server):
+    smtp_server.data_replies = [b"451 try again later"]
+    msg_id = outbox.enqueue_email("周报汇总", "<p>本周</p>")
+
+    outbox.drain_once(executor)
+    msg = _message(msg_id)
+    assert (msg.status, msg.attempts) == ("pending", 1)
+    assert smtp_server.messages == []
+
+    _make_due(msg_id)
+    outbox.drain_once(executor)
+    assert _message(msg_id).status == "sent"
+    assert len(smtp_server.messages) == 1
+    assert f"<outbox-{msg_id}@weekreport>".encode() in smtp_server.messages[0]
+
+
+def test_slow_send_keeps_its_lease(outbox_db, executor, webhook, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_SEND_TIMEOUT_SECONDS", 0.6)
+    webhook.delay = 1.5
+    msg_id = outbox.enqueue_dingtalk("提醒", at_mobiles=["13800000000"])
+
+    sender = threading.Thread(target=outbox.drain_once, args=(executor,))
+    sender.start()
+    time.sleep(1.0)
+    # 其他 worker 的巡检：租约仍在续期，不应转入死信
+    db = SessionLocal()
+    try:
+        outbox._recover_stale(db, datetime.utcnow())
+    finally:
+        db.close()
+    assert _message(msg_id).status == "sending"
+    sender.join()
+    assert _message(msg_id).status == "sent"
+
+
+def test_late_ack_reconciles_stale_dead_letter(outbox_db):
+    msg_id = outbox.enqueue_dingtalk("提醒")
+    db = SessionLocal()
+    db.query(OutboxMessage).filter(OutboxMessage.id == msg_id).update(
+        {OutboxMessage.status: "dead", OutboxMessage.last_error: outbox._STALE_ERROR}
+    )
+    db.commit()
+    db.close()
+
+    outbox._ack(msg_id, True, None)
+    assert _message(msg_id).status == "sent"
+
@@ -0,0 +1,67 @@
+import time
+from datetime import datetime, timedelta
+
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from app.services import scheduler
+from app.utils.weeks import BUSINESS_TZ
+
+
+def _registered_jobs(monkeypatch):
+    monkeypatch.setattr(scheduler, "_scheduler", BackgroundScheduler(timezone=BUSINESS_TZ))
+    scheduler._register_weekly_jobs()
+    return {job.id: job for job in scheduler._scheduler.get_jobs()}
+
+
+def test_weekly_jobs_use_business_timezone(monkeypatch):
+    jobs = _registered_jobs(monkeypatch)
+    for job_id in ("weekly_dingtalk_reminder", "weekly_summary_email"):
+        assert jobs[job_id].trigger.timezone == BUSINESS_TZ
+
+
+def test_nudge_jobs_use_business_timezone(monkeypatch):
+    monkeypatch.setattr(scheduler, "DINGTALK_NUDGE_TIMES", "fri 15:00,fri 17:30")
+    jobs = _registered_jobs(monkeypatch)
+    nudges = [job for job_id, job in jobs.items() if job_id.startswith(scheduler._NUDGE_JOB_PREFIX)]
+    assert len(nudges) == 2
+    for job in nudges:
+        assert job.trigger.timezone == BUSINESS_TZ
+
+
+def test_leadership_change_keeps_stored_next_run_time(monkeypatch):
+    # 模拟故障切换：旧主节点在 10:00 前退出，新主节点在到期之后才重新注册任务
+    monkeypatch.setattr(scheduler, "_scheduler", BackgroundScheduler(timezone=BUSINESS_TZ))
+    scheduler._scheduler.start(paused=True)
+    try:
+        scheduler._register_weekly_jobs()
+        due = datetime.now(BUSINESS_TZ) - timedelta(seconds=20)
+        scheduler._scheduler.modify_job("weekly_dingtalk_reminder", next_run_time=due)
+        scheduler._register_weekly_jobs()
+        assert scheduler._scheduler.get_job("weekly_dingtalk_reminder").next_run_time == due
+    finally:
+        scheduler._scheduler.shutdown(wait=False)
+
+
+def test_stopping_paused_worker_keeps_due_run(monkeypatch, tmp_path):
+    # 非主节点退出时不得推进共享 job store 中到期任务的 next_run_time
+    url = f"sqlite:///{tmp_path / 'jobs.db'}"
+
+    def paused_scheduler():
+        sched = BackgroundScheduler(timezone=BUSINESS_TZ, jobstores={"default": SQLAlchemyJobStore(url=url)})
+        sched.start(paused=True)
+        return sched
+
+    monkeypatch.setattr(scheduler, "SCHEDULER_MODE", "leader")
+    monkeypatch.setattr(scheduler, "_scheduler", paused_scheduler())
+    scheduler._register_weekly_jobs()
+    due = datetime.now(BUSINESS_TZ) - timedelta(seconds=20)
+    scheduler._scheduler.modify_job("weekly_dingtalk_reminder", next_run_time=due)
+    scheduler.stop_scheduler()
+    time.sleep(0.2)
+
+    survivor = paused_scheduler()
+    try:
+        assert survivor.get_job("weekly_dingtalk_reminder").next_run_time == due
+    finally:
+        survivor.shutdown(wait=False)
@@ -0,0 +1,130 @@
+import json
+import threading
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.db import SessionLocal, LLMCacheEntry, init_db
+from app.services import siliconflow
+
+Row = namedtuple("Row", "project member_name work_desc next_week_plan risks")
+
+
+class _LLMHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        system, user = (m["content"] for m in body["messages"])
+        stage = "reduce" if system == siliconflow._REDUCE_SYSTEM_PROMPT else "map"
+        with self.server.lock:
+            self.server.calls.append((stage, user))
+        if self.server.fail(stage, user):
+            self.send_response(500)
+            self.end_headers()
+            return
+        content = f"{stage}:{user.count('【项目：') or user.count('---') + 1}"
+        out = json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """模拟 chat/completions：map 返回 “map:<项目段数>”，reduce 返回 “reduce:<合并份数>”；fail 判断是否返回 500。"""
+    init_db()
+    db = SessionLocal()
+    db.query(LLMCacheEntry).delete()
+    db.commit()
+    db.close()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _LLMHandler)
+    server.calls, server.lock, server.fail = [], threading.Lock(), lambda stage, user: False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    for name, value in {"LLM_SUMMARY_ENABLED": "true", "SILICONFLOW_API_KEY": "test-key",
+                        "SILICONFLOW_BASE_URL": f"http://127.0.0.1:{server.server_port}/v1",
+                        "SILICONFLOW_CHUNK_CHARS": "600", "SILICONFLOW_CONCURRENCY": "3"}.items():
+        monkeypatch.setenv(name, value)
+    yield server
+    server.shutdown()
+
+
+def _rows(projects: int, members: int, work: str = "完成接口联调") -> list[Row]:
+    return [
+        Row(f"项目{p:02d}", f"成员{p}-{m}", work, "继续测试", None)
+        for p in range(projects)
+        for m in range(members)
+    ]
+
+
+def test_chunks_keep_small_projects_together_and_split_large_ones():
+    rows = _rows(3, 1) + [Row("项目99", f"成员{m}", "大量工作" * 40, "计划", "延期") for m in range(4)]
+    chunks = siliconflow._chunk_reports(rows, 600)
+
+    assert all(f"【项目：项目0{p}】" in chunks[0] for p in range(3))
+    assert all(len(chunk) <= 600 for chunk in chunks)
+    # 超长项目按成员拆分到多块，每块都带项目标题；每位成员只出现一次
+    large = [chunk for chunk in chunks if "大量工作" in chunk]
+    assert len(large) > 1 and all("【项目：项目99】" in chunk for chunk in large)
+    text = "".join(chunks)
+    assert all(text.count(f"成员：{row.member_name}\n") == 1 for row in rows)
+
+
+def test_map_then_reduce(llm):
+    rows = _rows(12, 3, "完成接口联调" * 8)
+    chunks = siliconflow._chunk_reports(rows, 600)
+
+    summary = siliconflow.summarize_weekly_reports(rows)
+    stages = [stage for stage, _ in llm.calls]
+    assert stages.count("map") == len(chunks) > 1
+    assert stages[-1] == "reduce"
+    assert summary == f"reduce:{len(chunks)}"
+
+
+def test_reduce_runs_in_rounds_when_parts_exceed_limit(llm):
+    config = siliconflow._llm_config()
+    parts = [f"摘要{i}" * 30 for i in range(8)]
+    with siliconflow.ThreadPoolExecutor(max_workers=3) as pool:
+        summary = siliconflow._reduce(config, parts, 200, pool)
+
+    reduces = [user for stage, user in llm.calls if stage == "reduce"]
+    # 每份 90 字、上限 200：第一轮每组 2 份共 4 次，第二轮把 4 份合并结果合为 1 份
+    assert len(reduces) == 5
+    assert sum(user.count("---") + 1 for user in reduces[:4]) == 8
+    assert summary == "reduce:4"
+
+
+def test_reduce_pairs_parts_that_each_exceed_limit(llm):
+    config = siliconflow._llm_config()
+    parts = [f"摘要{i}" * 30 for i in range(3)]
+    with siliconflow.ThreadPoolExecutor(max_workers=3) as pool:
+        summary = siliconflow._reduce(config, parts, 50, pool)
+
+    reduces = [user for stage, user in llm.calls if stage == "reduce"]
+    # 每份都超过上限时两两合并以保证收敛：3 → 2 → 1
+    assert len(reduces) == 3
+    assert summary == "reduce:2"
+
+
+def test_failed_chunk_returns_none(llm):
+    llm.fail = lambda stage, user: stage == "map" and "项目03" in user
+    rows = _rows(8, 2, "完成接口联调" * 8)
+
+    assert siliconflow.summarize_weekly_reports(rows) is None
+    assert not any(stage == "reduce" for stage, _ in llm.calls)
+
+
+def test_failed_reduce_returns_none_and_is_not_cached(llm):
+    llm.fail = lambda stage, user: stage == "reduce"
+    rows = _rows(8, 2, "完成接口联调" * 8)
+    assert siliconflow.summarize_weekly_reports(rows) is None
+
+    # 恢复后重试：map 结果命中缓存，只重新请求 reduce
+    llm.fail = lambda stage, user: False
+    llm.calls.clear()
+    assert siliconflow.summarize_weekly_reports(rows).startswith("reduce:")
+    assert {stage for stage, _ in llm.calls} == {"reduce"}